@@ -1,19 +1,42 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import Flask, Blueprint, current_app, render_template, request, jsonify, redirect, url_for, flash, \
+    session, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from datetime import datetime
+from datetime import datetime, timedelta
+import csv
+import io
+import json
 import os
-from werkzeug.security import generate_password_hash, check_password_hash
+import re
+import time
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import validates
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from config import config
+from database import configure_engine
+from cache import MemoryBackend, ResultCache
+from serializers import RecordSerializer, dumps
+from ingest import IngestQueue, QueueFull
+from passwords import HashingBusy, PasswordHasher
+from patient_ids import IdAllocator
+from search import SEARCH_SOURCES, init_search, search_records
+from metrics import RequestMetrics
+from slow_queries import SlowQueryLogger
+from lookup import MIN_CONTACT_DIGITS, normalize_name, reverse_digits, prefix_condition
+from validation import DateFormat, Field, MaxLength, Range, Schema, Text, ValidationError, to_records
 
-hospital_management_system = Flask(__name__)
-hospital_management_system.config['SECRET_KEY'] = os.urandom(24)
-hospital_management_system.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///hospital.db'
-hospital_management_system.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db = SQLAlchemy(hospital_management_system)
+# Extensions and shared services, bound to an application by create_app()
+db = SQLAlchemy()
+init_search(db)
+result_cache = ResultCache()
+password_hasher = PasswordHasher()
+request_metrics = RequestMetrics()
+slow_query_log = SlowQueryLogger()
 login_manager = LoginManager()
-login_manager.init_app(hospital_management_system)
-login_manager.login_view = 'login'
+login_manager.login_view = 'main.login'
+
+main = Blueprint('main', __name__)
 
 # Database Models
 class User(UserMixin, db.Model):
@@ -23,20 +46,46 @@ class User(UserMixin, db.Model):
     role = db.Column(db.String(20), nullable=False)
 
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        return password_hasher.verify(self.password, password)
 
 class Patient(db.Model):
+    __table_args__ = (
+        db.Index('ix_patient_name_key', 'name_key'),
+        db.Index('ix_patient_contact_key', 'contact_key'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.String(20), unique=True, nullable=False)
     name = db.Column(db.String(100), nullable=False)
     age = db.Column(db.Integer)
     gender = db.Column(db.String(10))
     contact = db.Column(db.String(20))
+    # Lookup keys for /api/patients/lookup; the defaults fill them for Core bulk inserts
+    name_key = db.Column(db.String(100),
+                         default=lambda context: normalize_name(context.get_current_parameters().get('name')))
+    contact_key = db.Column(db.String(20),
+                            default=lambda context: reverse_digits(context.get_current_parameters().get('contact')))
+
+    @validates('name')
+    def update_name_key(self, key, name):
+        self.name_key = normalize_name(name)
+        return name
+
+    @validates('contact')
+    def update_contact_key(self, key, contact):
+        self.contact_key = reverse_digits(contact)
+        return contact
 
 class OPDRecord(db.Model):
+    __table_args__ = (
+        db.Index('ix_opd_record_patient_id_date', 'patient_id', 'date'),
+        db.Index('ix_opd_record_department_date', 'department', 'date'),
+        db.Index('ix_opd_record_doctor_date', 'doctor', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     patient_id = db.Column(db.String(20), db.ForeignKey('patient.patient_id'))
@@ -47,6 +96,12 @@ class OPDRecord(db.Model):
     fee = db.Column(db.Float)
 
 class IPDRecord(db.Model):
+    __table_args__ = (
+        db.Index('ix_ipd_record_patient_id_admission_date', 'patient_id', 'admission_date'),
+        db.Index('ix_ipd_record_doctor_admission_date', 'doctor', 'admission_date'),
+        db.Index('ix_ipd_record_status_discharge_date', 'status', 'discharge_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     admission_date = db.Column(db.DateTime, nullable=False)
     patient_id = db.Column(db.String(20), db.ForeignKey('patient.patient_id'))
@@ -57,6 +112,11 @@ class IPDRecord(db.Model):
     status = db.Column(db.String(20))
 
 class OTRecord(db.Model):
+    __table_args__ = (
+        db.Index('ix_ot_record_patient_id_date', 'patient_id', 'date'),
+        db.Index('ix_ot_record_surgeon_date', 'surgeon', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime, nullable=False)
     patient_id = db.Column(db.String(20), db.ForeignKey('patient.patient_id'))
@@ -68,6 +128,11 @@ class OTRecord(db.Model):
     status = db.Column(db.String(20))
 
 class DeliveryRecord(db.Model):
+    __table_args__ = (
+        db.Index('ix_delivery_record_patient_id_date', 'patient_id', 'date'),
+        db.Index('ix_delivery_record_doctor_date', 'doctor', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime, nullable=False)
     patient_id = db.Column(db.String(20), db.ForeignKey('patient.patient_id'))
@@ -77,50 +142,514 @@ class DeliveryRecord(db.Model):
     weight = db.Column(db.Float)
     status = db.Column(db.String(20))
 
+class TableVersion(db.Model):
+    table_name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class IngestTicket(db.Model):
+    ticket = db.Column(db.String(32), primary_key=True)
+    record_type = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class DailyRollup(db.Model):
+    metric = db.Column(db.String(30), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    dimension = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0)
+
+class IdSequence(db.Model):
+    name = db.Column(db.String(30), primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False)
+
+def reserve_id_block(name, size):
+    """Advance a sequence by size in its own short transaction and return the first number claimed"""
+    sequences = IdSequence.__table__
+    advance = sequences.update().where(sequences.c.name == name) \
+        .values(next_value=sequences.c.next_value + size).returning(sequences.c.next_value)
+    # The UPDATE takes SQLite's write lock, so concurrent workers claim disjoint ranges
+    with db.engine.begin() as connection:
+        end = connection.execute(advance).scalar()
+        if end is None:
+            connection.execute(sqlite_insert(sequences).values(name=name, next_value=1).on_conflict_do_nothing())
+            end = connection.execute(advance).scalar()
+    return end - size
+
+# New patient IDs; call outside an open write transaction, which would block the reservation
+patient_ids = IdAllocator(reserve_id_block)
+
+# Per-table change versions, bumped in the same transaction as each write. The same
+# counters, named patient:<patient_id>, version each patient's records for the
+# per-patient timeline and summary caches.
+VERSIONED_MODELS = (OPDRecord, IPDRecord, OTRecord, DeliveryRecord)
+
+def bump_table_versions(session, table_names):
+    """Increment the change version of each table, creating missing counters, with one executemany"""
+    if not table_names:
+        return
+    versions = TableVersion.__table__
+    statement = sqlite_insert(versions)
+    statement = statement.on_conflict_do_update(
+        index_elements=[versions.c.table_name],
+        set_={'version': versions.c.version + 1}
+    )
+    session.connection().execute(statement, [
+        {'table_name': table_name, 'version': 1} for table_name in sorted(table_names)
+    ])
+
+def patient_version_names(patient_ids):
+    return {f'patient:{patient_id}' for patient_id in patient_ids}
+
+def get_table_version(table_name):
+    """Return the current change version of a table (0 if never written)"""
+    version = db.session.execute(
+        db.select(TableVersion.version).where(TableVersion.table_name == table_name)
+    ).scalar()
+    return version or 0
+
+def get_table_versions(table_names):
+    """Current change versions of several tables with one query, for result cache keys"""
+    table_names = sorted(table_names)
+    versions = dict(db.session.execute(
+        db.select(TableVersion.table_name, TableVersion.version).where(TableVersion.table_name.in_(table_names))
+    ).all())
+    return {table_name: versions.get(table_name, 0) for table_name in table_names}
+
+def mark_cache_tags(session, tags):
+    """Remember result cache tags to invalidate once the transaction commits"""
+    session.info.setdefault('cache_tags', set()).update(tags)
+
+# Daily rollups for the dashboard, maintained in the same transaction as each write
+ROLLUP_RULES = {
+    # table: [(metric, day column, dimension column, summed column)]
+    'opd_record': [('opd_visits', 'date', 'department', 'fee')],
+    'ipd_record': [('ipd_admissions', 'admission_date', None, None),
+                   ('ipd_discharges', 'discharge_date', None, None)],
+    'ot_record': [('ot_surgeries', 'date', 'surgeon', None)],
+    'delivery_record': [('deliveries', 'date', 'delivery_type', None)]
+}
+ROLLUP_METRICS = [metric for rules in ROLLUP_RULES.values() for metric, *_ in rules]
+
+def rollup_deltas(deltas, table_name, values, sign):
+    """Accumulate the rollup changes caused by adding (sign=1) or removing (sign=-1) a row"""
+    for metric, day_column, dimension_column, total_column in ROLLUP_RULES[table_name]:
+        day = values.get(day_column)
+        if day is None:
+            continue
+        dimension = (values.get(dimension_column) or '') if dimension_column else ''
+        delta = deltas.setdefault((metric, day.date(), dimension), [0, 0.0])
+        delta[0] += sign
+        if total_column:
+            delta[1] += sign * (values.get(total_column) or 0)
+
+def apply_rollup_deltas(session, deltas):
+    """Upsert accumulated rollup changes with one executemany"""
+    deltas = {key: delta for key, delta in deltas.items() if delta != [0, 0.0]}
+    if not deltas:
+        return
+    rollups = DailyRollup.__table__
+    statement = sqlite_insert(rollups)
+    statement = statement.on_conflict_do_update(
+        index_elements=[rollups.c.metric, rollups.c.day, rollups.c.dimension],
+        set_={
+            'count': rollups.c.count + statement.excluded['count'],
+            'total': rollups.c.total + statement.excluded.total
+        }
+    )
+    session.connection().execute(statement, [
+        {'metric': metric, 'day': day, 'dimension': dimension, 'count': count, 'total': total}
+        for (metric, day, dimension), (count, total) in deltas.items()
+    ])
+
+def record_values(obj, previous=False):
+    """Column values of a record, or the values before this flush when previous is set"""
+    state = inspect(obj)
+    values = {}
+    for column in obj.__table__.columns:
+        value = getattr(obj, column.key)
+        if previous:
+            history = state.attrs[column.key].history
+            if history.deleted:
+                value = history.deleted[0]
+        values[column.key] = value
+    return values
+
+@event.listens_for(db.session, 'after_flush')
+def track_record_changes(session, flush_context):
+    changed = [obj for obj in session.new | session.dirty | session.deleted
+               if isinstance(obj, VERSIONED_MODELS)]
+    if changed:
+        table_names = {obj.__tablename__ for obj in changed}
+        # A record moved to another patient also changes its previous patient's history
+        patients = {obj.patient_id for obj in changed} | \
+            {record_values(obj, previous=True)['patient_id'] for obj in changed if obj in session.dirty}
+        bump_table_versions(session, table_names | patient_version_names(patients))
+        mark_cache_tags(session, table_names | {f'stats:{table_name}' for table_name in table_names})
+
+        deltas = {}
+        for obj in changed:
+            if obj in session.new:
+                rollup_deltas(deltas, obj.__tablename__, record_values(obj), 1)
+            elif obj in session.deleted:
+                rollup_deltas(deltas, obj.__tablename__, record_values(obj, previous=True), -1)
+            else:
+                rollup_deltas(deltas, obj.__tablename__, record_values(obj, previous=True), -1)
+                rollup_deltas(deltas, obj.__tablename__, record_values(obj), 1)
+        apply_rollup_deltas(session, deltas)
+
+def rebuild_rollups():
+    """Recompute every rollup from the record tables with GROUP BY, e.g. after a back-fill"""
+    rollups = DailyRollup.__table__
+    models = {model.__tablename__: model for model in VERSIONED_MODELS}
+    db.session.execute(rollups.delete())
+    for table_name, rules in ROLLUP_RULES.items():
+        model = models[table_name]
+        for metric, day_column, dimension_column, total_column in rules:
+            day = db.func.date(getattr(model, day_column))
+            dimension = db.func.coalesce(getattr(model, dimension_column), '') if dimension_column else db.literal('')
+            total = db.func.coalesce(db.func.sum(getattr(model, total_column)), 0) if total_column else db.literal(0)
+            db.session.execute(rollups.insert().from_select(
+                ['metric', 'day', 'dimension', 'count', 'total'],
+                db.select(db.literal(metric), day, dimension, db.func.count(), total)
+                .where(getattr(model, day_column).isnot(None))
+                .group_by(day, dimension)
+            ))
+    mark_cache_tags(db.session, {f'stats:{table_name}' for table_name in ROLLUP_RULES})
+    db.session.commit()
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_cached_results(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        result_cache.invalidate(tags)
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_cache_tags(session):
+    session.info.pop('cache_tags', None)
+
+# Serializers for the record APIs, generated from the model columns
+OPD_SERIALIZER = RecordSerializer(OPDRecord)
+IPD_SERIALIZER = RecordSerializer(IPDRecord)
+OT_SERIALIZER = RecordSerializer(OTRecord, {'start_time': '%Y-%m-%d %H:%M', 'end_time': '%Y-%m-%d %H:%M'})
+DELIVERY_SERIALIZER = RecordSerializer(DeliveryRecord)
+
+RECORD_TYPES = {
+    'opd': (OPDRecord, OPD_SERIALIZER),
+    'ipd': (IPDRecord, IPD_SERIALIZER),
+    'ot': (OTRecord, OT_SERIALIZER),
+    'delivery': (DeliveryRecord, DELIVERY_SERIALIZER)
+}
+
+# Payload schemas shared by the single-record, queued and bulk APIs
+PATIENT_ID = Field(Text(), MaxLength(20), required=True)
+# JSON numbers, lists and objects are rejected rather than stored in text columns
+REQUIRED_TEXT = Field(Text(), required=True)
+
+RECORD_SCHEMAS = {
+    'opd': Schema({
+        'patient_id': PATIENT_ID,
+        'department': REQUIRED_TEXT,
+        'doctor': REQUIRED_TEXT,
+        'diagnosis': REQUIRED_TEXT,
+        'treatment': REQUIRED_TEXT,
+        'fee': Field(Range(minimum=0), required=True),
+        # Back-filled visits carry their own date; new visits default to now
+        'date': Field(DateFormat('%Y-%m-%d'), default=datetime.utcnow)
+    }),
+    'ipd': Schema({
+        'admission_date': Field(DateFormat('%Y-%m-%d'), required=True),
+        'patient_id': PATIENT_ID,
+        'room_no': REQUIRED_TEXT,
+        'admission_reason': REQUIRED_TEXT,
+        'doctor': REQUIRED_TEXT,
+        'status': REQUIRED_TEXT
+    }),
+    'ot': Schema({
+        'date': Field(DateFormat('%Y-%m-%d'), required=True),
+        'patient_id': PATIENT_ID,
+        'surgery_type': REQUIRED_TEXT,
+        'surgeon': REQUIRED_TEXT,
+        'anesthetist': REQUIRED_TEXT,
+        'start_time': Field(DateFormat('%Y-%m-%d %H:%M'), required=True),
+        'end_time': Field(DateFormat('%Y-%m-%d %H:%M'), required=True),
+        'status': REQUIRED_TEXT
+    }),
+    'delivery': Schema({
+        'date': Field(DateFormat('%Y-%m-%d'), required=True),
+        'patient_id': PATIENT_ID,
+        'delivery_type': REQUIRED_TEXT,
+        'doctor': REQUIRED_TEXT,
+        'baby_gender': REQUIRED_TEXT,
+        'weight': Field(Range(minimum=0), required=True),
+        'status': REQUIRED_TEXT
+    })
+}
+
+# Column values for one API payload; raise ValidationError
+RECORD_PARSERS = {record_type: schema.parse for record_type, schema in RECORD_SCHEMAS.items()}
+
+# Filtering, sorting and keyset pagination for the record list APIs
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+FILTER_PARAMS = ['patient_id', 'department', 'doctor', 'surgeon', 'status']
+RECORD_DATE_COLUMNS = {
+    OPDRecord: 'date',
+    IPDRecord: 'admission_date',
+    OTRecord: 'date',
+    DeliveryRecord: 'date'
+}
+
+class InvalidQuery(ValueError):
+    """Raised when list API query parameters cannot be applied"""
+
+def parse_date_param(name):
+    """Parse a YYYY-MM-DD query parameter"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise InvalidQuery(f'{name} must be in YYYY-MM-DD format')
+
+def select_fields(serializer):
+    """Field names requested with ?fields=, always keeping the id for the cursor"""
+    fields = request.args.get('fields')
+    if not fields:
+        return serializer.fields
+    requested = {name.strip() for name in fields.split(',') if name.strip()}
+    unknown = requested - set(serializer.fields)
+    if unknown:
+        raise InvalidQuery(f'Unknown fields: {", ".join(sorted(unknown))}')
+    return [name for name in serializer.fields if name == 'id' or name in requested]
+
+def apply_filters(statement, model):
+    """Add WHERE clauses for the filter and date range parameters"""
+    for name in FILTER_PARAMS:
+        value = request.args.get(name)
+        if value is None:
+            continue
+        if not hasattr(model, name):
+            raise InvalidQuery(f'{model.__tablename__} cannot be filtered by {name}')
+        statement = statement.where(getattr(model, name) == value)
+
+    date_column = getattr(model, RECORD_DATE_COLUMNS[model])
+    date_from = parse_date_param('date_from')
+    date_to = parse_date_param('date_to')
+    if date_from:
+        statement = statement.where(date_column >= date_from)
+    if date_to:
+        # date_to is inclusive of the whole day
+        statement = statement.where(date_column < date_to + timedelta(days=1))
+    return statement
+
+def parse_sort(model):
+    """Return (column, descending) for ?sort=, which accepts id or the record date, prefixed with - for descending"""
+    sort = request.args.get('sort', 'id')
+    descending = sort.startswith('-')
+    name = sort.lstrip('-')
+    if name not in ('id', RECORD_DATE_COLUMNS[model]):
+        raise InvalidQuery(f'Cannot sort by {name}')
+    return getattr(model, name), descending
+
+def list_records(model, serializer):
+    """Fetch one page of records using the request's filter, sort and paging parameters"""
+    after_id = request.args.get('after_id', type=int)
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    fields = select_fields(serializer)
+    dialect_name = db.engine.dialect.name
+    statement = apply_filters(db.select(*serializer.select_columns(fields, dialect_name)), model)
+    sort_column, descending = parse_sort(model)
+
+    # Keyset condition: continue strictly after the (sort value, id) of the cursor row
+    if after_id is not None:
+        if sort_column is model.id:
+            statement = statement.where(model.id < after_id if descending else model.id > after_id)
+        else:
+            after_value = db.session.execute(
+                db.select(sort_column).where(model.id == after_id)
+            ).scalar()
+            if after_value is None:
+                raise InvalidQuery(f'Unknown cursor: {after_id}')
+            position = db.tuple_(sort_column, model.id)
+            cursor = db.tuple_(after_value, after_id)
+            statement = statement.where(position < cursor if descending else position > cursor)
+
+    if sort_column is model.id:
+        order_by = [model.id]
+    else:
+        order_by = [sort_column, model.id]
+    if descending:
+        order_by = [column.desc() for column in order_by]
+
+    # Fetch one extra row to know whether another page exists
+    rows = db.session.execute(statement.order_by(*order_by).limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].id
+    return {
+        'records': serializer.to_dicts(rows, fields, dialect_name),
+        'next_cursor': next_cursor
+    }
+
+def list_response(model, serializer):
+    """Serve a record list page, answering 304 when the client has the current table version"""
+    table_name = model.__tablename__
+    version = get_table_version(table_name)
+    etag = f'{table_name}-{version}'
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        # Keyed on the version the ETag names, so a page never outlives a write from any worker
+        page = result_cache.get_or_compute(
+            f'{table_name}:list', request.args.to_dict(), [table_name],
+            lambda: list_records(model, serializer), versions={table_name: version}
+        )
+        response = current_app.response_class(dumps(page), mimetype='application/json')
+    response.set_etag(etag)
+    # Let browsers cache the page but revalidate it on every fetch
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@main.app_errorhandler(InvalidQuery)
+def invalid_query(error):
+    return jsonify({'error': str(error)}), 400
+
+# Cached user loading, so authenticated requests do not query the user table
+USER_SNAPSHOT_FIELDS = ('id', 'username', 'role')
+# Changes to these fields bump the 'user' table version, which is part of every cache key
+USER_TRACKED_FIELDS = USER_SNAPSHOT_FIELDS + ('password',)
+# Sized by create_app from USER_CACHE_MAX_ENTRIES and USER_CACHE_TTL; a TTL of 0 disables it
+user_cache = MemoryBackend()
+# This worker's last read of the 'user' table version, re-read every USER_VERSION_CHECK_INTERVAL seconds
+user_version = {'version': 0, 'checked_at': float('-inf')}
+
+def current_user_version():
+    """The user table version, read from the database at most once per interval per worker"""
+    now = time.monotonic()
+    if now - user_version['checked_at'] >= current_app.config['USER_VERSION_CHECK_INTERVAL']:
+        user_version.update(version=get_table_version('user'), checked_at=now)
+    return user_version['version']
+
+class UserPrincipal(UserMixin):
+    """Read-only identity rebuilt from cached columns; never part of a database session"""
+
+    def __init__(self, id, username, role):
+        self.id = id
+        self.username = username
+        self.role = role
+
+def user_snapshot(user):
+    return {field: getattr(user, field) for field in USER_SNAPSHOT_FIELDS}
+
+@event.listens_for(db.session, 'after_flush')
+def track_user_changes(session, flush_context):
+    for obj in session.dirty | session.deleted:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if obj in session.deleted or any(state.attrs[field].history.has_changes()
+                                             for field in USER_TRACKED_FIELDS):
+                # Committed with the change, so every worker's cached users go stale together
+                bump_table_versions(session, ['user'])
+                session.info['user_version_changed'] = True
+                return
+
+@event.listens_for(db.session, 'after_commit')
+def recheck_user_version(session):
+    # The committing worker sees its own change on the next request; others within the interval
+    if session.info.pop('user_version_changed', False):
+        user_version['checked_at'] = float('-inf')
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_user_version_change(session):
+    session.info.pop('user_version_changed', None)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    config = current_app.config
+    if config['SESSION_CARRIES_ROLE']:
+        identity = session.get('_identity')
+        if identity and identity['id'] == user_id and \
+                time.time() - identity['issued_at'] < config['SESSION_ROLE_MAX_AGE']:
+            return UserPrincipal(**identity['user'])
+
+    if user_cache.ttl <= 0:
+        return db.session.get(User, user_id)
+    key = f'user:{user_id}@{current_user_version()}'
+    snapshot = user_cache.get(key)
+    if snapshot is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            user_cache.set(key, user_snapshot(user))
+        return user
+    return UserPrincipal(**snapshot)
+
+def remember_identity(user):
+    """Store the user's id, name and role in the signed session when enabled"""
+    if current_app.config['SESSION_CARRIES_ROLE']:
+        session['_identity'] = {
+            'id': user.id,
+            'issued_at': time.time(),
+            'user': {'id': user.id, 'username': user.username, 'role': user.role}
+        }
 
 # Routes
-@hospital_management_system.route('/')
+@main.route('/')
 def index():
     return render_template('index.html')
 
-@hospital_management_system.route('/test')
+@main.route('/test')
 def test():
     return "Server is running!"
 
-@hospital_management_system.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
         user = User.query.filter_by(username=username).first()
-        
-        if user and user.check_password(password):
-            login_user(user)
-            return redirect(url_for('dashboard'))
-        flash('Invalid username or password')
+
+        try:
+            if user and user.check_password(password):
+                # Upgrade hashes made with an older method or cost
+                if password_hasher.needs_rehash(user.password):
+                    user.set_password(password)
+                    db.session.commit()
+                login_user(user)
+                remember_identity(user)
+                return redirect(url_for('main.dashboard'))
+            flash('Invalid username or password')
+        except HashingBusy as e:
+            flash(str(e))
+            return render_template('login.html'), 503
     return render_template('login.html')
 
-@hospital_management_system.route('/logout')
+@main.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('login'))
+    session.pop('_identity', None)
+    return redirect(url_for('main.login'))
 
-@hospital_management_system.route('/dashboard')
+@main.route('/dashboard')
 @login_required
 def dashboard():
     return render_template('dashboard.html')
 
 # Patient Registration
-@hospital_management_system.route('/register_patient', methods=['GET', 'POST'])
+@main.route('/register_patient', methods=['GET', 'POST'])
 @login_required
 def register_patient():
     if request.method == 'POST':
         patient = Patient(
-            patient_id=request.form['patient_id'],
+            patient_id=request.form.get('patient_id', '').strip() or patient_ids.next_id(),
             name=request.form['name'],
             age=request.form['age'],
             gender=request.form['gender'],
@@ -128,153 +657,594 @@ def register_patient():
         )
         db.session.add(patient)
         db.session.commit()
-        flash('Patient registered successfully!')
-        return redirect(url_for('dashboard'))
+        flash(f'Patient {patient.patient_id} registered successfully!')
+        return redirect(url_for('main.dashboard'))
     return render_template('patient_register.html')
 
 # Department Record Routes
-@hospital_management_system.route('/opd_records')
+@main.route('/opd_records')
 @login_required
 def opd_records():
     return render_template('opd_records.html')
 
-@hospital_management_system.route('/ipd_records')
+@main.route('/ipd_records')
 @login_required
 def ipd_records():
     return render_template('ipd_records.html')
 
-@hospital_management_system.route('/ot_records')
+@main.route('/ot_records')
 @login_required
 def ot_records():
     return render_template('ot_records.html')
 
-@hospital_management_system.route('/delivery_records')
+@main.route('/delivery_records')
 @login_required
 def delivery_records():
     return render_template('delivery_records.html')
 
 # API Routes for Records
-@hospital_management_system.route('/api/opd', methods=['GET', 'POST'])
+@main.route('/api/opd', methods=['GET', 'POST'])
 @login_required
 def opd_records_api():
     if request.method == 'POST':
         data = request.json
-        new_record = OPDRecord(
-            patient_id=data['patient_id'],
-            department=data['department'],
-            doctor=data['doctor'],
-            diagnosis=data['diagnosis'],
-            treatment=data['treatment'],
-            fee=float(data['fee'])
-        )
+        if ingest_queue.enabled:
+            return queue_record('opd', data)
+        try:
+            new_record = OPDRecord(**RECORD_PARSERS['opd'](data))
+        except ValidationError as e:
+            return jsonify({'error': str(e), 'fields': e.errors}), 400
         db.session.add(new_record)
         db.session.commit()
         return jsonify({'message': 'Record added successfully'})
     
-    records = OPDRecord.query.all()
-    return jsonify([{
-        'id': r.id,
-        'date': r.date.strftime('%Y-%m-%d'),
-        'patient_id': r.patient_id,
-        'department': r.department,
-        'doctor': r.doctor,
-        'diagnosis': r.diagnosis,
-        'treatment': r.treatment,
-        'fee': r.fee
-    } for r in records])
-
-@hospital_management_system.route('/api/ipd', methods=['GET', 'POST'])
+    return list_response(OPDRecord, OPD_SERIALIZER)
+
+@main.route('/api/ipd', methods=['GET', 'POST'])
 @login_required
 def ipd_records_api():
     if request.method == 'POST':
         data = request.json
-        new_record = IPDRecord(
-            admission_date=datetime.strptime(data['admission_date'], '%Y-%m-%d'),
-            patient_id=data['patient_id'],
-            room_no=data['room_no'],
-            admission_reason=data['admission_reason'],
-            doctor=data['doctor'],
-            status=data['status']
-        )
+        if ingest_queue.enabled:
+            return queue_record('ipd', data)
+        try:
+            new_record = IPDRecord(**RECORD_PARSERS['ipd'](data))
+        except ValidationError as e:
+            return jsonify({'error': str(e), 'fields': e.errors}), 400
         db.session.add(new_record)
         db.session.commit()
         return jsonify({'message': 'Record added successfully'})
     
-    records = IPDRecord.query.all()
-    return jsonify([{
-        'id': r.id,
-        'admission_date': r.admission_date.strftime('%Y-%m-%d'),
-        'patient_id': r.patient_id,
-        'room_no': r.room_no,
-        'admission_reason': r.admission_reason,
-        'doctor': r.doctor,
-        'discharge_date': r.discharge_date.strftime('%Y-%m-%d') if r.discharge_date else None,
-        'status': r.status
-    } for r in records])
-
-@hospital_management_system.route('/api/ot', methods=['GET', 'POST'])
+    return list_response(IPDRecord, IPD_SERIALIZER)
+
+@main.route('/api/ot', methods=['GET', 'POST'])
 @login_required
 def ot_records_api():
     if request.method == 'POST':
         data = request.json
-        new_record = OTRecord(
-            date=datetime.strptime(data['date'], '%Y-%m-%d'),
-            patient_id=data['patient_id'],
-            surgery_type=data['surgery_type'],
-            surgeon=data['surgeon'],
-            anesthetist=data['anesthetist'],
-            start_time=datetime.strptime(data['start_time'], '%Y-%m-%d %H:%M'),
-            end_time=datetime.strptime(data['end_time'], '%Y-%m-%d %H:%M'),
-            status=data['status']
-        )
+        if ingest_queue.enabled:
+            return queue_record('ot', data)
+        try:
+            new_record = OTRecord(**RECORD_PARSERS['ot'](data))
+        except ValidationError as e:
+            return jsonify({'error': str(e), 'fields': e.errors}), 400
         db.session.add(new_record)
         db.session.commit()
         return jsonify({'message': 'Record added successfully'})
     
-    records = OTRecord.query.all()
-    return jsonify([{
-        'id': r.id,
-        'date': r.date.strftime('%Y-%m-%d'),
-        'patient_id': r.patient_id,
-        'surgery_type': r.surgery_type,
-        'surgeon': r.surgeon,
-        'anesthetist': r.anesthetist,
-        'start_time': r.start_time.strftime('%Y-%m-%d %H:%M'),
-        'end_time': r.end_time.strftime('%Y-%m-%d %H:%M'),
-        'status': r.status
-    } for r in records])
-
-@hospital_management_system.route('/api/delivery', methods=['GET', 'POST'])
+    return list_response(OTRecord, OT_SERIALIZER)
+
+@main.route('/api/delivery', methods=['GET', 'POST'])
 @login_required
 def delivery_records_api():
     if request.method == 'POST':
         data = request.json
-        new_record = DeliveryRecord(
-            date=datetime.strptime(data['date'], '%Y-%m-%d'),
-            patient_id=data['patient_id'],
-            delivery_type=data['delivery_type'],
-            doctor=data['doctor'],
-            baby_gender=data['baby_gender'],
-            weight=float(data['weight']),
-            status=data['status']
-        )
+        if ingest_queue.enabled:
+            return queue_record('delivery', data)
+        try:
+            new_record = DeliveryRecord(**RECORD_PARSERS['delivery'](data))
+        except ValidationError as e:
+            return jsonify({'error': str(e), 'fields': e.errors}), 400
         db.session.add(new_record)
         db.session.commit()
         return jsonify({'message': 'Record added successfully'})
     
-    records = DeliveryRecord.query.all()
-    return jsonify([{
-        'id': r.id,
-        'date': r.date.strftime('%Y-%m-%d'),
-        'patient_id': r.patient_id,
-        'delivery_type': r.delivery_type,
-        'doctor': r.doctor,
-        'baby_gender': r.baby_gender,
-        'weight': r.weight,
-        'status': r.status
-    } for r in records])
+    return list_response(DeliveryRecord, DELIVERY_SERIALIZER)
+
+@main.route('/api/cache/stats')
+@login_required
+def cache_stats_api():
+    return jsonify(result_cache.stats())
+
+# Patient timeline
+TIMELINE_SOURCES = [
+    # (record type, model, date column, detail column, clinician column, status column)
+    ('opd', OPDRecord, 'date', 'diagnosis', 'doctor', None),
+    ('ipd', IPDRecord, 'admission_date', 'admission_reason', 'doctor', 'status'),
+    ('ot', OTRecord, 'date', 'surgery_type', 'surgeon', 'status'),
+    ('delivery', DeliveryRecord, 'date', 'delivery_type', 'doctor', 'status')
+]
+
+def patient_timeline_statement(patient_id):
+    """Build one UNION ALL query over all record tables, with per-type counts as a window column"""
+    selects = []
+    for record_type, model, date_column, detail, clinician, status in TIMELINE_SOURCES:
+        selects.append(
+            db.select(
+                db.literal(record_type).label('record_type'),
+                model.id.label('id'),
+                getattr(model, date_column).label('event_date'),
+                db.cast(getattr(model, detail), db.Text).label('detail'),
+                getattr(model, clinician).label('clinician'),
+                (getattr(model, status) if status else db.null()).label('status')
+            ).where(model.patient_id == patient_id)
+        )
+    events = db.union_all(*selects).subquery()
+    return db.select(
+        events,
+        db.func.count().over(partition_by=events.c.record_type).label('type_count')
+    ).order_by(events.c.event_date.desc(), events.c.record_type, events.c.id.desc())
+
+def build_patient_timeline(patient_id):
+    rows = db.session.execute(patient_timeline_statement(patient_id)).all()
+    counts = {record_type: 0 for record_type, *_ in TIMELINE_SOURCES}
+    events = []
+    for row in rows:
+        counts[row.record_type] = row.type_count
+        events.append({
+            'record_type': row.record_type,
+            'id': row.id,
+            'date': row.event_date.strftime('%Y-%m-%d') if row.event_date else None,
+            'detail': row.detail,
+            'clinician': row.clinician,
+            'status': row.status
+        })
+    return {'patient_id': patient_id, 'counts': counts, 'events': events}
+
+@main.route('/api/patients/<patient_id>/timeline')
+@login_required
+def patient_timeline_api(patient_id):
+    timeline = result_cache.get_or_compute(
+        'patient_timeline', {'patient_id': patient_id}, [],
+        lambda: build_patient_timeline(patient_id), versions=get_table_versions(patient_version_names([patient_id]))
+    )
+    # Only pay for the existence check when there is no history to show
+    if not timeline['events'] and not Patient.query.filter_by(patient_id=patient_id).first():
+        return jsonify({'error': f'Unknown patient: {patient_id}'}), 404
+    return jsonify(timeline)
+
+# Dashboard statistics, served only from the rollup table
+STATS_TABLES = {
+    metric: table_name for table_name, rules in ROLLUP_RULES.items() for metric, *_ in rules
+}
+DEFAULT_STATS_DAYS = 30
+
+def read_rollups(metric, date_from, date_to):
+    rows = db.session.execute(
+        db.select(DailyRollup.day, DailyRollup.dimension, DailyRollup.count, DailyRollup.total)
+        .where(DailyRollup.metric == metric, DailyRollup.day >= date_from, DailyRollup.day <= date_to)
+        .order_by(DailyRollup.day, DailyRollup.dimension)
+    ).all()
+
+    series = []
+    totals = {}
+    for day, dimension, count, total in rows:
+        if count == 0:
+            continue
+        series.append({'day': day.strftime('%Y-%m-%d'), 'dimension': dimension, 'count': count, 'total': total})
+        dimension_total = totals.setdefault(dimension, {'dimension': dimension, 'count': 0, 'total': 0.0})
+        dimension_total['count'] += count
+        dimension_total['total'] += total
+    return {
+        'metric': metric,
+        'date_from': date_from.strftime('%Y-%m-%d'),
+        'date_to': date_to.strftime('%Y-%m-%d'),
+        'series': series,
+        'totals': sorted(totals.values(), key=lambda t: t['count'], reverse=True)
+    }
+
+@main.route('/api/stats/<metric>')
+@login_required
+def stats_api(metric):
+    if metric not in STATS_TABLES:
+        return jsonify({'error': f'Unknown metric: {metric}'}), 404
+    date_to = parse_date_param('date_to') or datetime.now()
+    date_from = parse_date_param('date_from') or date_to - timedelta(days=DEFAULT_STATS_DAYS - 1)
+    date_from, date_to = date_from.date(), date_to.date()
+    table_name = STATS_TABLES[metric]
+    return jsonify(result_cache.get_or_compute(
+        f'stats:{metric}', {'date_from': date_from, 'date_to': date_to}, [f'stats:{table_name}'],
+        lambda: read_rollups(metric, date_from, date_to), versions=get_table_versions([table_name])
+    ))
+
+# Patient lookup for autocomplete, served from the patient_id, name_key and contact_key indexes
+DEFAULT_LOOKUP_LIMIT = 10
+MAX_LOOKUP_LIMIT = 50
+LOOKUP_FIELDS = ['patient_id', 'name', 'age', 'gender', 'contact']
+
+def lookup_statement(query, limit):
+    """UNION ALL of one index range scan per key the query could be a prefix of"""
+    columns = [getattr(Patient, name) for name in LOOKUP_FIELDS] + [Patient.name_key, Patient.contact_key]
+    candidates = []
+    for patient_id in {query, query.upper()}:
+        candidates.append((Patient.patient_id, prefix_condition(Patient.patient_id, patient_id)))
+    name = normalize_name(query)
+    if name:
+        candidates.append((Patient.name_key, prefix_condition(Patient.name_key, name)))
+    digits = reverse_digits(query)
+    if digits and len(digits) >= MIN_CONTACT_DIGITS:
+        candidates.append((Patient.contact_key, prefix_condition(Patient.contact_key, digits)))
+    # Each branch walks its index in order and stops after limit rows
+    branches = [
+        db.select(*columns).where(condition).order_by(order_column).limit(limit).subquery()
+        for order_column, condition in candidates
+    ]
+    return db.union_all(*[db.select(branch) for branch in branches])
+
+def lookup_rank(patient, query):
+    """Sort key: exact ID, ID prefix, exact name, name prefix, then phone number suffix"""
+    name = normalize_name(query)
+    digits = reverse_digits(query)
+    if patient.patient_id.upper() == query.upper():
+        rank = 0
+    elif patient.patient_id.upper().startswith(query.upper()):
+        rank = 1
+    elif name and patient.name_key == name:
+        rank = 2
+    elif name and patient.name_key and patient.name_key.startswith(name):
+        rank = 3
+    elif digits and patient.contact_key == digits:
+        rank = 4
+    else:
+        rank = 5
+    # ID matches list in ID order, the others alphabetically by name
+    return (rank, patient.patient_id if rank < 2 else patient.name_key or '', patient.patient_id)
+
+def lookup_patients(query, limit):
+    rows = {row.patient_id: row for row in db.session.execute(lookup_statement(query, limit))}
+    ranked = sorted(rows.values(), key=lambda row: lookup_rank(row, query))[:limit]
+    return [{name: getattr(row, name) for name in LOOKUP_FIELDS} for row in ranked]
+
+@main.route('/api/patients/lookup')
+@login_required
+def patient_lookup_api():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'query': query, 'patients': []})
+    limit = max(1, min(request.args.get('limit', DEFAULT_LOOKUP_LIMIT, type=int), MAX_LOOKUP_LIMIT))
+    return jsonify({'query': query, 'patients': lookup_patients(query, limit)})
+
+# Full-text search over clinical notes, served from the FTS5 index
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+def parse_search_types():
+    types = request.args.get('type')
+    if not types:
+        return []
+    record_types = [name.strip() for name in types.split(',') if name.strip()]
+    unknown = set(record_types) - set(SEARCH_SOURCES)
+    if unknown:
+        raise InvalidQuery(f'Cannot search record type: {", ".join(sorted(unknown))}')
+    return record_types
+
+@main.route('/api/search')
+@login_required
+def search_api():
+    if db.engine.dialect.name != 'sqlite':
+        return jsonify({'error': 'Full-text search requires SQLite FTS5'}), 501
+    query = request.args.get('q', '').strip()
+    if not query:
+        raise InvalidQuery('q is required')
+    record_types = parse_search_types()
+    date_from = parse_date_param('date_from')
+    date_to = parse_date_param('date_to')
+    if date_to:
+        # date_to is inclusive of the whole day
+        date_to += timedelta(days=1)
+    limit = max(1, min(request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int), MAX_SEARCH_LIMIT))
+    offset = max(0, request.args.get('offset', 0, type=int))
+
+    tables = [SEARCH_SOURCES[name]['table'] for name in record_types or SEARCH_SOURCES]
+    results = result_cache.get_or_compute(
+        'search', request.args.to_dict(), tables,
+        lambda: search_records(db.session.connection(), query, record_types, date_from, date_to, limit, offset),
+        versions=get_table_versions(tables)
+    )
+    return jsonify({'query': query, 'results': results})
+
+# Write-behind ingestion
+def write_ingest_entries(entries):
+    """Insert queued entries and their ticket rows; the caller commits"""
+    rows_by_type = {}
+    for entry in entries:
+        rows_by_type.setdefault(entry['record_type'], []).append(
+            RECORD_PARSERS[entry['record_type']](entry['payload'])
+        )
+    for record_type, rows in rows_by_type.items():
+        insert_record_rows(RECORD_TYPES[record_type][0], rows)
+    db.session.execute(db.insert(IngestTicket), [
+        {'ticket': entry['ticket'], 'record_type': entry['record_type'], 'status': 'committed'}
+        for entry in entries
+    ])
+
+def write_ingest_batch(entries):
+    """Group-commit a batch from the ingestion queue, isolating entries that fail"""
+    # Entries replayed after a crash may be duplicated or already committed
+    entries = list({entry['ticket']: entry for entry in entries}.values())
+    done = set(db.session.execute(
+        db.select(IngestTicket.ticket).where(IngestTicket.ticket.in_([entry['ticket'] for entry in entries]))
+    ).scalars())
+    entries = [entry for entry in entries if entry['ticket'] not in done]
+    if not entries:
+        return
+
+    try:
+        write_ingest_entries(entries)
+        db.session.commit()
+        return
+    except OperationalError:
+        # Locked or unavailable database: let the queue retry the whole batch
+        db.session.rollback()
+        raise
+    except (SQLAlchemyError, KeyError, TypeError, ValueError):
+        db.session.rollback()
+
+    # Retry one by one so a bad entry does not fail the whole batch
+    for entry in entries:
+        try:
+            write_ingest_entries([entry])
+            db.session.commit()
+        except OperationalError:
+            db.session.rollback()
+            raise
+        except (SQLAlchemyError, KeyError, TypeError, ValueError) as e:
+            db.session.rollback()
+            db.session.add(IngestTicket(ticket=entry['ticket'], record_type=entry['record_type'],
+                                        status='failed', error=str(e.__cause__ or e)))
+            db.session.commit()
+
+ingest_queue = IngestQueue(None, write_ingest_batch)
+
+def queue_record(record_type, data):
+    """Validate a record payload and hand it to the write-behind queue"""
+    try:
+        RECORD_PARSERS[record_type](data)
+    except ValidationError as e:
+        return jsonify({'error': str(e), 'fields': e.errors}), 400
+    if record_type == 'opd' and not str(data.get('date') or '').strip():
+        # A visit is dated when it is accepted, not when the writer or a replay gets to it
+        data = dict(data, date=datetime.utcnow().strftime('%Y-%m-%d'))
+    try:
+        ticket = ingest_queue.submit(record_type, data)
+    except QueueFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+    return jsonify({
+        'message': 'Record accepted',
+        'ticket': ticket,
+        'status_url': url_for('main.ingest_status_api', ticket=ticket)
+    }), 202
+
+# Tickets are uuid4 hex strings
+INGEST_TICKET = re.compile(r'[0-9a-f]{32}')
+
+@main.route('/api/ingest/<ticket>')
+@login_required
+def ingest_status_api(ticket):
+    if ingest_queue.is_pending(ticket):
+        return jsonify({'ticket': ticket, 'status': 'queued'})
+    record = db.session.get(IngestTicket, ticket)
+    if record is None:
+        if INGEST_TICKET.fullmatch(ticket):
+            # Possibly still queued in another worker, whose pending set this one cannot see
+            return jsonify({'ticket': ticket, 'status': 'unknown'}), 202
+        return jsonify({'error': f'Unknown ticket: {ticket}'}), 404
+    return jsonify({
+        'ticket': ticket,
+        'record_type': record.record_type,
+        'status': record.status,
+        'error': record.error
+    })
+
+# Bulk ingestion
+BULK_CHUNK_SIZE = 1000
+
+def read_bulk_payload():
+    """Yield (index, item) pairs from a JSON array or NDJSON request body"""
+    if request.mimetype == 'application/x-ndjson':
+        lines = request.get_data(as_text=True).splitlines()
+        index = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                yield index, json.loads(line)
+            except ValueError as e:
+                yield index, e
+            index += 1
+        return
+
+    items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        raise ValueError('Expected a JSON array or an NDJSON body')
+    yield from enumerate(items)
+
+def parse_bulk_chunk(schema, chunk, errors):
+    """Validate a chunk of bulk items as one DataFrame; returns [(index, values)] for the valid ones"""
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records([item for _, item in chunk], index=[index for index, _ in chunk],
+                                      columns=list(schema.fields))
+    report = schema.validate(frame)
+    errors.extend({'index': index, 'error': error} for index, error in report.row_errors().items())
+    valid = report.valid
+    return list(zip(valid.index.tolist(), to_records(valid)))
+
+def insert_record_rows(model, rows):
+    """Insert parsed rows with executemany and apply the same bookkeeping as ORM writes"""
+    db.session.execute(db.insert(model), rows)
+    # Bulk inserts bypass the unit of work, so record the changes explicitly
+    table_name = model.__tablename__
+    bump_table_versions(db.session, {table_name} | patient_version_names(values['patient_id'] for values in rows))
+    mark_cache_tags(db.session, {table_name, f'stats:{table_name}'})
+    deltas = {}
+    for values in rows:
+        rollup_deltas(deltas, table_name, values, 1)
+    apply_rollup_deltas(db.session, deltas)
+
+def insert_bulk_chunk(model, chunk, errors):
+    """Insert one chunk of parsed rows in a single transaction"""
+    if not chunk:
+        return 0
+    try:
+        insert_record_rows(model, [values for _, values in chunk])
+        db.session.commit()
+        return len(chunk)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        message = str(e.__cause__ or e)
+        errors.extend({'index': index, 'error': message} for index, _ in chunk)
+        return 0
+
+@main.route('/api/<record_type>/bulk', methods=['POST'])
+@login_required
+def bulk_records_api(record_type):
+    if record_type not in RECORD_TYPES:
+        return jsonify({'error': f'Unknown record type: {record_type}'}), 404
+
+    model, _ = RECORD_TYPES[record_type]
+    schema = RECORD_SCHEMAS[record_type]
+    inserted = 0
+    errors = []
+    chunk = []
+    try:
+        for index, item in read_bulk_payload():
+            if isinstance(item, Exception):
+                errors.append({'index': index, 'error': f'Invalid JSON: {item}'})
+            elif not isinstance(item, dict):
+                errors.append({'index': index, 'error': 'Expected a JSON object'})
+            else:
+                chunk.append((index, item))
+            if len(chunk) == BULK_CHUNK_SIZE:
+                inserted += insert_bulk_chunk(model, parse_bulk_chunk(schema, chunk, errors), errors)
+                chunk = []
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if chunk:
+        inserted += insert_bulk_chunk(model, parse_bulk_chunk(schema, chunk, errors), errors)
+
+    errors.sort(key=lambda error: error['index'])
+    return jsonify({
+        'inserted': inserted,
+        'failed': len(errors),
+        'errors': errors
+    })
+
+# Streaming exports for reporting
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+def stream_export_rows(model, serializer):
+    """Yield export rows from a server-side cursor without loading the whole table"""
+    dialect_name = db.engine.dialect.name
+    statement = db.select(*serializer.select_columns(serializer.fields, dialect_name)) \
+        .order_by(model.id) \
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    for batch in db.session.execute(statement).partitions():
+        yield from serializer.to_dicts(batch, serializer.fields, dialect_name)
+
+def generate_ndjson(rows):
+    """Encode rows as newline-delimited JSON, one chunk per batch"""
+    chunk = []
+    for row in rows:
+        chunk.append(dumps(row))
+        if len(chunk) == EXPORT_BATCH_SIZE:
+            yield b'\n'.join(chunk) + b'\n'
+            chunk = []
+    if chunk:
+        yield b'\n'.join(chunk) + b'\n'
+
+def generate_csv(rows, fields):
+    """Encode rows as CSV, starting with the header line"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row.values())
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+@main.route('/api/<record_type>/export')
+@login_required
+def export_records_api(record_type):
+    if record_type not in RECORD_TYPES:
+        return jsonify({'error': f'Unknown record type: {record_type}'}), 404
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unsupported export format: {export_format}'}), 400
+
+    model, serializer = RECORD_TYPES[record_type]
+    rows = stream_export_rows(model, serializer)
+    if export_format == 'csv':
+        body = generate_csv(rows, serializer.fields)
+    else:
+        body = generate_ndjson(rows)
+
+    filename = f'{record_type}_records_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{export_format}'
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+def create_app(config_class=None):
+    """Application factory; config_class is a config.py class or its name in config.config"""
+    if config_class is None:
+        config_class = os.environ.get('FLASK_CONFIG', 'production')
+    if isinstance(config_class, str):
+        config_class = config[config_class]
+
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+    config_class.init_app(app)
+
+    db.init_app(app)
+    configure_engine(app, db)
+    login_manager.init_app(app)
+    result_cache.init_app(app)
+    password_hasher.init_app(app)
+    user_cache.max_entries = app.config['USER_CACHE_MAX_ENTRIES']
+    user_cache.ttl = app.config['USER_CACHE_TTL']
+    ingest_queue.init_app(app)
+    patient_ids.init_app(app)
+    request_metrics.init_app(app, db)
+    slow_query_log.init_app(app, db)
+    app.register_blueprint(main)
+    return app
+
+def init_worker(app):
+    """Per-process setup for a worker forked from a master that preloaded the app"""
+    with app.app_context():
+        # Pooled connections inherited through fork must not be shared between processes
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    if ingest_queue.enabled:
+        # Replay spill files of crashed workers now rather than on this worker's first queued POST
+        ingest_queue.start()
+
+app = create_app()
 
 if __name__ == '__main__':
-    with hospital_management_system.app_context():
+    with app.app_context():
         db.create_all()
-    hospital_management_system.run(debug=True, host='127.0.0.1', port=5001) 
\ No newline at end of file
+    app.run(debug=app.config['DEBUG'], host='127.0.0.1', port=5001)
@@ -0,0 +1,374 @@
+"""Online, verified and compressed backups of the SQLite database.
+
+Full snapshots are copied with SQLite's online backup API in steps of
+BACKUP_STEP_PAGES pages, pausing between steps. In WAL mode the copy reads
+from one pinned snapshot, so writers carry on and the copy never restarts.
+Every copy is checked with PRAGMA integrity_check before it is compressed
+(zstd if the zstandard package is installed, otherwise gzip) into the
+backup directory.
+
+Incremental backups store only the pages that changed since the previous
+backup, found by comparing per-page digests kept with the newest backup of
+each chain. A chain is one full snapshot plus its incrementals; restoring
+replays a chain up to the requested backup. Only the newest BACKUP_KEEP
+chains are retained.
+
+Usage: python backup.py [--incremental] [--database PATH] [--dir backups] [--keep 7]
+       python backup.py --list
+       python backup.py --restore NAME --to PATH
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import struct
+import time
+from datetime import datetime
+
+DEFAULT_STEP_PAGES = 1024
+STEP_PAUSE = 0.005  # seconds between steps, so the copy does not monopolise the disk
+MAX_RESTARTS = 3  # outside WAL mode, stepping restarts whenever another connection writes
+COPY_CHUNK = 1024 * 1024
+DIGEST_SIZE = 8  # bytes of blake2b per page in the digest files
+INCREMENT_HEADER = struct.Struct('>8sII')  # magic, page size, page count
+INCREMENT_MAGIC = b'HRINCR01'
+PAGE_NUMBER = struct.Struct('>I')
+EXTENSIONS = {'zstd': '.zst', 'gzip': '.gz', 'none': ''}
+
+class BackupError(Exception):
+    """Raised when a backup cannot be made, verified or restored"""
+
+class RestartBackup(Exception):
+    pass
+
+def resolve_compression(compression):
+    """Fall back to gzip when zstd is requested but the zstandard package is missing"""
+    if compression == 'zstd':
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            return 'gzip'
+    if compression not in EXTENSIONS:
+        raise BackupError(f'Unknown compression: {compression}')
+    return compression
+
+def open_compressed(path, mode, compression):
+    """A binary file object that compresses on write or decompresses on read, in a stream"""
+    if compression == 'gzip':
+        return gzip.open(path, mode + 'b', compresslevel=6)
+    if compression == 'zstd':
+        import zstandard
+        raw = open(path, mode + 'b')
+        if mode == 'w':
+            return zstandard.ZstdCompressor(level=3, threads=-1).stream_writer(raw, closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    return open(path, mode + 'b')
+
+def copy_snapshot(source_path, target_path, step_pages=DEFAULT_STEP_PAGES):
+    """Copy a consistent snapshot of a live database with the online backup API"""
+    source = sqlite3.connect(source_path, timeout=30, isolation_level=None)
+    target = sqlite3.connect(target_path)
+    try:
+        wal = source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        if wal:
+            # Pin one read snapshot: the steps all copy it, while WAL writers carry on
+            source.execute('BEGIN')
+            source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+        remaining = [None]
+        restarts = [0]
+
+        def pause(status, left, total):
+            if not wal and remaining[0] is not None and left > remaining[0]:
+                restarts[0] += 1
+                if restarts[0] > MAX_RESTARTS:
+                    raise RestartBackup()
+            remaining[0] = left
+            time.sleep(STEP_PAUSE)
+
+        try:
+            source.backup(target, pages=step_pages, progress=pause)
+        except RestartBackup:
+            # Too busy to copy in steps: copy in one step, holding the read lock until done
+            source.backup(target, pages=-1)
+        if wal:
+            source.execute('COMMIT')
+    finally:
+        target.close()
+        source.close()
+
+def verify(path):
+    """PRAGMA integrity_check, returning the page size and count of a good copy"""
+    connection = sqlite3.connect(path)
+    try:
+        problems = [row[0] for row in connection.execute('PRAGMA integrity_check')]
+        if problems != ['ok']:
+            raise BackupError(f'{path} failed integrity_check: {"; ".join(problems[:5])}')
+        page_size = connection.execute('PRAGMA page_size').fetchone()[0]
+        page_count = connection.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        connection.close()
+    return page_size, page_count
+
+def read_pages(path, page_size):
+    with open(path, 'rb') as database:
+        while True:
+            page = database.read(page_size)
+            if not page:
+                return
+            yield page
+
+def page_digest(page):
+    return hashlib.blake2b(page, digest_size=DIGEST_SIZE).digest()
+
+def snapshot_digest(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as database:
+        for chunk in iter(lambda: database.read(COPY_CHUNK), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+class BackupSet:
+    """The backups of one database in one directory, each with a .json manifest"""
+
+    def __init__(self, directory, prefix='hospital'):
+        self.directory = directory
+        self.prefix = prefix
+
+    def path(self, name, suffix=''):
+        return os.path.join(self.directory, name + suffix)
+
+    def manifests(self):
+        """All manifests, oldest first"""
+        manifests = []
+        pattern = re.compile(rf'{re.escape(self.prefix)}_\d{{8}}_\d{{6}}_\d{{6}}_(full|incremental)\.json$')
+        for path in glob.glob(os.path.join(self.directory, f'{self.prefix}_*.json')):
+            # Skip the backups of other databases whose name starts with this prefix
+            if not pattern.match(os.path.basename(path)):
+                continue
+            with open(path) as manifest:
+                manifests.append(json.load(manifest))
+        return sorted(manifests, key=lambda manifest: manifest['name'])
+
+    def manifest(self, name):
+        with open(self.path(name, '.json')) as manifest:
+            return json.load(manifest)
+
+    def new_name(self, kind):
+        return f"{self.prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{kind}"
+
+    def save(self, manifest, digests):
+        """Write the manifest and move the page digests from the parent to the new backup"""
+        with open(self.path(manifest['name'], '.pages'), 'wb') as pages:
+            pages.write(b''.join(digests))
+        with open(self.path(manifest['name'], '.json.tmp'), 'w') as output:
+            json.dump(manifest, output, indent=2)
+        os.replace(self.path(manifest['name'], '.json.tmp'), self.path(manifest['name'], '.json'))
+        # Only the newest backup of a chain is ever diffed against
+        if manifest.get('parent'):
+            remove(self.path(manifest['parent'], '.pages'))
+
+    def digests(self, name):
+        path = self.path(name, '.pages')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as pages:
+            data = pages.read()
+        return [data[i:i + DIGEST_SIZE] for i in range(0, len(data), DIGEST_SIZE)]
+
+    def chain(self, name):
+        """Manifests from the full snapshot up to name, in replay order"""
+        chain = [self.manifest(name)]
+        while chain[0]['kind'] != 'full':
+            chain.insert(0, self.manifest(chain[0]['parent']))
+        return chain
+
+    def prune(self, keep):
+        """Delete all but the newest keep chains; returns the names removed"""
+        manifests = self.manifests()
+        fulls = [manifest['name'] for manifest in manifests if manifest['kind'] == 'full']
+        kept = set(fulls[-keep:]) if keep > 0 else set(fulls)
+        removed = []
+        for manifest in manifests:
+            if manifest['base'] not in kept:
+                for suffix in (manifest['file'][len(manifest['name']):], '.pages', '.json'):
+                    remove(self.path(manifest['name'], suffix))
+                removed.append(manifest['name'])
+        return removed
+
+def remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def full_backup(source_path, backups, compression='zstd', step_pages=DEFAULT_STEP_PAGES):
+    """Copy, verify and compress a full snapshot; returns its manifest"""
+    compression = resolve_compression(compression)
+    name = backups.new_name('full')
+    temporary = backups.path(name, '.tmp.db')
+    start = time.perf_counter()
+    try:
+        copy_snapshot(source_path, temporary, step_pages)
+        page_size, page_count = verify(temporary)
+        file_name = name + '.db' + EXTENSIONS[compression]
+        digests = []
+        with open_compressed(backups.path(file_name), 'w', compression) as output:
+            for page in read_pages(temporary, page_size):
+                output.write(page)
+                digests.append(page_digest(page))
+        manifest = {
+            'name': name, 'kind': 'full', 'base': name, 'parent': None, 'file': file_name,
+            'created': datetime.now().isoformat(timespec='seconds'), 'source': os.path.abspath(source_path),
+            'compression': compression, 'page_size': page_size, 'page_count': page_count,
+            'pages_written': page_count, 'sha256': snapshot_digest(temporary), 'integrity': 'ok'
+        }
+    finally:
+        remove(temporary)
+    manifest['bytes'] = os.path.getsize(backups.path(file_name))
+    manifest['seconds'] = round(time.perf_counter() - start, 2)
+    backups.save(manifest, digests)
+    return manifest
+
+def incremental_backup(source_path, backups, compression='zstd', step_pages=DEFAULT_STEP_PAGES):
+    """Store the pages changed since the newest backup, or a full snapshot if there is nothing to diff"""
+    manifests = backups.manifests()
+    parent = manifests[-1] if manifests else None
+    previous = backups.digests(parent['name']) if parent else None
+    if previous is None or parent['source'] != os.path.abspath(source_path):
+        return full_backup(source_path, backups, compression, step_pages)
+
+    compression = resolve_compression(compression)
+    name = backups.new_name('incremental')
+    temporary = backups.path(name, '.tmp.db')
+    start = time.perf_counter()
+    try:
+        copy_snapshot(source_path, temporary, step_pages)
+        page_size, page_count = verify(temporary)
+        if page_size != parent['page_size']:
+            # VACUUM with a new page_size changes every page
+            remove(temporary)
+            return full_backup(source_path, backups, compression, step_pages)
+        file_name = name + '.pages' + EXTENSIONS[compression]
+        digests = []
+        changed = 0
+        with open_compressed(backups.path(file_name), 'w', compression) as output:
+            output.write(INCREMENT_HEADER.pack(INCREMENT_MAGIC, page_size, page_count))
+            for number, page in enumerate(read_pages(temporary, page_size), 1):
+                digest = page_digest(page)
+                digests.append(digest)
+                if number > len(previous) or previous[number - 1] != digest:
+                    output.write(PAGE_NUMBER.pack(number) + page)
+                    changed += 1
+        manifest = {
+            'name': name, 'kind': 'incremental', 'base': parent['base'], 'parent': parent['name'],
+            'file': file_name, 'created': datetime.now().isoformat(timespec='seconds'),
+            'source': os.path.abspath(source_path), 'compression': compression, 'page_size': page_size,
+            'page_count': page_count, 'pages_written': changed, 'sha256': snapshot_digest(temporary),
+            'integrity': 'ok'
+        }
+    finally:
+        remove(temporary)
+    manifest['bytes'] = os.path.getsize(backups.path(file_name))
+    manifest['seconds'] = round(time.perf_counter() - start, 2)
+    backups.save(manifest, digests)
+    return manifest
+
+def apply_increment(stream, database, page_size):
+    header = stream.read(INCREMENT_HEADER.size)
+    magic, increment_page_size, page_count = INCREMENT_HEADER.unpack(header)
+    if magic != INCREMENT_MAGIC or increment_page_size != page_size:
+        raise BackupError('Not an incremental backup of this chain')
+    while True:
+        number = stream.read(PAGE_NUMBER.size)
+        if not number:
+            break
+        page = stream.read(page_size)
+        database.seek((PAGE_NUMBER.unpack(number)[0] - 1) * page_size)
+        database.write(page)
+    database.truncate(page_count * page_size)
+
+def restore(backups, name, target_path):
+    """Rebuild the database as of backup name at target_path and verify it"""
+    if os.path.exists(target_path):
+        raise BackupError(f'{target_path} already exists')
+    chain = backups.chain(name)
+    temporary = target_path + '.restoring'
+    try:
+        with open(temporary, 'w+b') as database:
+            for manifest in chain:
+                with open_compressed(backups.path(manifest['file']), 'r', manifest['compression']) as stream:
+                    if manifest['kind'] == 'full':
+                        for chunk in iter(lambda: stream.read(COPY_CHUNK), b''):
+                            database.write(chunk)
+                    else:
+                        apply_increment(stream, database, manifest['page_size'])
+        if snapshot_digest(temporary) != chain[-1]['sha256']:
+            raise BackupError(f'Restored database does not match the checksum of {name}')
+        verify(temporary)
+        os.replace(temporary, target_path)
+    finally:
+        remove(temporary)
+    return chain[-1]
+
+def run_backup(source_path, directory, incremental=False, compression='zstd', keep=7,
+               step_pages=DEFAULT_STEP_PAGES):
+    """Take a full or incremental backup, then apply the retention policy"""
+    if not os.path.exists(source_path):
+        raise BackupError(f'No database at {source_path}')
+    os.makedirs(directory, exist_ok=True)
+    backups = BackupSet(directory, os.path.splitext(os.path.basename(source_path))[0])
+    backup = incremental_backup if incremental else full_backup
+    manifest = backup(source_path, backups, compression, step_pages)
+    manifest['pruned'] = backups.prune(keep)
+    return manifest
+
+def configured_database():
+    """The application's SQLite file and backup settings"""
+    from app import app, db
+    with app.app_context():
+        return db.engine.url.database, app.config
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--incremental', action='store_true', help='store only the pages changed since the last backup')
+    parser.add_argument('--database', help='SQLite file to back up (default: the configured database)')
+    parser.add_argument('--dir', help='backup directory (default: BACKUP_DIR)')
+    parser.add_argument('--keep', type=int, help='full snapshots to keep with their incrementals, 0 for all '
+                                                 '(default: BACKUP_KEEP)')
+    parser.add_argument('--compression', choices=sorted(EXTENSIONS), help='default: BACKUP_COMPRESSION')
+    parser.add_argument('--list', action='store_true', help='list the backups')
+    parser.add_argument('--restore', metavar='NAME', help='restore the database as of this backup (see --list)')
+    parser.add_argument('--to', metavar='PATH', help='new file to restore into')
+    args = parser.parse_args()
+
+    database, config = configured_database()
+    database = args.database or database
+    directory = args.dir or config['BACKUP_DIR']
+    backups = BackupSet(directory, os.path.splitext(os.path.basename(database))[0])
+
+    if args.list:
+        for manifest in backups.manifests():
+            print(f"{manifest['name']:48} {manifest['kind']:12} {manifest['pages_written']:>10} pages "
+                  f"{manifest['bytes'] / 2 ** 20:10.1f} MB")
+        return
+    if args.restore:
+        if not args.to:
+            parser.error('--restore needs --to')
+        manifest = restore(backups, args.restore, args.to)
+        print(f"Restored {manifest['name']} to {args.to} ({manifest['page_count']} pages, integrity ok)")
+        return
+
+    manifest = run_backup(database, directory, args.incremental, args.compression or config['BACKUP_COMPRESSION'],
+                          config['BACKUP_KEEP'] if args.keep is None else args.keep, config['BACKUP_STEP_PAGES'])
+    print(f"{manifest['kind'].capitalize()} backup {backups.path(manifest['file'])}: "
+          f"{manifest['pages_written']} of {manifest['page_count']} pages, "
+          f"{manifest['bytes'] / 2 ** 20:.1f} MB in {manifest['seconds']}s, integrity ok")
+    if manifest['pruned']:
+        print(f"Removed {len(manifest['pruned'])} old backup(s)")
+
+if __name__ == '__main__':
+    main()
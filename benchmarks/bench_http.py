@@ -0,0 +1,530 @@
+"""Load test of every API route through the production server, with baseline comparison.
+
+Seeds a database at the requested scale (patients, OPD, IPD, OT and
+delivery records in fixed proportions, generated from a fixed seed so runs
+are comparable), starts `gunicorn -c gunicorn.conf.py` against it and runs
+each workload below from concurrent client processes for a fixed time.
+Every workload reports throughput, p50/p95/p99 latency, errors and the
+peak RSS of the server (master plus workers, sampled from /proc).
+
+Results can be saved as JSON and compared against an earlier run; any
+workload whose throughput drops, or whose p95/p99 latency or peak RSS
+grows, by more than --threshold percent is reported and the script exits
+with status 1. Write workloads run last since they grow the tables.
+
+Seeding 10M records takes several minutes; pass --database to keep the
+seeded file and reuse it on the next run.
+
+Usage: python benchmarks/bench_http.py [--records 10000] [--workloads opd_list,search]
+       [--clients 8] [--duration 10] [--output run.json] [--baseline base.json] [--threshold 10]
+       python benchmarks/bench_http.py --compare run.json --baseline base.json
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+SEED = 20240101
+# Share of the requested record count that goes to each table
+SCALE_SHARES = {'patient': 0.1, 'opd': 0.6, 'ipd': 0.15, 'ot': 0.05, 'delivery': 0.1}
+SEED_BATCH_SIZE = 50000
+DAYS = 730
+
+DEPARTMENTS = ['General', 'Medicine', 'Surgery', 'Paediatrics', 'Orthopaedics', 'ENT', 'Ophthalmology',
+               'Dermatology']
+DOCTORS = [f'Dr. {name}' for name in ['Rao', 'Kumar', 'Sharma', 'Reddy', 'Nair', 'Iyer', 'Khan', 'Das',
+                                      'Patel', 'Menon', 'Gowda', 'Singh', 'Joshi', 'Pillai', 'Shetty', 'Bhat']]
+FIRST_NAMES = ['Anita', 'Anil', 'Ravi', 'Priya', 'Suresh', 'Lakshmi', 'Mohan', 'Fatima', 'John', 'Meera',
+               'Arjun', 'Kavya', 'Imran', 'Deepa', 'Vikram', 'Sunita', 'Rahul', 'Asha', 'Joseph', 'Nandini']
+LAST_NAMES = ['Rao', 'Kumar', 'Sharma', 'Reddy', 'Nair', 'Iyer', 'Khan', 'Das', 'Patel', 'Menon',
+              'Gowda', 'Singh', 'Joshi', 'Pillai', 'Shetty', 'Bhat', 'Thomas', 'Verma', 'Ghosh', 'Naidu']
+DIAGNOSES = ['fever', 'cough', 'hypertension', 'diabetes mellitus', 'gastritis', 'migraine', 'asthma',
+             'urinary tract infection', 'anaemia', 'otitis media', 'cellulitis', 'appendicitis']
+TREATMENTS = ['paracetamol', 'rest', 'antibiotics', 'metformin', 'antacids', 'inhaler', 'iron supplements',
+              'oral rehydration', 'referral to surgery', 'follow up in one week']
+SURGERIES = ['Appendectomy', 'Hernia repair', 'Cholecystectomy', 'Caesarean section', 'Cataract surgery',
+             'Tonsillectomy', 'Fracture fixation']
+DELIVERY_TYPES = ['Normal', 'Caesarean', 'Assisted']
+SEARCH_TERMS = ['fever', 'appendicitis', 'diab', 'urinary infection', 'paracetamol rest', 'migraine']
+METRICS = ['opd_visits', 'ipd_admissions', 'ipd_discharges', 'ot_surgeries', 'deliveries']
+BULK_ROWS = 100
+
+def record_counts(records):
+    return {table: max(1, int(records * share)) for table, share in SCALE_SHARES.items()}
+
+# Synthetic rows, shared by the seeding and the write workloads
+def random_date(rng, end):
+    return end - timedelta(days=rng.randrange(DAYS), minutes=rng.randrange(24 * 60))
+
+def patient_row(rng, index):
+    return {
+        'patient_id': f'PAT{index:08d}',
+        'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+        'age': rng.randrange(1, 90),
+        'gender': rng.choice(['Male', 'Female']),
+        'contact': f'9{rng.randrange(10 ** 9):09d}'
+    }
+
+def opd_row(rng, patients, end):
+    return {
+        'date': random_date(rng, end),
+        'patient_id': f'PAT{rng.randrange(patients):08d}',
+        'department': rng.choice(DEPARTMENTS),
+        'doctor': rng.choice(DOCTORS),
+        'diagnosis': ' and '.join(rng.sample(DIAGNOSES, 2)),
+        'treatment': ', '.join(rng.sample(TREATMENTS, 2)),
+        'fee': float(rng.choice([100, 200, 300, 500]))
+    }
+
+def ipd_row(rng, patients, end):
+    admission = random_date(rng, end)
+    discharged = admission < end - timedelta(days=7) or rng.random() < 0.5
+    return {
+        'admission_date': admission,
+        'patient_id': f'PAT{rng.randrange(patients):08d}',
+        'room_no': str(rng.randrange(100, 400)),
+        'admission_reason': rng.choice(DIAGNOSES),
+        'doctor': rng.choice(DOCTORS),
+        'discharge_date': admission + timedelta(days=rng.randrange(1, 7)) if discharged else None,
+        'status': 'Discharged' if discharged else 'Admitted'
+    }
+
+def ot_row(rng, patients, end):
+    start = random_date(rng, end)
+    return {
+        'date': start.replace(hour=0, minute=0),
+        'patient_id': f'PAT{rng.randrange(patients):08d}',
+        'surgery_type': rng.choice(SURGERIES),
+        'surgeon': rng.choice(DOCTORS),
+        'anesthetist': rng.choice(DOCTORS),
+        'start_time': start,
+        'end_time': start + timedelta(minutes=rng.randrange(30, 240)),
+        'status': 'Completed'
+    }
+
+def delivery_row(rng, patients, end):
+    return {
+        'date': random_date(rng, end),
+        'patient_id': f'PAT{rng.randrange(patients):08d}',
+        'delivery_type': rng.choice(DELIVERY_TYPES),
+        'doctor': rng.choice(DOCTORS),
+        'baby_gender': rng.choice(['Male', 'Female']),
+        'weight': round(rng.uniform(2.0, 4.5), 2),
+        'status': 'Completed'
+    }
+
+RECORD_ROWS = {'opd': opd_row, 'ipd': ipd_row, 'ot': ot_row, 'delivery': delivery_row}
+
+def seed(records):
+    """Fill the (empty) database with records spread over the last DAYS days"""
+    from app import app, db, password_hasher, rebuild_rollups, User, Patient, OPDRecord, IPDRecord, OTRecord, \
+        DeliveryRecord
+    models = {'patient': Patient, 'opd': OPDRecord, 'ipd': IPDRecord, 'ot': OTRecord, 'delivery': DeliveryRecord}
+    counts = record_counts(records)
+    rng = random.Random(SEED)
+    end = datetime.now()
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='bench', password=password_hasher.hash('benchpass'), role='admin'))
+        for table, count in counts.items():
+            start = time.perf_counter()
+            for offset in range(0, count, SEED_BATCH_SIZE):
+                batch = range(offset, min(count, offset + SEED_BATCH_SIZE))
+                if table == 'patient':
+                    rows = [patient_row(rng, i) for i in batch]
+                else:
+                    rows = [RECORD_ROWS[table](rng, counts['patient'], end) for _ in batch]
+                db.session.execute(db.insert(models[table]), rows)
+                db.session.commit()
+            print(f"  {table:9} {count:>10} rows in {time.perf_counter() - start:6.1f}s")
+        rebuild_rollups()
+    return counts
+
+def seeded_counts():
+    """Row counts of an existing benchmark database, or None if it has not been seeded"""
+    from app import app, db, Patient, OPDRecord, IPDRecord, OTRecord, DeliveryRecord
+    with app.app_context():
+        if not db.inspect(db.engine).has_table('patient'):
+            return None
+        counts = {table: db.session.query(model).count() for table, model in
+                  [('patient', Patient), ('opd', OPDRecord), ('ipd', IPDRecord), ('ot', OTRecord),
+                   ('delivery', DeliveryRecord)]}
+    return counts if counts['patient'] else None
+
+# Workloads: each builds one request as (method, path, body, content type) from a client's RNG
+def random_patient(rng, counts):
+    return f"PAT{rng.randrange(counts['patient']):08d}"
+
+def random_day(rng):
+    return (datetime.now() - timedelta(days=rng.randrange(DAYS))).strftime('%Y-%m-%d')
+
+def list_page(record_type):
+    def build(rng, counts):
+        params = {'limit': 50, 'after_id': rng.randrange(counts[record_type])}
+        return 'GET', f'/api/{record_type}?{urlencode(params)}', None, None
+    return build
+
+def opd_filtered(rng, counts):
+    day = datetime.now() - timedelta(days=rng.randrange(DAYS))
+    params = {'department': rng.choice(DEPARTMENTS), 'date_from': (day - timedelta(days=30)).strftime('%Y-%m-%d'),
+              'date_to': day.strftime('%Y-%m-%d'), 'sort': '-date', 'limit': 50}
+    return 'GET', f'/api/opd?{urlencode(params)}', None, None
+
+def ipd_admitted(rng, counts):
+    return 'GET', f"/api/ipd?{urlencode({'status': 'Admitted', 'doctor': rng.choice(DOCTORS)})}", None, None
+
+def ot_by_surgeon(rng, counts):
+    params = {'surgeon': rng.choice(DOCTORS), 'date_from': random_day(rng), 'sort': 'date'}
+    return 'GET', f'/api/ot?{urlencode(params)}', None, None
+
+def delivery_by_doctor(rng, counts):
+    params = {'doctor': rng.choice(DOCTORS), 'fields': 'date,patient_id,delivery_type,weight'}
+    return 'GET', f'/api/delivery?{urlencode(params)}', None, None
+
+def patient_timeline(rng, counts):
+    return 'GET', f'/api/patients/{random_patient(rng, counts)}/timeline', None, None
+
+def stats(rng, counts):
+    return 'GET', f'/api/stats/{rng.choice(METRICS)}?{urlencode({"date_from": random_day(rng)})}', None, None
+
+def patient_lookup(rng, counts):
+    # A prefix of a name, a patient ID or the last digits of a phone number, as typed into autocomplete
+    text = rng.choice([f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', random_patient(rng, counts),
+                       f'{rng.randrange(10 ** 4):04d}'])
+    return 'GET', f"/api/patients/lookup?{urlencode({'q': text[:rng.randrange(2, len(text) + 1)]})}", None, None
+
+def search(rng, counts):
+    return 'GET', f"/api/search?{urlencode({'q': rng.choice(SEARCH_TERMS), 'offset': rng.randrange(5) * 20})}", \
+        None, None
+
+def cache_stats(rng, counts):
+    return 'GET', '/api/cache/stats', None, None
+
+def ingest_status(rng, counts):
+    # Random well-formed tickets: measures the pending-queue check plus the ticket lookup, answered
+    # 202 'unknown' since another worker might still hold them
+    return 'GET', f'/api/ingest/{uuid.UUID(int=rng.getrandbits(128)).hex}', None, None
+
+def metrics(rng, counts):
+    return 'GET', '/metrics', None, None
+
+def export(record_type):
+    def build(rng, counts):
+        return 'GET', f"/api/{record_type}/export?format={rng.choice(['ndjson', 'csv'])}", None, None
+    return build
+
+def json_row(values):
+    """A synthetic row as an API payload: dates as YYYY-MM-DD, OT times with the time of day"""
+    return {name: value.strftime('%Y-%m-%d %H:%M' if name in ('start_time', 'end_time') else '%Y-%m-%d')
+            if isinstance(value, datetime) else value for name, value in values.items()}
+
+def create(record_type):
+    def build(rng, counts):
+        row = json_row(RECORD_ROWS[record_type](rng, counts['patient'], datetime.now()))
+        return 'POST', f'/api/{record_type}', json.dumps(row), 'application/json'
+    return build
+
+def bulk(record_type):
+    def build(rng, counts):
+        rows = [json_row(RECORD_ROWS[record_type](rng, counts['patient'], datetime.now())) for _ in range(BULK_ROWS)]
+        return 'POST', f'/api/{record_type}/bulk', '\n'.join(json.dumps(row) for row in rows), 'application/x-ndjson'
+    return build
+
+# name: (request builder, expected status)
+WORKLOADS = {
+    'opd_list': (list_page('opd'), 200),
+    'ipd_list': (list_page('ipd'), 200),
+    'ot_list': (list_page('ot'), 200),
+    'delivery_list': (list_page('delivery'), 200),
+    'opd_filtered': (opd_filtered, 200),
+    'ipd_admitted': (ipd_admitted, 200),
+    'ot_by_surgeon': (ot_by_surgeon, 200),
+    'delivery_by_doctor': (delivery_by_doctor, 200),
+    'patient_timeline': (patient_timeline, 200),
+    'stats': (stats, 200),
+    'patient_lookup': (patient_lookup, 200),
+    'search': (search, 200),
+    'cache_stats': (cache_stats, 200),
+    'ingest_status': (ingest_status, 202),
+    'metrics': (metrics, 200),
+    'ot_export': (export('ot'), 200),
+    'opd_create': (create('opd'), 200),
+    'ipd_create': (create('ipd'), 200),
+    'ot_create': (create('ot'), 200),
+    'delivery_create': (create('delivery'), 200),
+    'opd_bulk': (bulk('opd'), 200)
+}
+
+# Server
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(port, workers, threads, env):
+    env = dict(os.environ, **env, WEB_CONCURRENCY=str(workers), WEB_THREADS=str(threads), BIND=f'127.0.0.1:{port}')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/test')
+            if conn.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError('gunicorn did not start')
+
+def login(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.request('POST', '/login', urlencode({'username': 'bench', 'password': 'benchpass'}),
+                 {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    # The session cookie is marked Secure; send it back by hand over plain HTTP
+    return '; '.join(header.split(';', 1)[0] for name, header in response.getheaders() if name == 'Set-Cookie')
+
+def process_tree(root_pid):
+    """PIDs of a process and all its descendants, from /proc"""
+    parents = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as stat:
+                # The command name may contain spaces; the parent PID follows the closing parenthesis
+                parents[int(name)] = int(stat.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    pids = [root_pid]
+    for pid in pids:
+        pids.extend(child for child, parent in parents.items() if parent == pid)
+    return pids
+
+def rss_bytes(pid):
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+class RssSampler(threading.Thread):
+    """Tracks the peak combined RSS of the server processes while a workload runs"""
+
+    def __init__(self, root_pid, interval=0.2):
+        super().__init__(daemon=True)
+        self.root_pid = root_pid
+        self.interval = interval
+        self.peak = None
+        self._done = threading.Event()
+
+    def run(self):
+        if not os.path.isdir('/proc'):
+            return
+        while True:
+            total = sum(rss_bytes(pid) for pid in process_tree(self.root_pid))
+            self.peak = max(self.peak or 0, total)
+            if self._done.wait(self.interval):
+                return
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        return self.peak
+
+# Load generation
+def client(args):
+    port, cookie, workload, counts, seed, duration = args
+    build, expected = WORKLOADS[workload]
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        method, path, body, content_type = build(rng, counts)
+        headers = {'Cookie': cookie}
+        if os.environ.get('METRICS_TOKEN'):
+            headers['Authorization'] = f"Bearer {os.environ['METRICS_TOKEN']}"
+        if content_type:
+            headers['Content-Type'] = content_type
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            response.read()
+        except (http.client.HTTPException, ConnectionError):
+            # e.g. a worker recycled after max_requests; reconnect like a browser would
+            conn.close()
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        if response.status != expected:
+            errors += 1
+    return latencies, errors
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def run_workload(pool, server, port, cookie, workload, counts, clients, duration):
+    sampler = RssSampler(server.pid)
+    sampler.start()
+    start = time.perf_counter()
+    results = pool.map(client, [(port, cookie, workload, counts, SEED + i, duration) for i in range(clients)])
+    elapsed = time.perf_counter() - start
+    peak_rss = sampler.stop()
+    latencies = [latency for result, _ in results for latency in result]
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'peak_rss_mb': round(peak_rss / 2 ** 20, 1) if peak_rss else None
+    }
+
+# Baseline comparison: (metric, True if higher is better)
+COMPARED_METRICS = [('throughput', True), ('p95_ms', False), ('p99_ms', False), ('peak_rss_mb', False)]
+
+def compare(baseline, results, threshold):
+    """Print the change of every compared metric and return the regressions beyond threshold percent"""
+    regressions = []
+    for workload, current in results['workloads'].items():
+        previous = baseline['workloads'].get(workload)
+        if previous is None:
+            print(f"{workload:20} not in baseline")
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED_METRICS:
+            if not previous.get(metric) or current.get(metric) is None:
+                continue
+            change = (current[metric] - previous[metric]) / previous[metric] * 100
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > threshold:
+                flag = ' !'
+                regressions.append((workload, metric, previous[metric], current[metric], change))
+            changes.append(f"{metric} {change:+6.1f}%{flag}")
+        print(f"{workload:20} " + '  '.join(changes))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=10000, help='records to seed across all tables')
+    parser.add_argument('--database', help='SQLite file to seed, or reuse if already seeded (default: temporary)')
+    parser.add_argument('--workloads', default=','.join(WORKLOADS), help='comma-separated workload names')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent client processes')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per workload')
+    parser.add_argument('--workers', type=int, default=max(1, os.cpu_count()), help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='threads per worker')
+    parser.add_argument('--cache', default='none', help="CACHE_BACKEND for the server; 'none' measures the real work")
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=10, help='regression threshold in percent')
+    parser.add_argument('--compare', help='compare this saved JSON run against --baseline without running')
+    args = parser.parse_args()
+
+    if args.compare:
+        if not args.baseline:
+            parser.error('--compare needs --baseline')
+        with open(args.compare) as current, open(args.baseline) as baseline:
+            results, baseline = json.load(current), json.load(baseline)
+        sys.exit(1 if compare(baseline, results, args.threshold) else 0)
+
+    workloads = [name.strip() for name in args.workloads.split(',') if name.strip()]
+    unknown = set(workloads) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+
+    work_dir = tempfile.mkdtemp()
+    database = os.path.abspath(args.database or os.path.join(work_dir, 'bench_http.db'))
+    server_env = {
+        # Always use a throwaway or named benchmark database, never the one DATABASE_URL points at
+        'DATABASE_URL': f'sqlite:///{database}',
+        'SECRET_KEY': 'bench-http',
+        'CACHE_BACKEND': args.cache,
+        'FLASK_CONFIG': 'production',
+        'SLOW_QUERY_LOG_FILE': os.path.join(work_dir, 'slow_queries.log'),
+        'INGEST_SPILL_DIR': os.path.join(work_dir, 'ingest_spool')
+    }
+    os.environ.update(server_env)
+
+    counts = seeded_counts()
+    if counts:
+        print(f"Reusing {database}: {counts}")
+    else:
+        print(f"Seeding {args.records} records into {database}")
+        counts = seed(args.records)
+
+    port = free_port()
+    server = start_server(port, args.workers, args.threads, server_env)
+    results = {
+        'meta': {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'counts': counts,
+            'workers': args.workers,
+            'threads': args.threads,
+            'clients': args.clients,
+            'duration': args.duration,
+            'cache': args.cache,
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version()
+        },
+        'workloads': {}
+    }
+    print(f"{os.cpu_count()} CPU(s), {args.workers} worker(s) x {args.threads} threads, {args.clients} clients, "
+          f"{args.duration:g}s per workload")
+    try:
+        cookie = login(port)
+        with multiprocessing.Pool(args.clients) as pool:
+            for workload in workloads:
+                result = run_workload(pool, server, port, cookie, workload, counts, args.clients, args.duration)
+                results['workloads'][workload] = result
+                rss = f"{result['peak_rss_mb']:7.1f} MB" if result['peak_rss_mb'] else '      n/a'
+                print(f"{workload:20} {result['throughput']:8.1f} req/s  p50={result['p50_ms']:8.1f} ms  "
+                      f"p95={result['p95_ms']:8.1f} ms  p99={result['p99_ms']:8.1f} ms  rss={rss}  "
+                      f"errors={result['errors']}")
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            baseline = json.load(baseline)
+        print(f"\nCompared with {args.baseline} (threshold {args.threshold:g}%):")
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s):")
+            for workload, metric, before, after, change in regressions:
+                print(f"  {workload} {metric}: {before} -> {after} ({change:+.1f}%)")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Login throughput and latency under concurrent load.
+
+Starts the app on a threaded local server against a temporary database,
+fires concurrent POST /login requests and reports logins/sec with
+p50/p95/p99 latency. A probe thread hits /test during the run to show
+how much a login burst delays unrelated requests.
+
+Usage: python benchmarks/bench_login.py [--concurrency 32] [--logins 200]
+"""
+import argparse
+import http.client
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Always use a throwaway database, never the one DATABASE_URL points at
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_login.db')}"
+
+from werkzeug.serving import make_server
+from app import app, db, password_hasher, User
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def seed_users(count):
+    with app.app_context():
+        db.create_all()
+        # Hash once: every benchmark user shares the same password
+        pwhash = password_hasher.hash('benchpass')
+        db.session.execute(db.insert(User), [
+            {'username': f'bench{i}', 'password': pwhash, 'role': 'staff'} for i in range(count)
+        ])
+        db.session.commit()
+
+def login(port, username):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    start = time.perf_counter()
+    conn.request('POST', '/login', body=urlencode({'username': username, 'password': 'benchpass'}),
+                 headers={'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    return time.perf_counter() - start, response.status
+
+def probe(port, stop, latencies):
+    while not stop.is_set():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        start = time.perf_counter()
+        conn.request('GET', '/test')
+        conn.getresponse().read()
+        conn.close()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.01)
+
+def run(concurrency, logins, users):
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    seed_users(users)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    stop = threading.Event()
+    probe_latencies = []
+    probe_thread = threading.Thread(target=probe, args=(port, stop, probe_latencies), daemon=True)
+    probe_thread.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda i: login(port, f'bench{i % users}'), range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    probe_thread.join()
+    server.shutdown()
+
+    latencies = [latency for latency, status in results if status == 302]
+    rejected = sum(1 for _, status in results if status == 503)
+    print(f'method={password_hasher.method} concurrency={concurrency} logins={logins} '
+          f'workers={app.config["PASSWORD_HASH_WORKERS"]}')
+    print(f'logins/sec: {len(latencies) / elapsed:.1f}  (rejected with 503: {rejected})')
+    if latencies:
+        print(f'login latency ms: p50={percentile(latencies, 50) * 1000:.1f} '
+              f'p95={percentile(latencies, 95) * 1000:.1f} p99={percentile(latencies, 99) * 1000:.1f}')
+    if probe_latencies:
+        print(f'/test latency during burst ms: p50={statistics.median(probe_latencies) * 1000:.1f} '
+              f'p99={percentile(probe_latencies, 99) * 1000:.1f}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--users', type=int, default=50)
+    args = parser.parse_args()
+    run(args.concurrency, args.logins, args.users)
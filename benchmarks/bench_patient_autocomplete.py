@@ -0,0 +1,62 @@
+"""Per-keystroke latency of the patient lookup used for autocomplete.
+
+Registers synthetic patients in a temporary SQLite database with Core bulk
+inserts (the lookup keys come from the column defaults) and replays typing
+a name, a patient ID and the last digits of a phone number one character
+at a time through lookup_patients.
+
+Usage: python benchmarks/bench_patient_autocomplete.py [--rows 2000000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from app import app, db, Patient, lookup_patients
+
+FIRST_NAMES = ['Anita', 'Anil', 'Ravi', 'Priya', 'Suresh', 'Lakshmi', 'Mohan', 'Fatima', 'John', 'Meera',
+               'Arjun', 'Kavya', 'Imran', 'Deepa', 'Vikram', 'Sunita', 'Rahul', 'Asha', 'Joseph', 'Nandini']
+LAST_NAMES = ['Rao', 'Kumar', 'Sharma', 'Reddy', 'Nair', 'Iyer', 'Khan', 'Das', 'Patel', 'Menon',
+              'Gowda', 'Singh', 'Joshi', 'Pillai', 'Shetty', 'Bhat', 'Thomas', 'Verma', 'Ghosh', 'Naidu']
+KEYSTROKES = ['Vikram Shetty', 'PAT0012345', '4321']
+
+def seed(rows):
+    for offset in range(0, rows, 100000):
+        db.session.execute(db.insert(Patient), [{
+            'patient_id': f'PAT{i:07d}',
+            'name': f'{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}',
+            'age': random.randrange(1, 90),
+            'gender': random.choice(['Male', 'Female']),
+            'contact': f'+91 9{random.randrange(10 ** 9):09d}'
+        } for i in range(offset, min(rows, offset + 100000))])
+        db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        seed(args.rows)
+        print(f"Registered {args.rows} patients in {time.perf_counter() - start:.1f}s")
+
+        for text in KEYSTROKES:
+            timings = []
+            for length in range(1, len(text) + 1):
+                start = time.perf_counter()
+                lookup_patients(text[:length], 10)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{text!r:16} median {statistics.median(timings):6.2f} ms  max {max(timings):6.2f} ms per keystroke")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Patient ID allocation throughput across processes and threads.
+
+Starts --processes worker processes against one temporary database, each
+allocating --ids IDs from --threads threads through app.patient_ids, and
+reports IDs/sec overall plus the number of database round-trips. Fails if
+any ID is handed out twice or has a wrong check digit.
+
+Usage: python benchmarks/bench_patient_ids.py [--processes 4] [--threads 4] [--ids 50000] [--block-size 1000]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def allocate(database_url, ids, threads, block_size, start, results):
+    os.environ['DATABASE_URL'] = database_url
+    from app import app, patient_ids
+
+    app.config['PATIENT_ID_BLOCK_SIZE'] = block_size
+    patient_ids.init_app(app)
+    blocks = []
+    reserve_block = patient_ids.reserve_block
+    patient_ids.reserve_block = lambda name, size: blocks.append(size) or reserve_block(name, size)
+    allocated = []
+
+    def work(count):
+        with app.app_context():
+            allocated.append([patient_ids.next_id() for _ in range(count)])
+
+    start.wait()
+    workers = [threading.Thread(target=work, args=(ids // threads,)) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put(([patient_id for chunk in allocated for patient_id in chunk], len(blocks)))
+
+def main():
+    parser = argparse.ArgumentParser(description='Patient ID allocation benchmark')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4, help='threads per process')
+    parser.add_argument('--ids', type=int, default=50000, help='IDs per process')
+    parser.add_argument('--block-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    # Always use a throwaway database, never the one DATABASE_URL points at
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_patient_ids.db')}"
+    os.environ['DATABASE_URL'] = database_url
+    from app import app, db, patient_ids
+    with app.app_context():
+        db.create_all()
+
+    context = multiprocessing.get_context('spawn')
+    start = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=allocate, args=(database_url, args.ids, args.threads, args.block_size, start, results))
+                 for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    # Let every process import the app before the clock starts
+    time.sleep(3)
+    began = time.perf_counter()
+    start.set()
+    outcomes = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - began
+    for process in processes:
+        process.join()
+
+    ids = [patient_id for allocated, _ in outcomes for patient_id in allocated]
+    round_trips = sum(blocks for _, blocks in outcomes)
+    print(f"{len(ids):,} IDs from {args.processes} process(es) x {args.threads} thread(s) in {elapsed:.2f}s: "
+          f"{len(ids) / elapsed:,.0f} IDs/sec, {round_trips} block reservation(s)")
+    duplicates = len(ids) - len(set(ids))
+    invalid = sum(not patient_ids.is_valid(patient_id) for patient_id in ids)
+    print(f"duplicates: {duplicates}, bad check digits: {invalid}, e.g. {ids[0]}")
+    if duplicates or invalid:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
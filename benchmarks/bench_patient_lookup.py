@@ -0,0 +1,98 @@
+"""Per-patient lookup cost with and without the patient_id indexes.
+
+Builds OPD tables of increasing size in a temporary SQLite database and
+times the same COUNT(*) that utils.get_patient_summary issues. Without the
+index every lookup scans the table (O(n)); with it the lookup is a B-tree
+search (O(log n)), so its latency should stay flat as the table grows.
+
+Usage: python benchmarks/bench_patient_lookup.py [--sizes 10000,100000,1000000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from app import db, OPDRecord
+
+LOOKUPS = 200
+ROWS_PER_PATIENT = 20  # on average each patient has 20 visits
+
+def seed(conn, rows):
+    """Insert synthetic OPD visits spread over rows / 20 patients"""
+    patients = max(1, rows // ROWS_PER_PATIENT)
+    start = datetime(2020, 1, 1)
+    batch = []
+    for i in range(rows):
+        batch.append((
+            start + timedelta(minutes=i),
+            f'PAT{random.randrange(patients):08d}',
+            'General',
+            'Dr. Test',
+            100.0
+        ))
+        if len(batch) == 50000:
+            conn.exec_driver_sql(
+                'INSERT INTO opd_record (date, patient_id, department, doctor, fee) VALUES (?, ?, ?, ?, ?)',
+                batch
+            )
+            batch = []
+    if batch:
+        conn.exec_driver_sql(
+            'INSERT INTO opd_record (date, patient_id, department, doctor, fee) VALUES (?, ?, ?, ?, ?)',
+            batch
+        )
+    return patients
+
+def time_lookups(conn, patients):
+    """Return the median lookup time in microseconds and the query plan"""
+    sql = 'SELECT COUNT(*) FROM opd_record WHERE patient_id = ?'
+    plan = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, ('PAT00000000',)).fetchall()
+    timings = []
+    for _ in range(LOOKUPS):
+        patient_id = f'PAT{random.randrange(patients):08d}'
+        start = time.perf_counter()
+        conn.exec_driver_sql(sql, (patient_id,)).scalar()
+        timings.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(timings), plan[-1][-1]
+
+def run(sizes):
+    table = OPDRecord.__table__
+    index = next(ix for ix in table.indexes if ix.name == 'ix_opd_record_patient_id_date')
+    print(f"{'rows':>10} {'no index (us)':>15} {'indexed (us)':>14}  plan")
+
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            db.metadata.create_all(engine, tables=[table])
+            with engine.begin() as conn:
+                for ix in table.indexes:
+                    ix.drop(bind=conn)
+                patients = seed(conn, rows)
+
+            with engine.connect() as conn:
+                scan_us, _ = time_lookups(conn, patients)
+
+            with engine.begin() as conn:
+                index.create(bind=conn)
+                conn.exec_driver_sql('ANALYZE')
+            with engine.connect() as conn:
+                indexed_us, plan = time_lookups(conn, patients)
+            engine.dispose()
+
+        print(f'{rows:>10} {scan_us:>15.1f} {indexed_us:>14.1f}  {plan}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000',
+                        help='comma-separated OPD table sizes to benchmark')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    run([int(size) for size in args.sizes.split(',')])
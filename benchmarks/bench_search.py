@@ -0,0 +1,71 @@
+"""Full-text search latency over synthetic clinical notes.
+
+Loads OPD records with random diagnosis/treatment text into a temporary
+SQLite database (the FTS5 triggers index them as they are inserted) and
+times search_records for rare, common and prefix queries.
+
+Usage: python benchmarks/bench_search.py [--rows 1000000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from app import app, db, OPDRecord
+from search import search_records
+
+DIAGNOSES = ['fever', 'cough', 'hypertension', 'diabetes mellitus', 'gastritis', 'migraine', 'asthma',
+             'urinary tract infection', 'anaemia', 'otitis media', 'cellulitis', 'appendicitis']
+TREATMENTS = ['paracetamol', 'rest', 'antibiotics', 'metformin', 'antacids', 'inhaler', 'iron supplements',
+              'oral rehydration', 'referral to surgery', 'follow up in one week']
+QUERIES = ['appendicitis', 'fever paracetamol', 'diab', 'urinary infection', 'surgery']
+REPEAT = 20
+
+def seed(rows):
+    start = datetime(2020, 1, 1)
+    for offset in range(0, rows, 100000):
+        db.session.execute(db.insert(OPDRecord), [{
+            'date': start + timedelta(minutes=i),
+            'patient_id': f'PAT{random.randrange(rows // 20 + 1):08d}',
+            'department': 'General',
+            'doctor': 'Dr. Test',
+            'diagnosis': ' and '.join(random.sample(DIAGNOSES, 2)),
+            'treatment': ', '.join(random.sample(TREATMENTS, 3)),
+            'fee': 100.0
+        } for i in range(offset, min(rows, offset + 100000))])
+        db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        seed(args.rows)
+        print(f"Seeded and indexed {args.rows} OPD records in {time.perf_counter() - start:.1f}s")
+
+        connection = db.session.connection()
+        for query in QUERIES:
+            timings = []
+            for _ in range(REPEAT):
+                start = time.perf_counter()
+                results = search_records(connection, query, limit=20)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{query!r:22} {len(results):3} results  median {statistics.median(timings):7.2f} ms")
+            start = time.perf_counter()
+            search_records(connection, query, date_from=datetime(2020, 6, 1), date_to=datetime(2020, 6, 8))
+            print(f"{'':22} one-week date filter  {(time.perf_counter() - start) * 1000:7.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Per-row cost of serializing record list pages.
+
+Compares the previous path (load ORM objects, strftime each datetime per
+row, encode with the stdlib json module) against the schema-driven
+serializers (select only the columns as tuples, format datetimes in SQLite
+or column-wise, encode with orjson when installed).
+
+Usage: python benchmarks/bench_serializers.py [--rows 50000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from app import app, db, OTRecord, OT_SERIALIZER
+from serializers import dumps, orjson
+
+OT_FORMATS = {'date': '%Y-%m-%d', 'start_time': '%Y-%m-%d %H:%M', 'end_time': '%Y-%m-%d %H:%M'}
+
+def seed(rows):
+    start = datetime(2020, 1, 1)
+    db.session.execute(db.insert(OTRecord), [{
+        'date': start + timedelta(hours=i),
+        'patient_id': f'PAT{i % 5000:08d}',
+        'surgery_type': 'Appendectomy',
+        'surgeon': 'Dr. Test',
+        'anesthetist': 'Dr. Anesthesia',
+        'start_time': start + timedelta(hours=i, minutes=10),
+        'end_time': start + timedelta(hours=i, minutes=70),
+        'status': 'Completed'
+    } for i in range(rows)])
+    db.session.commit()
+
+def orm_path():
+    records = OTRecord.query.order_by(OTRecord.id).all()
+    data = []
+    for record in records:
+        row = {}
+        for name in OT_SERIALIZER.fields:
+            value = getattr(record, name)
+            if name in OT_FORMATS and value is not None:
+                value = value.strftime(OT_FORMATS[name])
+            row[name] = value
+        data.append(row)
+    return json.dumps({'records': data}).encode('utf-8')
+
+def serializer_path():
+    dialect_name = db.engine.dialect.name
+    fields = OT_SERIALIZER.fields
+    rows = db.session.execute(
+        db.select(*OT_SERIALIZER.select_columns(fields, dialect_name)).order_by(OTRecord.id)
+    ).all()
+    return dumps({'records': OT_SERIALIZER.to_dicts(rows, fields, dialect_name)})
+
+def timed(func, rows, repeat=3):
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / rows * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        seed(args.rows)
+        assert json.loads(orm_path()) == json.loads(serializer_path())
+        before = timed(orm_path, args.rows)
+        after = timed(serializer_path, args.rows)
+
+    print(f"{args.rows} OT rows, orjson {'installed' if orjson else 'not installed'}")
+    print(f"ORM + strftime + json:   {before:7.2f} us/row")
+    print(f"schema serializer:       {after:7.2f} us/row")
+    print(f"speedup:                 {before / after:7.1f}x")
+
+if __name__ == '__main__':
+    main()
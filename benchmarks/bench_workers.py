@@ -0,0 +1,141 @@
+"""Throughput of the production entry point as gunicorn workers are added.
+
+Seeds a temporary database, then for each worker count starts
+`gunicorn -c gunicorn.conf.py` with that many preforked workers and drives
+GET /api/opd from client processes for a fixed time, reporting requests/sec
+and p50/p99 latency. The result cache is disabled so every request does
+its database and serialization work.
+
+Throughput should grow roughly linearly up to the number of cores. The
+clients run on the same machine, so leave them some cores (or point
+--url at a server on another host) when measuring larger worker counts.
+
+Usage: python benchmarks/bench_workers.py [--workers 1,2,4] [--clients 8] [--duration 10]
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+SERVER_ENV = {
+    # Always use a throwaway database, never the one DATABASE_URL points at
+    'DATABASE_URL': f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_workers.db')}",
+    'SECRET_KEY': 'bench-workers',
+    'CACHE_BACKEND': 'none',
+    'USER_CACHE_TTL': '60',
+    'FLASK_CONFIG': 'production'
+}
+os.environ.update(SERVER_ENV)
+
+from app import app, db, password_hasher, User, OPDRecord
+
+PATH = '/api/opd?limit=50'
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def seed(records):
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='bench', password=password_hasher.hash('benchpass'), role='admin'))
+        db.session.execute(db.insert(OPDRecord), [{
+            'patient_id': f'PAT{i % 1000:06d}',
+            'department': 'General',
+            'doctor': f'Dr. {i % 20}',
+            'diagnosis': 'Fever',
+            'treatment': 'Rest',
+            'fee': 100.0
+        } for i in range(records)])
+        db.session.commit()
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(workers, port):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=f'127.0.0.1:{port}')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/test')
+            if conn.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError('gunicorn did not start')
+
+def login(host, port):
+    conn = http.client.HTTPConnection(host, port)
+    conn.request('POST', '/login', urlencode({'username': 'bench', 'password': 'benchpass'}),
+                 {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    # The session cookie is marked Secure; send it back by hand over plain HTTP
+    return '; '.join(header.split(';', 1)[0] for name, header in response.getheaders() if name == 'Set-Cookie')
+
+def client(args):
+    host, port, cookie, duration = args
+    conn = http.client.HTTPConnection(host, port)
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        conn.request('GET', PATH, headers={'Cookie': cookie})
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+def run_load(host, port, clients, duration):
+    cookie = login(host, port)
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.map(client, [(host, port, cookie, duration)] * clients)
+    latencies = [latency for result, _ in results for latency in result]
+    errors = sum(errors for _, errors in results)
+    return len(latencies) / duration, latencies, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    default_workers = ','.join(str(n) for n in (1, 2, 4, 8, 16) if n <= max(1, os.cpu_count()))
+    parser.add_argument('--workers', default=default_workers, help='comma-separated worker counts')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent client processes')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per worker count')
+    parser.add_argument('--records', type=int, default=10000)
+    args = parser.parse_args()
+
+    seed(args.records)
+    print(f"{os.cpu_count()} CPU(s), {args.clients} clients, GET {PATH}")
+    baseline = None
+    for workers in [int(n) for n in args.workers.split(',')]:
+        port = free_port()
+        server = start_server(workers, port)
+        try:
+            throughput, latencies, errors = run_load('127.0.0.1', port, args.clients, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        baseline = baseline or throughput
+        print(f"workers={workers:<3} {throughput:8.0f} req/s  x{throughput / baseline:4.1f}  "
+              f"p50={percentile(latencies, 50) * 1000:6.1f} ms  p99={percentile(latencies, 99) * 1000:6.1f} ms  "
+              f"errors={errors}")
+
+if __name__ == '__main__':
+    main()
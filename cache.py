@@ -0,0 +1,186 @@
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+
+class MemoryBackend:
+    """In-process LRU cache with a per-entry TTL
+
+    Tag generations are kept in an LRU of the same size as the entries. A tag
+    that is evicted, or never seen, starts again at a random generation, so
+    keys built from a forgotten generation are not matched again.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _generation(self, tag):
+        generation = self._generations.get(tag)
+        if generation is None:
+            generation = random.getrandbits(32)
+        self._generations[tag] = generation
+        self._generations.move_to_end(tag)
+        while len(self._generations) > self.max_entries:
+            self._generations.popitem(last=False)
+        return generation
+
+    def generation(self, tag):
+        with self._lock:
+            return self._generation(tag)
+
+    def bump_generation(self, tag):
+        with self._lock:
+            self._generations[tag] = self._generation(tag) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+class RedisBackend:
+    """Cache shared by all workers through a Redis-compatible server"""
+
+    def __init__(self, url, ttl=60, prefix='hms:cache:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+    def generation(self, tag):
+        return int(self.client.get(f'{self.prefix}gen:{tag}') or 0)
+
+    def bump_generation(self, tag):
+        self.client.incr(f'{self.prefix}gen:{tag}')
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}*'):
+            self.client.delete(key)
+
+    def stats(self):
+        info = self.client.info('stats')
+        return {
+            'backend': 'redis',
+            'evictions': info.get('evicted_keys', 0),
+            'expirations': info.get('expired_keys', 0)
+        }
+
+class ResultCache:
+    """Query result cache keyed by endpoint and normalized parameters.
+
+    Every entry is tagged with the tables it was computed from. Invalidating
+    a tag bumps its generation, which is part of the key, so stale entries
+    are never served again and simply age out of the backend. Generations of
+    the memory backend only see this process's writes, so callers also pass
+    the database-side versions of the tables read, which every worker sees.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.backend = create_backend(app)
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def make_key(self, endpoint, params, tags, versions=None):
+        normalized = '&'.join(f'{name}={value}' for name, value in sorted(params.items()))
+        generations = ','.join(f'{tag}.{self.backend.generation(tag)}' for tag in sorted(tags))
+        if versions:
+            generations += '|' + ','.join(f'{name}@{version}' for name, version in sorted(versions.items()))
+        return f'{endpoint}|{generations}|{normalized}'
+
+    def get_or_compute(self, endpoint, params, tags, compute, versions=None):
+        """Return the cached result for this key, computing and storing it on a miss"""
+        if not self.enabled:
+            return compute()
+
+        key = self.make_key(endpoint, params, tags, versions)
+        value = self.backend.get(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            self.misses += 1
+        value = compute()
+        self.backend.set(key, value)
+        return value
+
+    def clear(self):
+        if self.enabled:
+            self.backend.clear()
+
+    def invalidate(self, tags):
+        if self.enabled:
+            for tag in tags:
+                self.backend.bump_generation(tag)
+
+    def stats(self):
+        stats = {'enabled': self.enabled, 'hits': self.hits, 'misses': self.misses}
+        if self.enabled:
+            stats.update(self.backend.stats())
+        return stats
+
+def create_backend(app):
+    """Create the cache backend selected by CACHE_BACKEND, or None when caching is off"""
+    backend_name = app.config.get('CACHE_BACKEND', 'memory')
+    ttl = app.config.get('CACHE_TTL', 60)
+    if backend_name == 'redis':
+        return RedisBackend(app.config['CACHE_REDIS_URL'], ttl=ttl)
+    if backend_name == 'memory':
+        return MemoryBackend(app.config.get('CACHE_MAX_ENTRIES', 1024), ttl=ttl)
+    return None
@@ -26,6 +26,86 @@ class Config:
     SESSION_COOKIE_HTTPONLY = True
     REMEMBER_COOKIE_HTTPONLY = True
 
+    # SQLite tuning, applied to every new connection (see database.py)
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # milliseconds
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -65536))  # negative = KiB, i.e. 64MB
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 268435456))  # 256MB
+
+    # Connection pool config
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))  # seconds
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_pre_ping': True
+    }
+
+    # Query result cache: 'memory' (per process), 'redis' (shared) or 'none'
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+    CACHE_TTL = int(os.environ.get('CACHE_TTL', 60))  # seconds
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+    # Password hashing: stored hashes made with another method/cost are upgraded on login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64))
+    PASSWORD_HASH_TIMEOUT = int(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))  # seconds
+
+    # Authenticated user loading: cache the user row instead of querying it on every request
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))  # seconds, 0 disables
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 4096))
+    # How often a worker re-reads the user table version, i.e. how long another worker's
+    # role, password or account change may take to reach it
+    USER_VERSION_CHECK_INTERVAL = float(os.environ.get('USER_VERSION_CHECK_INTERVAL', 5))  # seconds
+    # Optionally carry the user's identity and role in the signed session cookie
+    SESSION_CARRIES_ROLE = os.environ.get('SESSION_CARRIES_ROLE', 'false').lower() == 'true'
+    SESSION_ROLE_MAX_AGE = int(os.environ.get('SESSION_ROLE_MAX_AGE', 300))  # seconds
+
+    # Write-behind ingestion: 'async' queues record POSTs and returns 202 with a ticket
+    INGEST_MODE = os.environ.get('INGEST_MODE', 'sync')
+    INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', 10000))
+    INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 500))
+    INGEST_SPILL_DIR = os.environ.get('INGEST_SPILL_DIR') or \
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ingest_spool')
+
+    # Request and SQL metrics in Prometheus format at /metrics, one series per worker process
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    # Shared directory where workers leave snapshots, so any worker can answer for all of them
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    # Bearer token required to scrape /metrics; without one only local scrapes are answered
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Add X-Query-Count and Server-Timing headers to every response, e.g. to spot N+1 queries
+    METRICS_RESPONSE_HEADERS = os.environ.get('METRICS_RESPONSE_HEADERS', 'false').lower() == 'true'
+
+    # Slow-query log: statements slower than the threshold are logged with their query plan
+    SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 250))  # -1 disables
+    SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', 'true').lower() == 'true'
+    SLOW_QUERY_LOG_FILE = os.environ.get('SLOW_QUERY_LOG_FILE') or \
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'slow_queries.log')
+    SLOW_QUERY_LOG_BACKUPS = int(os.environ.get('SLOW_QUERY_LOG_BACKUPS', 5))
+
+    # Online backups (backup.py): compression is 'zstd' (gzip if zstandard is missing), 'gzip' or 'none'
+    BACKUP_DIR = os.environ.get('BACKUP_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backups')
+    BACKUP_COMPRESSION = os.environ.get('BACKUP_COMPRESSION', 'zstd')
+    BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 7))  # full snapshots kept, each with its incrementals
+    BACKUP_STEP_PAGES = int(os.environ.get('BACKUP_STEP_PAGES', 1024))  # pages copied per backup step
+
+    # Patient file imports (utils.import_patient_data): rows validated and upserted per transaction
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 10000))
+
+    # New patient IDs: {number} comes from blocks reserved in the id_sequence table, {check} is its Luhn digit
+    PATIENT_ID_FORMAT = os.environ.get('PATIENT_ID_FORMAT', 'PAT{number:08d}{check}')
+    PATIENT_ID_BLOCK_SIZE = int(os.environ.get('PATIENT_ID_BLOCK_SIZE', 1000))  # IDs reserved per database round-trip
+
+    @classmethod
+    def init_app(cls, app):
+        pass
+
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('DEV_DATABASE_URL') or \
@@ -44,7 +124,7 @@ class ProductionConfig(Config):
     @classmethod
     def init_app(cls, app):
         # Production specific initialization
-        pass
+        Config.init_app(app)
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,30 @@
+from sqlalchemy import event
+
+def sqlite_pragmas(app_config):
+    """Build the PRAGMA settings to apply on each new SQLite connection"""
+    pragmas = [
+        ('journal_mode', app_config.get('SQLITE_JOURNAL_MODE')),
+        ('synchronous', app_config.get('SQLITE_SYNCHRONOUS')),
+        ('busy_timeout', app_config.get('SQLITE_BUSY_TIMEOUT')),
+        ('cache_size', app_config.get('SQLITE_CACHE_SIZE')),
+        ('mmap_size', app_config.get('SQLITE_MMAP_SIZE'))
+    ]
+    return [(name, value) for name, value in pragmas if value is not None]
+
+def configure_engine(app, db):
+    """Apply the configured SQLite pragmas to every pooled connection"""
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return engine
+
+    pragmas = sqlite_pragmas(app.config)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    return engine
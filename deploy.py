@@ -1,19 +1,14 @@
 import os
-import shutil
 import subprocess
-from datetime import datetime
+from backup import configured_database, run_backup
 
 def backup_database():
-    """Create a backup of the database"""
-    if os.path.exists('hospital.db'):
-        backup_dir = 'backups'
-        if not os.path.exists(backup_dir):
-            os.makedirs(backup_dir)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_file = f'{backup_dir}/hospital_{timestamp}.db'
-        shutil.copy2('hospital.db', backup_file)
-        print(f'Database backed up to {backup_file}')
+    """Take an online, verified and compressed snapshot of the database"""
+    database, config = configured_database()
+    if os.path.exists(database):
+        manifest = run_backup(database, config['BACKUP_DIR'], compression=config['BACKUP_COMPRESSION'],
+                              keep=config['BACKUP_KEEP'], step_pages=config['BACKUP_STEP_PAGES'])
+        print(f"Database backed up to {os.path.join(config['BACKUP_DIR'], manifest['file'])}")
 
 def run_tests():
     """Run the test suite"""
@@ -0,0 +1,483 @@
+"""Generate a deterministic synthetic hospital dataset for scale testing.
+
+Patients get repeat OPD visits spaced over the date range, departments and
+doctors follow a skewed workload, some visits lead to admissions with a
+realistic length of stay, surgical admissions and Caesarean deliveries get
+OT sessions with start and end times, and women of child-bearing age have
+deliveries. Every column is drawn with vectorized NumPy from one seeded
+generator, so the same arguments always produce the same data.
+
+The records are bulk inserted into the application's SQLite database, or
+written as a surveillance linelist (one row per OPD visit with district,
+symptoms, lab result and outcome) in CSV, XLSX or Parquet for the Excel
+analyzer. Parquet needs pyarrow; XLSX uses xlsxwriter when it is installed
+and openpyxl otherwise, and starts a new sheet every 1,048,575 rows.
+
+Usage: python generate_data.py [--patients 100000] [--visits 3] [--seed 42]
+       [--format sqlite|csv|xlsx|parquet] [--output PATH]
+"""
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from lookup import normalize_name
+from search import drop_search_triggers, rebuild_search_index
+
+# department: (share of visits, doctors, consultation fee, admission rate per visit)
+DEPARTMENTS = {
+    'General': (0.28, 8, 100.0, 0.01),
+    'Medicine': (0.18, 6, 200.0, 0.05),
+    'Paediatrics': (0.12, 4, 200.0, 0.03),
+    'Surgery': (0.10, 5, 300.0, 0.08),
+    'Obstetrics': (0.09, 4, 300.0, 0.04),
+    'Orthopaedics': (0.08, 4, 300.0, 0.06),
+    'ENT': (0.06, 3, 250.0, 0.03),
+    'Ophthalmology': (0.05, 3, 250.0, 0.04),
+    'Dermatology': (0.04, 2, 250.0, 0.0)
+}
+
+# department: [(diagnosis, treatment, presenting symptom, lab positivity)], most common first
+CONDITIONS = {
+    'General': [('Viral fever', 'Paracetamol, rest and oral fluids', 'Fever', 0.1),
+                ('Upper respiratory infection', 'Symptomatic treatment', 'Cough', 0.05),
+                ('Acute gastroenteritis', 'Oral rehydration and zinc', 'Diarrhoea', 0.2),
+                ('Dengue fever', 'Fluids and platelet monitoring', 'Fever', 0.6),
+                ('Typhoid fever', 'Azithromycin', 'Fever', 0.5)],
+    'Medicine': [('Hypertension', 'Amlodipine', 'Headache', 0.0),
+                 ('Type 2 diabetes mellitus', 'Metformin and diet advice', 'Fatigue', 0.0),
+                 ('Community acquired pneumonia', 'Amoxicillin-clavulanate', 'Cough', 0.4),
+                 ('Malaria', 'Artemether-lumefantrine', 'Fever', 0.8),
+                 ('Pulmonary tuberculosis', 'Anti-tubercular therapy', 'Cough', 0.7)],
+    'Paediatrics': [('Acute diarrhoeal disease', 'ORS and zinc', 'Diarrhoea', 0.2),
+                    ('Viral fever', 'Paracetamol', 'Fever', 0.1),
+                    ('Bronchiolitis', 'Nebulisation', 'Breathlessness', 0.1),
+                    ('Measles', 'Vitamin A and supportive care', 'Fever with rash', 0.7)],
+    'Surgery': [('Acute appendicitis', 'Referral for appendectomy', 'Abdominal pain', 0.0),
+                ('Inguinal hernia', 'Referral for hernia repair', 'Swelling', 0.0),
+                ('Cholelithiasis', 'Referral for cholecystectomy', 'Abdominal pain', 0.0),
+                ('Cellulitis', 'Antibiotics and dressing', 'Swelling', 0.3)],
+    'Obstetrics': [('Antenatal check-up', 'Iron and folic acid', 'None', 0.0),
+                   ('Anaemia in pregnancy', 'Iron sucrose', 'Fatigue', 0.0),
+                   ('Pre-eclampsia', 'Labetalol', 'Headache', 0.0)],
+    'Orthopaedics': [('Osteoarthritis of knee', 'Analgesics and physiotherapy', 'Joint pain', 0.0),
+                     ('Low back pain', 'Physiotherapy', 'Back pain', 0.0),
+                     ('Fracture of radius', 'Cast immobilisation', 'Pain', 0.0)],
+    'ENT': [('Otitis media', 'Amoxicillin', 'Ear pain', 0.1),
+            ('Chronic tonsillitis', 'Referral for tonsillectomy', 'Sore throat', 0.1)],
+    'Ophthalmology': [('Cataract', 'Referral for cataract surgery', 'Blurred vision', 0.0),
+                      ('Conjunctivitis', 'Antibiotic eye drops', 'Red eye', 0.2)],
+    'Dermatology': [('Scabies', 'Permethrin', 'Itching', 0.0),
+                    ('Fungal skin infection', 'Clotrimazole', 'Itching', 0.1)]
+}
+
+# department: (share of admissions operated on, [(procedure, median minutes)])
+SURGERIES = {
+    'General': (0.05, [('Incision and drainage', 30)]),
+    'Medicine': (0.02, [('Incision and drainage', 30)]),
+    'Paediatrics': (0.03, [('Incision and drainage', 30)]),
+    'Surgery': (0.7, [('Appendectomy', 60), ('Hernia repair', 75), ('Cholecystectomy', 90)]),
+    'Obstetrics': (0.1, [('Dilatation and curettage', 30)]),
+    'Orthopaedics': (0.6, [('Fracture fixation', 120), ('Knee arthroscopy', 90)]),
+    'ENT': (0.5, [('Tonsillectomy', 45)]),
+    'Ophthalmology': (0.8, [('Cataract surgery', 30)]),
+    'Dermatology': (0.0, [('Excision biopsy', 30)])
+}
+CAESAREAN = ('Caesarean section', 50)
+
+FEMALE_NAMES = ['Anita', 'Priya', 'Lakshmi', 'Fatima', 'Meera', 'Kavya', 'Deepa', 'Sunita', 'Asha', 'Nandini']
+MALE_NAMES = ['Anil', 'Ravi', 'Suresh', 'Mohan', 'John', 'Arjun', 'Imran', 'Vikram', 'Rahul', 'Joseph']
+LAST_NAMES = ['Kumar', 'Rao', 'Sharma', 'Reddy', 'Nair', 'Singh', 'Khan', 'Das', 'Patel', 'Menon',
+              'Iyer', 'Gowda', 'Joshi', 'Pillai', 'Shetty', 'Bhat', 'Thomas', 'Verma', 'Ghosh', 'Naidu']
+DOCTOR_INITIALS = 'ASRKMPVNDGJLTBHC'
+ANESTHETISTS = ['Dr. Anaesthesia 1', 'Dr. Anaesthesia 2', 'Dr. Anaesthesia 3', 'Dr. Anaesthesia 4']
+DISTRICTS = ['Bangalore Urban', 'Mysore', 'Tumkur', 'Mandya', 'Hassan', 'Kolar', 'Chikballapur',
+             'Ramanagara', 'Chitradurga', 'Shimoga', 'Davangere', 'Udupi']
+# (delivery type, share)
+DELIVERY_TYPES = [('Normal', 0.65), ('Caesarean', 0.28), ('Assisted', 0.07)]
+OUTCOMES = ['Recovered', 'Under Treatment', 'Referred', 'Died']
+
+REVISIT_DAYS = 60  # mean gap between a patient's visits
+MEAN_STAY_DAYS = 3
+DELIVERY_RATE = 0.15  # share of women aged 18-45 delivering in the period
+MINUTES_PER_DAY = 24 * 60
+
+# Database columns of each table, in insert order
+TABLE_COLUMNS = {
+    'patient': ['patient_id', 'name', 'age', 'gender', 'contact', 'name_key', 'contact_key'],
+    'opd_record': ['date', 'patient_id', 'department', 'doctor', 'diagnosis', 'treatment', 'fee'],
+    'ipd_record': ['admission_date', 'patient_id', 'room_no', 'admission_reason', 'doctor', 'discharge_date',
+                   'status'],
+    'ot_record': ['date', 'patient_id', 'surgery_type', 'surgeon', 'anesthetist', 'start_time', 'end_time',
+                  'status'],
+    'delivery_record': ['date', 'patient_id', 'delivery_type', 'doctor', 'baby_gender', 'weight', 'status']
+}
+INSERT_BATCH_SIZE = 100000
+XLSX_MAX_ROWS = 1048575  # one header row per sheet
+
+# Flattened lookup tables, indexed by department number
+DEPARTMENT_NAMES = np.array(list(DEPARTMENTS))
+ADULT_DEPARTMENTS = [list(DEPARTMENTS).index(name) for name in ('Medicine', 'Obstetrics')]
+DEPARTMENT_SHARES = np.array([share for share, *_ in DEPARTMENTS.values()])
+DEPARTMENT_FEES = np.array([fee for _, _, fee, _ in DEPARTMENTS.values()])
+ADMISSION_RATES = np.array([rate for *_, rate in DEPARTMENTS.values()])
+DOCTOR_COUNTS = np.array([doctors for _, doctors, *_ in DEPARTMENTS.values()])
+DOCTOR_OFFSETS = np.cumsum(DOCTOR_COUNTS) - DOCTOR_COUNTS
+DOCTORS = np.array([f'Dr. {DOCTOR_INITIALS[i % len(DOCTOR_INITIALS)]}. {LAST_NAMES[i % len(LAST_NAMES)]}'
+                    for i in range(DOCTOR_COUNTS.sum())])
+CONDITION_COUNTS = np.array([len(CONDITIONS[name]) for name in DEPARTMENTS])
+CONDITION_OFFSETS = np.cumsum(CONDITION_COUNTS) - CONDITION_COUNTS
+DIAGNOSES, TREATMENTS, SYMPTOMS, POSITIVITY = (np.array(column) for column in
+                                               zip(*[c for name in DEPARTMENTS for c in CONDITIONS[name]]))
+SURGERY_RATES = np.array([SURGERIES[name][0] for name in DEPARTMENTS])
+PROCEDURE_COUNTS = np.array([len(SURGERIES[name][1]) for name in DEPARTMENTS])
+PROCEDURE_OFFSETS = np.cumsum(PROCEDURE_COUNTS) - PROCEDURE_COUNTS
+PROCEDURES, PROCEDURE_MINUTES = (np.array(column) for column in
+                                 zip(*[p for name in DEPARTMENTS for p in SURGERIES[name][1]]))
+FIRST_NAMES = FEMALE_NAMES + MALE_NAMES
+FULL_NAMES = np.array([f'{first} {last}' for first in FIRST_NAMES for last in LAST_NAMES])
+NAME_KEYS = np.array([normalize_name(name) for name in FULL_NAMES])
+
+def skewed_index(rng, sizes, skew):
+    """Index into groups of the given sizes; skew > 1 favours the first entries of each group"""
+    return np.floor(sizes * rng.random(len(sizes)) ** skew).astype(np.int64)
+
+def weighted_choice(rng, weights, count):
+    cumulative = np.cumsum(weights) / np.sum(weights)
+    return np.minimum(np.searchsorted(cumulative, rng.random(count), side='right'), len(weights) - 1)
+
+def timestamps(start, minutes):
+    return start + np.asarray(minutes, dtype=np.int64).astype('timedelta64[m]')
+
+def lognormal_minutes(rng, median, sigma, count):
+    return np.round(rng.lognormal(np.log(median), sigma, count)).astype(np.int64)
+
+def generate_patients(rng, count, days):
+    """Patients with a home district and the minute of their first visit, which are not stored"""
+    female = rng.random(count) < 0.52
+    child = rng.random(count) < 0.22
+    age = np.where(child, rng.integers(0, 15, count),
+                   np.clip(np.round(rng.normal(42, 16, count)), 15, 95)).astype(np.int64)
+    first = rng.integers(0, len(FEMALE_NAMES), count) + np.where(female, 0, len(FEMALE_NAMES))
+    name_index = first * len(LAST_NAMES) + skewed_index(rng, np.full(count, len(LAST_NAMES)), 1.5)
+    contact = pd.Series(9000000000 + rng.integers(0, 10 ** 9, count)).astype(str)
+    return pd.DataFrame({
+        'patient_id': 'PAT' + pd.Series(np.arange(1, count + 1)).astype(str).str.zfill(8),
+        'name': FULL_NAMES[name_index],
+        'age': age,
+        'gender': np.where(female, 'Female', 'Male'),
+        'contact': contact,
+        'name_key': NAME_KEYS[name_index],
+        'contact_key': contact.str[::-1],
+        'district': np.array(DISTRICTS)[skewed_index(rng, np.full(count, len(DISTRICTS)), 1.8)],
+        'first_visit': rng.integers(0, days * MINUTES_PER_DAY, count)
+    })
+
+def generate_opd(rng, patients, start, days, mean_visits):
+    """Repeat visits per patient, mostly to the patient's usual department, during clinic hours"""
+    count = len(patients)
+    # Geometric visit counts: most patients come once or twice, a few attend frequently
+    visits = rng.geometric(1 / mean_visits, count)
+    patient_index = np.repeat(np.arange(count), visits)
+    first = np.cumsum(visits) - visits
+    total = len(patient_index)
+
+    # Visit times: registration, then exponential gaps, accumulated per patient
+    gaps = rng.exponential(REVISIT_DAYS * MINUTES_PER_DAY, total)
+    gaps[first] = patients['first_visit'].to_numpy()
+    offsets = np.cumsum(gaps)
+    offsets -= np.repeat(offsets[first] - gaps[first], visits)
+    visit_number = np.arange(total) - np.repeat(first, visits)
+
+    # Children go to Paediatrics and many women of child-bearing age to Obstetrics
+    age = patients['age'].to_numpy()
+    female = patients['gender'].to_numpy() == 'Female'
+    usual = weighted_choice(rng, DEPARTMENT_SHARES, count)
+    usual = np.where((age < 15) & (rng.random(count) < 0.85), list(DEPARTMENTS).index('Paediatrics'), usual)
+    usual = np.where(female & (age >= 18) & (age <= 45) & (rng.random(count) < 0.3),
+                     list(DEPARTMENTS).index('Obstetrics'), usual)
+    department = np.where(rng.random(total) < 0.75, usual[patient_index], weighted_choice(rng, DEPARTMENT_SHARES, total))
+    department = np.where(~female[patient_index] & (department == list(DEPARTMENTS).index('Obstetrics')),
+                          list(DEPARTMENTS).index('General'), department)
+    department = np.where((age[patient_index] < 15) & np.isin(department, ADULT_DEPARTMENTS),
+                          list(DEPARTMENTS).index('Paediatrics'), department)
+
+    doctor = DOCTOR_OFFSETS[department] + skewed_index(rng, DOCTOR_COUNTS[department], 1.7)
+    condition = CONDITION_OFFSETS[department] + skewed_index(rng, CONDITION_COUNTS[department], 1.4)
+    day = np.floor(offsets / MINUTES_PER_DAY).astype(np.int64)
+    minute = day * MINUTES_PER_DAY + 8 * 60 + rng.integers(0, 8 * 60, total)
+    keep = day < days
+
+    opd = pd.DataFrame({
+        'date': timestamps(start, minute),
+        'patient_id': patients['patient_id'].to_numpy()[patient_index],
+        'department': DEPARTMENT_NAMES[department],
+        'doctor': DOCTORS[doctor],
+        'diagnosis': DIAGNOSES[condition],
+        'treatment': TREATMENTS[condition],
+        # Follow-up consultations are charged half
+        'fee': DEPARTMENT_FEES[department] * np.where(visit_number > 0, 0.5, 1.0),
+        'patient_index': patient_index,
+        'department_index': department,
+        'doctor_index': doctor,
+        'condition': condition
+    })[keep]
+    return opd.sort_values('date', kind='stable', ignore_index=True)
+
+def generate_ipd(rng, patients, opd, end):
+    """Admissions from OPD visits, likelier for older patients, with a log-normal length of stay"""
+    age = patients['age'].to_numpy()[opd['patient_index'].to_numpy()]
+    department = opd['department_index'].to_numpy()
+    admitted = rng.random(len(opd)) < ADMISSION_RATES[department] * (0.5 + age / 60)
+    visits = opd[admitted]
+    count = len(visits)
+    department = department[admitted]
+
+    admission = visits['date'].to_numpy() + rng.integers(30, 240, count).astype('timedelta64[m]')
+    stay = lognormal_minutes(rng, MEAN_STAY_DAYS * MINUTES_PER_DAY, 0.7, count)
+    discharge = admission + stay.astype('timedelta64[m]')
+    discharged = discharge <= end
+    return pd.DataFrame({
+        'admission_date': admission,
+        'patient_id': visits['patient_id'].to_numpy(),
+        'room_no': (100 * (department + 1) + rng.integers(1, 40, count)).astype(str),
+        'admission_reason': visits['diagnosis'].to_numpy(),
+        'doctor': visits['doctor'].to_numpy(),
+        'discharge_date': np.where(discharged, discharge, np.datetime64('NaT')),
+        'status': np.where(discharged, 'Discharged', 'Admitted'),
+        'department_index': department,
+        'stay': stay
+    })
+
+
+def operations(rng, day_start, max_delay_days, patient_id, procedure, minutes, surgeon, end):
+    """OT sessions within max_delay_days of day_start, starting on a 15 minute slot between 08:00 and 17:00"""
+    count = len(patient_id)
+    date = day_start + np.minimum(rng.integers(0, 3, count), max_delay_days).astype('timedelta64[D]')
+    start_time = date + (8 * 60 + 15 * rng.integers(0, 37, count)).astype('timedelta64[m]')
+    duration = np.maximum(np.round(minutes * rng.lognormal(0, 0.3, count)), 10).astype(np.int64)
+    end_time = start_time + duration.astype('timedelta64[m]')
+    return pd.DataFrame({
+        'date': date,
+        'patient_id': patient_id,
+        'surgery_type': procedure,
+        'surgeon': surgeon,
+        'anesthetist': np.array(ANESTHETISTS)[skewed_index(rng, np.full(count, len(ANESTHETISTS)), 1.3)],
+        'start_time': start_time,
+        'end_time': end_time,
+        'status': np.where(end_time <= end, 'Completed', 'Scheduled')
+    })
+
+def generate_ot(rng, ipd, end):
+    """Operations for the surgical share of each department's admissions, during the stay"""
+    department = ipd['department_index'].to_numpy()
+    operated = rng.random(len(ipd)) < SURGERY_RATES[department]
+    admissions = ipd[operated]
+    department = department[operated]
+    procedure = PROCEDURE_OFFSETS[department] + skewed_index(rng, PROCEDURE_COUNTS[department], 1.2)
+    day_start = admissions['admission_date'].to_numpy().astype('datetime64[D]')
+    return operations(rng, day_start, admissions['stay'].to_numpy() // MINUTES_PER_DAY,
+                      admissions['patient_id'].to_numpy(), PROCEDURES[procedure], PROCEDURE_MINUTES[procedure],
+                      admissions['doctor'].to_numpy(), end)
+
+def generate_deliveries(rng, patients, start, days):
+    """Deliveries for a share of the women aged 18 to 45"""
+    age = patients['age'].to_numpy()
+    eligible = (patients['gender'].to_numpy() == 'Female') & (age >= 18) & (age <= 45)
+    mothers = patients[eligible & (rng.random(len(patients)) < DELIVERY_RATE)]
+    count = len(mothers)
+    obstetrics = list(DEPARTMENTS).index('Obstetrics')
+    delivery_type = weighted_choice(rng, [share for _, share in DELIVERY_TYPES], count)
+    # Babies delivered by Caesarean section are slightly lighter on average
+    weight = rng.normal(3.1, 0.45, count) - 0.15 * (delivery_type == 1)
+    return pd.DataFrame({
+        'date': timestamps(start, rng.integers(0, days * MINUTES_PER_DAY, count)),
+        'patient_id': mothers['patient_id'].to_numpy(),
+        'delivery_type': np.array([name for name, _ in DELIVERY_TYPES])[delivery_type],
+        'doctor': DOCTORS[DOCTOR_OFFSETS[obstetrics] + skewed_index(rng, np.full(count, DOCTOR_COUNTS[obstetrics]), 1.5)],
+        'baby_gender': np.where(rng.random(count) < 0.512, 'Male', 'Female'),
+        'weight': np.round(np.clip(weight, 1.0, 5.0), 2),
+        'status': 'Completed'
+    }).sort_values('date', kind='stable', ignore_index=True)
+
+def generate_linelist(rng, patients, opd, end):
+    """Surveillance linelist with one row per OPD visit, in the column layout the Excel analyzer reads"""
+    patient_index = opd['patient_index'].to_numpy()
+    condition = opd['condition'].to_numpy()
+    age = patients['age'].to_numpy()[patient_index]
+    tested = POSITIVITY[condition] > 0
+    recent = opd['date'].to_numpy() > end - np.timedelta64(14, 'D')
+    # Outcome: recent visits are still under treatment; referrals and deaths rise with age
+    draw = rng.random(len(opd))
+    outcome = np.where(draw < 0.002 * (1 + age / 20), 3, np.where(draw < 0.04, 2, np.where(recent, 1, 0)))
+    return pd.DataFrame({
+        'Date': opd['date'].to_numpy().astype('datetime64[D]'),
+        'Patient_ID': opd['patient_id'].to_numpy(),
+        'District': patients['district'].to_numpy()[patient_index],
+        'Age': age,
+        'Gender': np.where(patients['gender'].to_numpy()[patient_index] == 'Female', 'F', 'M'),
+        'Department': opd['department'].to_numpy(),
+        'Symptoms': SYMPTOMS[condition],
+        'Diagnosis': opd['diagnosis'].to_numpy(),
+        'Lab_Result': np.where(tested, np.where(rng.random(len(opd)) < POSITIVITY[condition], 'Positive',
+                                                'Negative'), 'Not Done'),
+        'Outcome': np.array(OUTCOMES)[outcome]
+    })
+
+def generate(patients, mean_visits=3.0, seed=42, start='2023-01-01', days=730):
+    """All tables as DataFrames keyed by table name, plus the linelist under 'linelist'"""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64(start, 'm')
+    end = start + np.timedelta64(days * MINUTES_PER_DAY, 'm')
+    patient_frame = generate_patients(rng, patients, days)
+    opd = generate_opd(rng, patient_frame, start, days, mean_visits)
+    ipd = generate_ipd(rng, patient_frame, opd, end)
+    deliveries = generate_deliveries(rng, patient_frame, start, days)
+    caesareans = deliveries[deliveries['delivery_type'] == 'Caesarean']
+    ot = pd.concat([
+        generate_ot(rng, ipd, end),
+        operations(rng, caesareans['date'].to_numpy().astype('datetime64[D]'), 0,
+                   caesareans['patient_id'].to_numpy(), CAESAREAN[0], CAESAREAN[1],
+                   caesareans['doctor'].to_numpy(), end)
+    ]).sort_values('start_time', kind='stable', ignore_index=True)
+    return {
+        'patient': patient_frame,
+        'opd_record': opd,
+        'ipd_record': ipd.sort_values('admission_date', kind='stable', ignore_index=True),
+        'ot_record': ot,
+        'delivery_record': deliveries,
+        'linelist': generate_linelist(rng, patient_frame, opd, end)
+    }
+
+def sql_values(column):
+    """Column values as Python objects for the DBAPI, datetimes in SQLAlchemy's SQLite format"""
+    if pd.api.types.is_datetime64_any_dtype(column):
+        values = column.to_numpy()
+        text = np.char.replace(np.datetime_as_string(values, unit='us'), 'T', ' ').astype(object)
+        text[np.isnat(values)] = None
+        return text.tolist()
+    return column.tolist()
+
+def write_sqlite(connection, tables, batch_size=INSERT_BATCH_SIZE):
+    """Bulk insert the tables with executemany; the search index is built once at the end instead of per row"""
+    drop_search_triggers(connection)
+    counts = {}
+    for table, columns in TABLE_COLUMNS.items():
+        frame = tables[table]
+        values = [sql_values(frame[column]) for column in columns]
+        statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        for offset in range(0, len(frame), batch_size):
+            connection.exec_driver_sql(statement, list(zip(*(column[offset:offset + batch_size]
+                                                            for column in values))))
+        counts[table] = len(frame)
+    rebuild_search_index(connection)
+    return counts
+
+def linelist_sheets(frame):
+    """(sheet name, header, row iterator) per XLSX_MAX_ROWS rows, the most one sheet can hold"""
+    columns = list(frame.columns)
+    values = [frame[column].dt.to_pydatetime().tolist() if pd.api.types.is_datetime64_any_dtype(frame[column])
+              else frame[column].tolist() for column in columns]
+    for number, offset in enumerate(range(0, max(len(frame), 1), XLSX_MAX_ROWS), 1):
+        rows = zip(*(column[offset:offset + XLSX_MAX_ROWS] for column in values))
+        yield 'Linelist' if number == 1 else f'Linelist {number}', columns, rows
+
+def write_xlsx(frame, path):
+    """Stream the linelist into a workbook, with xlsxwriter if installed (about twice as fast) or openpyxl"""
+    try:
+        import xlsxwriter
+    except ImportError:
+        xlsxwriter = None
+    if xlsxwriter is None:
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        for name, columns, rows in linelist_sheets(frame):
+            sheet = workbook.create_sheet(name)
+            sheet.append(columns)
+            for row in rows:
+                sheet.append(row)
+        workbook.save(path)
+        return
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd'})
+    for name, columns, rows in linelist_sheets(frame):
+        sheet = workbook.add_worksheet(name)
+        sheet.write_row(0, 0, columns)
+        for index, row in enumerate(rows, 1):
+            sheet.write_row(index, 0, row)
+    workbook.close()
+
+def write_linelist(frame, path, file_format):
+    if file_format == 'csv':
+        frame.to_csv(path, index=False, date_format='%Y-%m-%d')
+    elif file_format == 'parquet':
+        try:
+            frame.to_parquet(path, index=False)
+        except ImportError as e:
+            raise SystemExit(f'Parquet output needs pyarrow: {e}')
+    else:
+        write_xlsx(frame, path)
+    return len(frame)
+
+def load_tables(tables):
+    """Insert into the empty database of the current app context, then rebuild the dashboard rollups"""
+    from app import db, bump_table_versions, mark_cache_tags, rebuild_rollups, Patient, VERSIONED_MODELS
+    db.create_all()
+    if db.session.query(Patient.id).first() is not None:
+        raise SystemExit('The database already has patients; generate into an empty database')
+    db.session.remove()
+    with db.engine.begin() as connection:
+        counts = write_sqlite(connection, tables)
+    # The raw inserts bypass the ORM hooks: move the ETags and caches on like any other write,
+    # committed together with the rebuilt rollups
+    table_names = {model.__tablename__ for model in VERSIONED_MODELS} & set(counts)
+    bump_table_versions(db.session, table_names)
+    mark_cache_tags(db.session, table_names)
+    rebuild_rollups()
+    return counts
+
+def load_database(tables, path=None):
+    """Insert into an empty application database, then rebuild the dashboard rollups"""
+    if path:
+        # Must be set before the app (and its engine) is created
+        os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(path)}'
+    from app import app
+    with app.app_context():
+        return load_tables(tables)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=100000)
+    parser.add_argument('--visits', type=float, default=3.0, help='mean OPD visits per patient')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--start', default='2023-01-01', help='first day of the generated period')
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--format', choices=['sqlite', 'csv', 'xlsx', 'parquet'], default='sqlite')
+    parser.add_argument('--output', help='SQLite database file (default: the configured DATABASE_URL) '
+                                         'or linelist path (default: linelist.<format>)')
+    args = parser.parse_args()
+    if args.visits < 1:
+        parser.error('--visits must be at least 1')
+
+    start = time.perf_counter()
+    tables = generate(args.patients, args.visits, args.seed, args.start, args.days)
+    generated = sum(len(tables[table]) for table in TABLE_COLUMNS)
+    elapsed = time.perf_counter() - start
+    print(f"Generated {generated} records for {args.patients} patients in {elapsed:.1f}s "
+          f"({generated / elapsed * 60 / 1e6:.1f}M rows/min)")
+
+    start = time.perf_counter()
+    if args.format == 'sqlite':
+        counts = load_database(tables, args.output)
+        for table, count in counts.items():
+            print(f"  {table:16} {count:>10}")
+        written = sum(counts.values())
+        target = args.output or 'the configured database'
+    else:
+        target = args.output or f'linelist.{args.format}'
+        written = write_linelist(tables['linelist'], target, args.format)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {written} rows to {target} in {elapsed:.1f}s ({written / elapsed * 60 / 1e6:.1f}M rows/min)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Gunicorn settings for the production entry point (see README, "Production deployment")"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+
+# Request handling is CPU-bound in this process (SQLite runs in-process), so
+# one worker per core; a few threads per worker overlap disk waits, commits
+# and the password hashing pool. Keep DB_POOL_SIZE >= WEB_THREADS.
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+
+# Import the app once in the master so workers share its memory copy-on-write
+preload_app = True
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('WEB_ACCESS_LOG')  # e.g. '-' for stdout
+errorlog = '-'
+
+# Workers leave metric snapshots here so that a scrape of any worker covers all of them;
+# keyed on the master's pid so a restarted server does not report its predecessor's workers
+if not os.environ.get('METRICS_DIR'):
+    metrics_dir = os.environ['METRICS_DIR'] = os.path.join(tempfile.gettempdir(), f'hms-metrics-{os.getpid()}')
+
+    def on_exit(server):
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+def post_fork(server, worker):
+    from app import app, init_worker
+    init_worker(app)
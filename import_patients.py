@@ -0,0 +1,29 @@
+import argparse
+import sys
+from app import app, db
+from utils import import_patient_data
+
+def print_progress(totals):
+    rate = totals['rows'] / totals['seconds'] if totals['seconds'] else 0
+    print(f"{totals['rows']:,} rows read: {totals['inserted']:,} inserted, {totals['updated']:,} updated, "
+          f"{totals['rejected']:,} rejected ({rate:,.0f} rows/s)", flush=True)
+
+def main():
+    """Import or update patients from a CSV/XLSX file"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('file', help='CSV or Excel file with patient_id, name, age, gender and contact columns')
+    parser.add_argument('--rejected', help='where to write invalid rows (default: <file>_rejected.csv)')
+    parser.add_argument('--chunk-size', type=int, help='rows validated and committed per transaction')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        success, result = import_patient_data(args.file, args.rejected, args.chunk_size, print_progress)
+    if not success:
+        sys.exit(f"Import failed: {result}")
+    print(f"Imported {result['inserted'] + result['updated']:,} patient(s) in {result['seconds']:.2f}s")
+    if result['rejected']:
+        print(f"{result['rejected']:,} invalid row(s) written to {result['rejected_path']}")
+
+if __name__ == '__main__':
+    main()
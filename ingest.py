@@ -0,0 +1,196 @@
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: spill files are not locked
+    fcntl = None
+
+logger = logging.getLogger('ingest')
+
+class QueueFull(Exception):
+    """Raised when the ingestion queue cannot accept more records"""
+
+class IngestQueue:
+    """Bounded write-behind queue drained by a single writer thread.
+
+    Every accepted entry is appended to a per-process spill file (fsynced)
+    before it is acknowledged, so records accepted before a crash are
+    replayed, from a background thread, when the next worker starts. The writer hands batches of entries to
+    write_batch, which must commit them in one transaction and ignore
+    tickets it has already committed.
+    """
+
+    def __init__(self, app, write_batch, maxsize=10000, batch_size=500,
+                 spill_dir='ingest_spool', fsync=True, enabled=False):
+        self.app = app
+        self.write_batch = write_batch
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.spill_dir = spill_dir
+        self.fsync = fsync
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._reset()
+
+    def init_app(self, app):
+        """Take the queue settings from the app config"""
+        self.stop()
+        self.app = app
+        self.maxsize = app.config.get('INGEST_QUEUE_SIZE', 10000)
+        self.batch_size = app.config.get('INGEST_BATCH_SIZE', 500)
+        self.spill_dir = app.config.get('INGEST_SPILL_DIR', 'ingest_spool')
+        self.enabled = app.config.get('INGEST_MODE', 'sync') == 'async'
+        self._reset()
+
+    def _reset(self):
+        # Called again in a forked worker: threads and file handles do not survive fork
+        self._pid = os.getpid()
+        self._queue = queue.Queue(self.maxsize)
+        self._pending = set()
+        self._spill = None
+        self._thread = None
+        self._recovery = None
+        self._stopping = False
+
+    @property
+    def spill_path(self):
+        return os.path.join(self.spill_dir, f'ingest-{self._pid}.ndjson')
+
+    def start(self):
+        """Open this process's spill file, replay orphaned ones and start the writer"""
+        if self._pid != os.getpid():
+            self._reset()
+        if self._thread is not None:
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._spill = open(self.spill_path, 'a', encoding='utf-8')
+        if fcntl:
+            fcntl.flock(self._spill, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._thread = threading.Thread(target=self._run, name='ingest-writer', daemon=True)
+        self._thread.start()
+        # Replaying may block on a full queue, so it never runs in the caller's thread
+        self._recovery = threading.Thread(target=self._recover, name='ingest-recovery', daemon=True)
+        self._recovery.start()
+
+    def stop(self, timeout=10):
+        """Drain the queue and stop the writer thread"""
+        if self._thread is None:
+            return
+        self.join(timeout)
+        self._stopping = True
+        self._thread.join(timeout)
+        self._spill.close()
+        if not os.path.getsize(self.spill_path):
+            os.remove(self.spill_path)
+        self._reset()
+
+    def submit(self, record_type, payload):
+        """Queue a validated payload and return its ticket id"""
+        if self._thread is None or self._pid != os.getpid():
+            self.start()
+        ticket = uuid.uuid4().hex
+        entry = {'ticket': ticket, 'record_type': record_type, 'payload': payload}
+        with self._lock:
+            try:
+                self._queue.put_nowait(entry)
+            except queue.Full:
+                raise QueueFull(f'Ingestion queue is full ({self.maxsize} records)')
+            self._pending.add(ticket)
+            self._append_spill([entry])
+        return ticket
+
+    def is_pending(self, ticket):
+        with self._lock:
+            return ticket in self._pending
+
+    def join(self, timeout=None):
+        """Wait until every queued entry has been written"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self._recovery is not None:
+            self._recovery.join(timeout)
+            if self._recovery.is_alive():
+                return False
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'queued': self._queue.qsize(),
+            'maxsize': self.maxsize,
+            'running': self._thread is not None
+        }
+
+    def _append_spill(self, entries):
+        self._spill.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+        self._spill.flush()
+        if self.fsync:
+            os.fsync(self._spill.fileno())
+
+    def _recover(self):
+        """Re-queue entries from spill files left behind by crashed processes"""
+        for path in glob.glob(os.path.join(self.spill_dir, 'ingest-*.ndjson')):
+            if path == self.spill_path:
+                continue
+            with open(path, 'r+', encoding='utf-8') as orphan:
+                if fcntl:
+                    try:
+                        fcntl.flock(orphan, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # owned by a live worker
+                entries = [json.loads(line) for line in orphan if line.strip()]
+            if entries:
+                logger.warning('Replaying %d queued record(s) from %s', len(entries), path)
+            for entry in entries:
+                # Blocks while the writer drains; each entry is re-spilled once it is queued
+                self._queue.put(entry)
+                with self._lock:
+                    self._pending.add(entry['ticket'])
+                    self._append_spill([entry])
+            os.remove(path)
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        # Group commit: take whatever else queued up while the last batch was written
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            while True:
+                try:
+                    with self.app.app_context():
+                        self.write_batch(batch)
+                    break
+                except Exception:
+                    # Entries are still in the spill file; retry until the database is back
+                    logger.exception('Ingestion batch of %d record(s) failed, retrying', len(batch))
+                    time.sleep(1)
+            with self._lock:
+                for entry in batch:
+                    self._pending.discard(entry['ticket'])
+                    self._queue.task_done()
+                # Everything acknowledged so far is committed: start a fresh spill file
+                if not self._queue.unfinished_tasks:
+                    self._spill.truncate(0)
+                    self._spill.seek(0)
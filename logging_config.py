@@ -62,6 +62,36 @@ def setup_logging(app):
     app.logger.info(f'Environment: {app.config["ENV"]}')
     app.logger.info(f'Debug mode: {app.config["DEBUG"]}')
 
+class LazyRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotating file handler that creates its directory when the first record is written"""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+def setup_slow_query_logging(log_file='logs/slow_queries.log', max_bytes=10485760, backup_count=5):
+    """Route the slow_queries logger to its own rotating file, one JSON object per line"""
+    logger = logging.getLogger('slow_queries')
+    log_file = os.path.abspath(log_file)
+    for handler in logger.handlers:
+        if getattr(handler, 'baseFilename', None) == log_file:
+            return logger
+
+    # delay=True: nothing touches the disk, not even logs/, until a slow query is logged
+    handler = LazyRotatingFileHandler(
+        log_file,
+        maxBytes=max_bytes,
+        backupCount=backup_count,
+        delay=True
+    )
+    handler.setLevel(logging.WARNING)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.WARNING)
+    # Keep statements out of the general application log
+    logger.propagate = False
+    return logger
+
 def log_user_activity(user_id, action, details=None):
     """Log user activities"""
     logger = logging.getLogger('user_activity')
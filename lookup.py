@@ -0,0 +1,41 @@
+import re
+import unicodedata
+
+NON_ALPHANUMERIC = re.compile(r'[^0-9a-z]+')
+NON_DIGIT = re.compile(r'\D+')
+
+# Shortest digit string treated as a phone number search
+MIN_CONTACT_DIGITS = 3
+
+def normalize_name(name):
+    """Lowercase, strip accents and punctuation and collapse spaces: 'José  O'Neil' -> 'jose oneil'"""
+    if not name:
+        return None
+    ascii_name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii').lower()
+    words = [NON_ALPHANUMERIC.sub('', word) for word in ascii_name.split()]
+    return ' '.join(word for word in words if word) or None
+
+def reverse_digits(contact):
+    """Digits of a phone number, last digit first, so suffix searches become prefix searches"""
+    if not contact:
+        return None
+    return NON_DIGIT.sub('', contact)[::-1] or None
+
+def normalize_names(names):
+    """normalize_name over a pandas Series of strings, for bulk imports"""
+    ascii_names = names.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii').str.lower()
+    keys = ascii_names.str.replace(r'[^0-9a-z\s]+', '', regex=True).str.split().str.join(' ')
+    return keys.where(keys != '')
+
+def reverse_digits_series(contacts):
+    """reverse_digits over a pandas Series of strings"""
+    keys = contacts.str.replace(NON_DIGIT, '', regex=True).str[::-1]
+    return keys.where(keys != '')
+
+def prefix_upper_bound(prefix):
+    """Smallest string greater than every string starting with prefix, for indexed range scans"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def prefix_condition(column, prefix):
+    """column >= prefix AND column < upper bound, which any B-tree index can serve"""
+    return (column >= prefix) & (column < prefix_upper_bound(prefix))
@@ -0,0 +1,218 @@
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+from flask import Response, abort, g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+# Metric families in exposition order: (name, type, help)
+FAMILIES = [
+    ('http_request_duration_seconds', 'histogram', 'Request latency by route.'),
+    ('http_requests_total', 'counter', 'Responses by route and status code.'),
+    ('http_requests_in_flight', 'gauge', 'Requests currently being handled.'),
+    ('db_queries_per_request', 'histogram', 'SQL statements executed per request.'),
+    ('db_query_duration_seconds_total', 'counter', 'Time spent executing SQL, by route.')
+]
+# Seconds between snapshots a worker writes to METRICS_DIR
+DUMP_INTERVAL = 1.0
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Cumulative histogram in the Prometheus exposition format"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        for bound, count in zip(self.buckets, self.counts):
+            yield f'{name}_bucket{format_labels(dict(labels, le=format_value(bound)))} {count}'
+        yield f'{name}_bucket{format_labels(dict(labels, le="+Inf"))} {self.count}'
+        yield f'{name}_sum{format_labels(labels)} {format_value(self.sum)}'
+        yield f'{name}_count{format_labels(labels)} {self.count}'
+
+class RequestMetrics:
+    """Per-route request latency, status and SQL statistics, served at /metrics.
+
+    Every series carries a pid label. With METRICS_DIR set, each worker writes
+    a snapshot of its samples there at most every DUMP_INTERVAL seconds and a
+    scrape answered by any worker returns the series of all live workers.
+    Without a METRICS_TOKEN, only scrapes from the local host are answered.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.directory = None
+        self.token = None
+        self._dumped_at = 0.0
+        self.in_flight = 0
+        self.latency = {}
+        self.responses = {}
+        self.query_counts = {}
+        self.query_seconds = {}
+
+    def init_app(self, app, db):
+        """Hook into the app's request cycle and the SQL executed on its engines"""
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        self.response_headers = app.config.get('METRICS_RESPONSE_HEADERS', False)
+        self.directory = app.config.get('METRICS_DIR')
+        self.token = app.config.get('METRICS_TOKEN')
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        app.teardown_request(self.end_request)
+        app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', self.metrics_view)
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+        # Queries from background threads (e.g. the ingestion writer) have no request
+        if has_request_context() and 'query_count' in g:
+            g.query_count += 1
+            g.query_seconds += elapsed
+
+    def start_request(self):
+        g.request_start_time = time.perf_counter()
+        g.query_count = 0
+        g.query_seconds = 0.0
+        with self._lock:
+            self.in_flight += 1
+
+    def finish_request(self, response):
+        if 'request_start_time' not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_start_time
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        with self._lock:
+            self.latency.setdefault((request.method, route), Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            key = (request.method, route, str(response.status_code))
+            self.responses[key] = self.responses.get(key, 0) + 1
+            self.query_counts.setdefault(route, Histogram(QUERY_COUNT_BUCKETS)).observe(g.query_count)
+            self.query_seconds[route] = self.query_seconds.get(route, 0.0) + g.query_seconds
+        if self.directory and time.monotonic() - self._dumped_at >= DUMP_INTERVAL:
+            self.dump()
+        if self.response_headers:
+            response.headers['X-Query-Count'] = str(g.query_count)
+            response.headers['Server-Timing'] = (
+                f'db;dur={g.query_seconds * 1000:.1f};desc="{g.query_count} queries", '
+                f'app;dur={elapsed * 1000:.1f}'
+            )
+        return response
+
+    def end_request(self, error=None):
+        if g.pop('request_start_time', None) is not None:
+            with self._lock:
+                self.in_flight -= 1
+
+    def samples(self):
+        """This worker's sample lines by metric family, each labelled with its pid"""
+        pid = {'pid': os.getpid()}
+        with self._lock:
+            samples = {
+                'http_request_duration_seconds': [
+                    line for (method, route), histogram in sorted(self.latency.items())
+                    for line in histogram.samples('http_request_duration_seconds',
+                                                  dict(pid, method=method, route=route))
+                ],
+                'http_requests_total': [
+                    f'http_requests_total{format_labels(dict(pid, method=method, route=route, status=status))} {count}'
+                    for (method, route, status), count in sorted(self.responses.items())
+                ],
+                'http_requests_in_flight': [f'http_requests_in_flight{format_labels(pid)} {self.in_flight}'],
+                'db_queries_per_request': [
+                    line for route, histogram in sorted(self.query_counts.items())
+                    for line in histogram.samples('db_queries_per_request', dict(pid, route=route))
+                ],
+                'db_query_duration_seconds_total': [
+                    f'db_query_duration_seconds_total{format_labels(dict(pid, route=route))} {format_value(seconds)}'
+                    for route, seconds in sorted(self.query_seconds.items())
+                ]
+            }
+        return samples
+
+    def dump(self):
+        """Write this worker's samples to METRICS_DIR, replacing its previous snapshot atomically"""
+        self._dumped_at = time.monotonic()
+        path = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as snapshot:
+            json.dump(self.samples(), snapshot)
+        os.replace(path + '.tmp', path)
+
+    def worker_samples(self):
+        """Snapshots of every live worker, this one freshly taken; files of exited workers are removed"""
+        if not self.directory:
+            return [self.samples()]
+        self.dump()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                os.remove(path)
+                continue
+            except PermissionError:
+                pass
+            try:
+                with open(path, encoding='utf-8') as snapshot:
+                    snapshots.append(json.load(snapshot))
+            except (OSError, ValueError):
+                continue  # removed or replaced while reading
+        return snapshots
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        snapshots = self.worker_samples()
+        lines = []
+        for name, kind, help_text in FAMILIES:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            for snapshot in snapshots:
+                lines.extend(snapshot.get(name, []))
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        if self.token:
+            if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {self.token}'):
+                abort(401)
+        elif request.remote_addr not in LOCAL_ADDRESSES:
+            abort(403)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def reset(self):
+        with self._lock:
+            self.latency.clear()
+            self.responses.clear()
+            self.query_counts.clear()
+            self.query_seconds.clear()
@@ -0,0 +1,78 @@
+import time
+from sqlalchemy import inspect
+from app import app, db, Patient
+from lookup import normalize_name, reverse_digits
+
+BACKFILL_BATCH_SIZE = 10000
+
+def add_missing_columns(inspector, table):
+    """Add nullable model columns missing from an existing table; returns their names"""
+    existing = {column['name'] for column in inspector.get_columns(table.name)}
+    added = []
+    for column in table.columns:
+        if column.name in existing or not column.nullable:
+            continue
+        column_type = column.type.compile(dialect=db.engine.dialect)
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+        print(f"Added column {table.name}.{column.name}")
+        added.append(column.name)
+    return added
+
+def backfill_patient_lookup_keys():
+    """Compute name_key and contact_key for patients registered before the lookup indexes"""
+    patients = Patient.__table__
+    last_id = 0
+    updated = 0
+    while True:
+        rows = db.session.execute(
+            db.select(patients.c.id, patients.c.name, patients.c.contact)
+            .where(patients.c.id > last_id).order_by(patients.c.id).limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        db.session.execute(
+            patients.update().where(patients.c.id == db.bindparam('row_id'))
+            .values(name_key=db.bindparam('new_name_key'), contact_key=db.bindparam('new_contact_key')),
+            [{'row_id': row.id, 'new_name_key': normalize_name(row.name),
+              'new_contact_key': reverse_digits(row.contact)}
+             for row in rows]
+        )
+        db.session.commit()
+        last_id = rows[-1].id
+        updated += len(rows)
+    print(f"Back-filled lookup keys for {updated} patient(s)")
+
+def migrate_indexes():
+    """Add the columns and build the model indexes missing from an existing database"""
+    with app.app_context():
+        inspector = inspect(db.engine)
+        created = 0
+
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                print(f"Skipping {table.name}: table does not exist yet (run init_db.py)")
+                continue
+
+            added = add_missing_columns(inspector, table)
+            if table is Patient.__table__ and {'name_key', 'contact_key'} & set(added):
+                backfill_patient_lookup_keys()
+
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                start = time.perf_counter()
+                index.create(bind=db.engine, checkfirst=True)
+                print(f"Created {index.name} in {time.perf_counter() - start:.2f}s")
+                created += 1
+
+        # Refresh planner statistics so SQLite picks the new indexes
+        if created:
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('ANALYZE')
+        print(f"{created} index(es) created.")
+        return created
+
+if __name__ == '__main__':
+    migrate_indexes()
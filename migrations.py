@@ -1,11 +1,5 @@
-from flask_migrate import Migrate, MigrateCommand
+"""Alembic migrations through the Flask CLI, e.g. FLASK_APP=migrations flask db upgrade"""
+from flask_migrate import Migrate
 from app import app, db
-from flask_script import Manager
 
 migrate = Migrate(app, db)
-manager = Manager(app)
-
-manager.add_command('db', MigrateCommand)
-
-if __name__ == '__main__':
-    manager.run() 
\ No newline at end of file
@@ -0,0 +1,73 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import generate_password_hash, check_password_hash
+
+class HashingBusy(Exception):
+    """Raised when too many password hashes are already waiting for a worker"""
+
+class PasswordHasher:
+    """Runs password hashing on a small bounded thread pool.
+
+    hashlib releases the GIL while deriving keys, so a handful of workers
+    keeps the CPU busy with logins while the cap stops a shift-change burst
+    from starving every other request of CPU time.
+    """
+
+    def __init__(self, method='scrypt:32768:8:1', max_workers=2, max_pending=64, timeout=10):
+        self.configure(method, max_workers, max_pending, timeout)
+
+    def init_app(self, app):
+        self.configure(
+            method=app.config.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1'),
+            max_workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+            max_pending=app.config.get('PASSWORD_HASH_MAX_PENDING', 64),
+            timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+        )
+
+    def configure(self, method, max_workers, max_pending, timeout):
+        self.method = method
+        # Werkzeug fills in default parameters (e.g. 'pbkdf2' -> 'pbkdf2:sha256:600000')
+        self.prefix = generate_password_hash('', method).split('$', 1)[0]
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._reset()
+
+    def _reset(self):
+        # Called again in a forked worker: the pool's threads do not survive fork
+        executor = getattr(self, '_executor', None)
+        if executor is not None and self._pid == os.getpid():
+            # Queued and running hashes still finish; the idle threads exit afterwards
+            executor.shutdown(wait=False)
+        self._pid = os.getpid()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def _run(self, func, *args):
+        if self._pid != os.getpid():
+            self._reset()
+        slots = self._slots
+        if not slots.acquire(timeout=self.timeout):
+            raise HashingBusy('Too many logins in progress, please retry')
+        try:
+            future = self._executor.submit(func, *args)
+        except RuntimeError:
+            slots.release()
+            raise
+        # A hash that outlives the wait keeps its slot until it actually finishes
+        future.add_done_callback(lambda future: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HashingBusy('Password hashing timed out, please retry') from None
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True when the stored hash was made with a different method or cost"""
+        return pwhash.split('$', 1)[0] != self.prefix
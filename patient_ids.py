@@ -0,0 +1,98 @@
+import os
+import re
+import string
+import threading
+
+# Luhn doubling of each digit, with the digits of the result summed: 7 -> 14 -> 5
+LUHN_DOUBLED = str.maketrans('0123456789', '0246813579')
+
+def luhn_check_digit(number):
+    """Digit that makes the number followed by it pass the Luhn check"""
+    digits = str(number)[::-1]
+    # Counting from the right, the check digit takes position 0, so the even positions are doubled
+    total = sum(map(int, digits[::2].translate(LUHN_DOUBLED))) + sum(map(int, digits[1::2]))
+    return (10 - total % 10) % 10
+
+def format_pattern(id_format):
+    """Regex matching IDs produced by id_format, capturing the number and the check digit"""
+    pattern = ''
+    for literal, field, spec, conversion in string.Formatter().parse(id_format):
+        pattern += re.escape(literal)
+        if field == 'number':
+            pattern += r'(?P<number>\d+)'
+        elif field == 'check':
+            pattern += r'(?P<check>\d)'
+        elif field is not None:
+            raise ValueError(f'Unknown field in ID format: {field}')
+    if '(?P<number>' not in pattern:
+        raise ValueError('The ID format needs a {number} field')
+    return re.compile(pattern)
+
+class IdAllocator:
+    """Unique formatted IDs from blocks of numbers reserved in a shared database sequence.
+
+    reserve_block(name, size) must advance the named sequence by size in its own
+    transaction and return the first number of the claimed range. IDs within a block
+    come from memory, so the database is touched once per block_size IDs in each
+    process; numbers of a block a process never uses are skipped, never reused.
+    """
+
+    def __init__(self, reserve_block, name='patient', block_size=1000, id_format='PAT{number:08d}{check}'):
+        self.reserve_block = reserve_block
+        self.name = name
+        self.block_size = block_size
+        self.id_format = id_format
+        self.pattern = format_pattern(id_format)
+        self._reset()
+
+    def init_app(self, app):
+        """Take the block size and ID format from the app config"""
+        self.block_size = app.config.get('PATIENT_ID_BLOCK_SIZE', 1000)
+        self.id_format = app.config.get('PATIENT_ID_FORMAT', 'PAT{number:08d}{check}')
+        self.pattern = format_pattern(self.id_format)
+        self._reset()
+
+    def _reset(self):
+        # Called again in a forked worker, which must not hand out its parent's block
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._numbers = iter(())
+
+    def next_number(self):
+        if self._pid != os.getpid():
+            self._reset()
+        while True:
+            numbers = self._numbers
+            try:
+                # Advancing a range iterator is atomic under the GIL, so no lock is needed here
+                return next(numbers)
+            except StopIteration:
+                with self._lock:
+                    # Another thread may have refilled while this one waited
+                    if self._numbers is numbers:
+                        first = self.reserve_block(self.name, self.block_size)
+                        self._numbers = iter(range(first, first + self.block_size))
+
+    def format(self, number):
+        return self.id_format.format(number=number, check=luhn_check_digit(number))
+
+    def next_id(self):
+        """A new unique ID"""
+        return self.format(self.next_number())
+
+    def take(self, count):
+        """count new IDs, e.g. for a bulk import; large requests reserve a range of their own"""
+        if count >= self.block_size:
+            first = self.reserve_block(self.name, count)
+            numbers = range(first, first + count)
+        else:
+            numbers = [self.next_number() for _ in range(count)]
+        return [self.format(number) for number in numbers]
+
+    def is_valid(self, patient_id):
+        """Whether patient_id has this allocator's format and a correct check digit"""
+        match = self.pattern.fullmatch(patient_id)
+        if match is None:
+            return False
+        check = match.groupdict().get('check')
+        return check is None or int(check) == luhn_check_digit(int(match['number']))
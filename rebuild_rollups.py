@@ -0,0 +1,14 @@
+import time
+from app import app, db, DailyRollup, rebuild_rollups
+
+def main():
+    """Recompute the dashboard rollups from the record tables"""
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        rebuild_rollups()
+        rows = db.session.query(DailyRollup).count()
+        print(f"Rebuilt {rows} rollup row(s) in {time.perf_counter() - start:.2f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+import time
+from app import app, db
+from search import rebuild_search_index
+
+def main():
+    """Rebuild the full-text search index from the OPD and IPD record tables"""
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        with db.engine.begin() as connection:
+            rows = rebuild_search_index(connection)
+        print(f"Indexed {rows} record(s) in {time.perf_counter() - start:.2f}s")
+
+if __name__ == '__main__':
+    main()
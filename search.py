@@ -0,0 +1,156 @@
+import re
+from markupsafe import escape
+from sqlalchemy import event, inspect, text
+
+SEARCH_TABLE = 'record_search'
+
+# Free-text columns mirrored into the FTS5 index. Each source gets its own rowid
+# range (record id * 2 + offset) so the triggers can address index rows directly.
+SEARCH_SOURCES = {
+    'opd': {
+        'table': 'opd_record',
+        'offset': 0,
+        'diagnosis': 'diagnosis',
+        'treatment': 'treatment',
+        'date': 'date'
+    },
+    'ipd': {
+        'table': 'ipd_record',
+        'offset': 1,
+        'diagnosis': 'admission_reason',
+        'treatment': None,
+        'date': 'admission_date'
+    }
+}
+
+SEARCH_COLUMNS = 'rowid, diagnosis, treatment, record_type, record_id, patient_id, record_date'
+
+# bm25 weights for the diagnosis and treatment columns
+DIAGNOSIS_WEIGHT = 2.0
+TREATMENT_WEIGHT = 1.0
+
+# Control characters marking matches in snippets; replaced after HTML-escaping
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+def source_values(record_type, source, prefix=''):
+    """SQL expressions for one source row, in index column order"""
+    treatment = f"{prefix}{source['treatment']}" if source['treatment'] else "''"
+    return (f"{prefix}id * 2 + {source['offset']}, {prefix}{source['diagnosis']}, {treatment}, "
+            f"'{record_type}', {prefix}id, {prefix}patient_id, {prefix}{source['date']}")
+
+def search_ddl(record_types=None):
+    """Statements creating the FTS5 table and the triggers that keep it in sync, for all
+    sources or only those in record_types"""
+    statements = [
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+        'diagnosis, treatment, record_type UNINDEXED, record_id UNINDEXED, '
+        "patient_id UNINDEXED, record_date UNINDEXED, tokenize='porter unicode61')"
+    ]
+    for record_type, source in SEARCH_SOURCES.items():
+        if record_types is not None and record_type not in record_types:
+            continue
+        table = source['table']
+        values = source_values(record_type, source, 'new.')
+        statements += [
+            f'CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN '
+            f'INSERT INTO {SEARCH_TABLE}({SEARCH_COLUMNS}) VALUES ({values}); END',
+            f'CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN '
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 2 + {source['offset']}; END",
+            f'CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE ON {table} BEGIN '
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 2 + {source['offset']}; "
+            f'INSERT INTO {SEARCH_TABLE}({SEARCH_COLUMNS}) VALUES ({values}); END'
+        ]
+    return statements
+
+def create_search_index(connection):
+    """Create the index and the triggers of the source tables present, e.g. after a partial create_all"""
+    tables = set(inspect(connection).get_table_names())
+    record_types = [record_type for record_type, source in SEARCH_SOURCES.items() if source['table'] in tables]
+    for statement in search_ddl(record_types):
+        connection.exec_driver_sql(statement)
+
+def drop_search_index(connection):
+    connection.exec_driver_sql(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+def drop_search_triggers(connection):
+    """Stop indexing row by row, e.g. during a bulk load; rebuild_search_index recreates the triggers"""
+    for source in SEARCH_SOURCES.values():
+        for action in ('insert', 'delete', 'update'):
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {source['table']}_search_{action}")
+
+def rebuild_search_index(connection):
+    """Repopulate the index from the record tables, e.g. for a database created before it existed"""
+    create_search_index(connection)
+    connection.exec_driver_sql(f'DELETE FROM {SEARCH_TABLE}')
+    for record_type, source in SEARCH_SOURCES.items():
+        connection.exec_driver_sql(
+            f'INSERT INTO {SEARCH_TABLE}({SEARCH_COLUMNS}) '
+            f"SELECT {source_values(record_type, source)} FROM {source['table']}"
+        )
+    # Merge the index b-trees written by the bulk load
+    connection.exec_driver_sql(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+    return connection.exec_driver_sql(f'SELECT count(*) FROM {SEARCH_TABLE}').scalar()
+
+def init_search(db):
+    """Create and drop the FTS5 index together with the model tables on SQLite"""
+
+    @event.listens_for(db.metadata, 'after_create')
+    def create_search_table(target, connection, **kw):
+        if connection.dialect.name == 'sqlite':
+            create_search_index(connection)
+
+    @event.listens_for(db.metadata, 'before_drop')
+    def drop_search_table(target, connection, **kw):
+        if connection.dialect.name == 'sqlite':
+            drop_search_index(connection)
+
+def match_expression(query):
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix"""
+    tokens = TOKEN_PATTERN.findall(query)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+def highlight(snippet):
+    """HTML-escape a snippet and wrap the matched terms in <mark>"""
+    return str(escape(snippet)).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+def search_records(connection, query, record_types=None, date_from=None, date_to=None, limit=20, offset=0):
+    """Ranked matches for query, best first, with a highlighted snippet per record"""
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    conditions = [f'{SEARCH_TABLE} MATCH :expression']
+    params = {'expression': expression, 'limit': limit, 'offset': offset}
+    if record_types:
+        names = [f':type_{index}' for index in range(len(record_types))]
+        conditions.append(f"record_type IN ({', '.join(names)})")
+        params.update({f'type_{index}': name for index, name in enumerate(record_types)})
+    # Dates are stored as SQLite text, so ISO strings compare correctly
+    if date_from:
+        conditions.append('record_date >= :date_from')
+        params['date_from'] = date_from.strftime('%Y-%m-%d')
+    if date_to:
+        conditions.append('record_date < :date_to')
+        params['date_to'] = date_to.strftime('%Y-%m-%d')
+
+    rows = connection.execute(text(
+        'SELECT record_type, record_id, patient_id, substr(record_date, 1, 10) AS date, '
+        f"snippet({SEARCH_TABLE}, -1, '{MATCH_START}', '{MATCH_END}', '...', 16) AS snippet, "
+        f'bm25({SEARCH_TABLE}, {DIAGNOSIS_WEIGHT}, {TREATMENT_WEIGHT}) AS rank '
+        f"FROM {SEARCH_TABLE} WHERE {' AND '.join(conditions)} "
+        'ORDER BY rank LIMIT :limit OFFSET :offset'
+    ), params).all()
+    return [{
+        'record_type': row.record_type,
+        'record_id': row.record_id,
+        'patient_id': row.patient_id,
+        'date': row.date,
+        'snippet': highlight(row.snippet),
+        'score': round(-row.rank, 4)
+    } for row in rows]
@@ -0,0 +1,68 @@
+import json
+from sqlalchemy import DateTime, func
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_DATETIME_FORMAT = '%Y-%m-%d'
+
+# Output formats that are a prefix of how SQLite stores DateTime values
+# ('YYYY-MM-DD HH:MM:SS.ffffff'), so SQLite can format them with substr()
+SQLITE_PREFIX_FORMATS = {
+    '%Y-%m-%d': 10,
+    '%Y-%m-%d %H:%M': 16,
+    '%Y-%m-%d %H:%M:%S': 19
+}
+
+def dumps(obj):
+    """Encode to JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+class RecordSerializer:
+    """Serializer generated from a model's column definitions.
+
+    Rows are fetched as plain tuples of only the requested columns, datetime
+    columns are formatted column-wise (by SQLite itself when possible) and
+    dicts are built with a single zip per row.
+    """
+
+    def __init__(self, model, datetime_formats=None):
+        formats = datetime_formats or {}
+        self.model = model
+        self.fields = [column.key for column in model.__table__.columns]
+        self.datetime_formats = {
+            column.key: formats.get(column.key, DEFAULT_DATETIME_FORMAT)
+            for column in model.__table__.columns
+            if isinstance(column.type, DateTime)
+        }
+
+    def formats_in_sql(self, name, dialect_name):
+        return dialect_name == 'sqlite' and self.datetime_formats.get(name) in SQLITE_PREFIX_FORMATS
+
+    def select_columns(self, fields, dialect_name):
+        """Column expressions to select, labelled with the field names"""
+        columns = []
+        for name in fields:
+            column = getattr(self.model, name)
+            if self.formats_in_sql(name, dialect_name):
+                column = func.substr(column, 1, SQLITE_PREFIX_FORMATS[self.datetime_formats[name]])
+            columns.append(column.label(name))
+        return columns
+
+    def to_dicts(self, rows, fields, dialect_name):
+        """Convert fetched tuples into dicts keyed by field name"""
+        if not rows:
+            return []
+        pending = [(index, self.datetime_formats[name]) for index, name in enumerate(fields)
+                   if name in self.datetime_formats and not self.formats_in_sql(name, dialect_name)]
+        if pending:
+            columns = [list(column) for column in zip(*rows)]
+            for index, date_format in pending:
+                columns[index] = [value.strftime(date_format) if value is not None else None
+                                  for value in columns[index]]
+            rows = zip(*columns)
+        return [dict(zip(fields, row)) for row in rows]
@@ -0,0 +1,109 @@
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from flask import has_request_context, request
+from sqlalchemy import event
+from logging_config import setup_slow_query_logging
+
+# Re-run EXPLAIN for the same statement at most this often
+EXPLAIN_INTERVAL = 300  # seconds
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+WHITESPACE = re.compile(r'\s+')
+
+def normalize_statement(statement):
+    """Collapse literals, IN lists and whitespace so equivalent statements group together"""
+    statement = STRING_LITERAL.sub('?', statement)
+    statement = NUMBER_LITERAL.sub('?', statement)
+    statement = PLACEHOLDER_LIST.sub('(?, ...)', statement)
+    return WHITESPACE.sub(' ', statement).strip()
+
+def value_shape(value):
+    return 'null' if value is None else type(value).__name__
+
+def parameter_shape(parameters, executemany):
+    """Types of the bound parameters, never their values (they may be patient data)"""
+    if executemany:
+        rows = list(parameters)
+        return {'rows': len(rows), 'row': parameter_shape(rows[0], False) if rows else None}
+    if isinstance(parameters, dict):
+        return {name: value_shape(value) for name, value in parameters.items()}
+    return [value_shape(value) for value in parameters or ()]
+
+class SlowQueryLogger:
+    """Logs statements slower than SLOW_QUERY_THRESHOLD_MS with their query plan"""
+
+    def __init__(self):
+        self.threshold = None
+        self.explain = True
+        self.logger = None
+        self._explained = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db):
+        threshold_ms = app.config.get('SLOW_QUERY_THRESHOLD_MS', 250)
+        if threshold_ms is None or threshold_ms < 0:
+            return
+        self.threshold = threshold_ms / 1000
+        self.explain = app.config.get('SLOW_QUERY_EXPLAIN', True)
+        self.logger = setup_slow_query_logging(
+            app.config.get('SLOW_QUERY_LOG_FILE', 'logs/slow_queries.log'),
+            backup_count=app.config.get('SLOW_QUERY_LOG_BACKUPS', 5)
+        )
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_start_time', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['slow_query_start_time'].pop()
+        if self.threshold is None or elapsed < self.threshold:
+            return
+        entry = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'duration_ms': round(elapsed * 1000, 2),
+            'statement': statement,
+            'parameters': parameter_shape(parameters, executemany),
+            'route': self.current_route()
+        }
+        if self.explain and self.should_explain(statement):
+            entry['plan'] = self.query_plan(conn, cursor, statement, parameters, executemany)
+        self.logger.warning(json.dumps(entry, default=str))
+
+    def current_route(self):
+        if has_request_context():
+            rule = request.url_rule.rule if request.url_rule else request.path
+            return f'{request.method} {rule}'
+        return f'thread:{threading.current_thread().name}'
+
+    def should_explain(self, statement):
+        now = time.monotonic()
+        key = normalize_statement(statement)
+        with self._lock:
+            if now - self._explained.get(key, -EXPLAIN_INTERVAL) < EXPLAIN_INTERVAL:
+                return False
+            self._explained[key] = now
+            return True
+
+    def query_plan(self, conn, cursor, statement, parameters, executemany):
+        """EXPLAIN QUERY PLAN rows on SQLite, run on a separate cursor of the same connection"""
+        if conn.dialect.name != 'sqlite':
+            return None
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        plan_cursor = cursor.connection.cursor()
+        try:
+            plan_cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+            return [row[-1] for row in plan_cursor.fetchall()]
+        except Exception as e:
+            return [f'EXPLAIN failed: {e}']
+        finally:
+            plan_cursor.close()
@@ -0,0 +1,75 @@
+"""Summarize the slow-query log: the top statements by total time, count or worst case.
+
+Usage: python slow_query_report.py [--log logs/slow_queries.log] [--top 10] [--sort total|count|max]
+"""
+import argparse
+import glob
+import json
+import os
+from config import Config
+from slow_queries import normalize_statement
+
+SORT_KEYS = {
+    'total': lambda group: group['total_ms'],
+    'count': lambda group: group['count'],
+    'max': lambda group: group['max_ms']
+}
+
+def read_entries(log_file):
+    """Yield log entries from the log and its rotated backups, oldest first"""
+    backups = sorted(glob.glob(f'{log_file}.*'), key=lambda path: int(path.rsplit('.', 1)[1]), reverse=True)
+    for path in backups + [log_file]:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding='utf-8') as log:
+            for line in log:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+def aggregate(entries):
+    """Group entries by normalized statement"""
+    groups = {}
+    for entry in entries:
+        key = normalize_statement(entry['statement'])
+        group = groups.setdefault(key, {
+            'statement': key, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'routes': {}, 'plan': None
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['routes'][entry.get('route')] = group['routes'].get(entry.get('route'), 0) + 1
+        if entry['duration_ms'] >= group['max_ms']:
+            group['max_ms'] = entry['duration_ms']
+            group['plan'] = entry.get('plan') or group['plan']
+    return list(groups.values())
+
+def report(groups, top, sort):
+    groups = sorted(groups, key=SORT_KEYS[sort], reverse=True)[:top]
+    for rank, group in enumerate(groups, 1):
+        routes = ', '.join(f'{route} ({count})' for route, count in
+                           sorted(group['routes'].items(), key=lambda item: item[1], reverse=True))
+        print(f"#{rank}  count={group['count']}  total={group['total_ms']:.0f} ms  "
+              f"mean={group['total_ms'] / group['count']:.1f} ms  max={group['max_ms']:.1f} ms")
+        print(f"    {group['statement']}")
+        print(f"    routes: {routes}")
+        for step in group['plan'] or []:
+            print(f"    plan: {step}")
+        print()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--log', default=Config.SLOW_QUERY_LOG_FILE)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='total')
+    args = parser.parse_args()
+
+    groups = aggregate(read_entries(args.log))
+    if not groups:
+        print(f"No slow queries logged in {args.log}")
+        return
+    print(f"{sum(group['count'] for group in groups)} slow queries, {len(groups)} distinct statements\n")
+    report(groups, args.top, args.sort)
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,40 @@
 import unittest
-from app import app, db, User, Patient, OPDRecord, IPDRecord, OTRecord, DeliveryRecord
+from app import create_app, init_worker, db, OT_SERIALIZER, result_cache, user_cache, ingest_queue, password_hasher, \
+    request_metrics, slow_query_log, load_user, user_version, rebuild_rollups, patient_ids, reserve_id_block, \
+    User, Patient, OPDRecord, IPDRecord, OTRecord, DeliveryRecord, DailyRollup
+from cache import MemoryBackend
 from config import TestingConfig
+from utils import generate_patient_id, get_patient_summary, import_patient_data, validate_email, validate_phone_number
+from passwords import HashingBusy, PasswordHasher
+from patient_ids import IdAllocator
+from validation import DateFormat, Enum, Field, MaxLength, Range, Regex, Rule, Schema, ValidationError, to_records
+import slow_query_report
+from logging_config import LazyRotatingFileHandler
+import generate_data
+import backup
+from datetime import datetime
+from sqlalchemy import create_engine, event, text
+from werkzeug.security import generate_password_hash
 import json
+import logging
+import openpyxl
+import os
+import pandas as pd
+import sqlite3
+import tempfile
+import threading
+
+app = create_app(TestingConfig)
 
 class HospitalManagementTestCase(unittest.TestCase):
     def setUp(self):
-        app.config.from_object(TestingConfig)
         self.app = app.test_client()
         self.app_context = app.app_context()
         self.app_context.push()
         db.create_all()
+        result_cache.clear()
+        user_cache.clear()
+        user_version['checked_at'] = float('-inf')
         
         # Create test user
         user = User(username='testuser', role='admin')
@@ -136,5 +161,859 @@ class HospitalManagementTestCase(unittest.TestCase):
         self.assertIsNotNone(record)
         self.assertEqual(record.delivery_type, 'Normal')
 
+    def test_opd_records_keyset_pagination(self):
+        patient = Patient(patient_id='PAT001', name='Test Patient', age=30, gender='Male', contact='1234567890')
+        db.session.add(patient)
+        for i in range(5):
+            db.session.add(OPDRecord(patient_id='PAT001', department='General', doctor='Dr. Test',
+                                     diagnosis=f'Diagnosis {i}', treatment='Rest', fee=100.0))
+        db.session.commit()
+
+        # First page
+        response = self.app.get('/api/opd?limit=2')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([r['diagnosis'] for r in data['records']], ['Diagnosis 0', 'Diagnosis 1'])
+        self.assertEqual(data['next_cursor'], data['records'][-1]['id'])
+
+        # Walk the remaining pages
+        seen = [r['id'] for r in data['records']]
+        while data['next_cursor'] is not None:
+            data = self.app.get(f"/api/opd?limit=2&after_id={data['next_cursor']}").get_json()
+            seen.extend(r['id'] for r in data['records'])
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(seen, sorted(seen))
+
+    def test_records_export_streams_ndjson_and_csv(self):
+        patient = Patient(patient_id='PAT001', name='Test Patient', age=30, gender='Female', contact='1234567890')
+        db.session.add(patient)
+        for i in range(3):
+            db.session.add(DeliveryRecord(date=datetime(2024, 1, i + 1), patient_id='PAT001',
+                                          delivery_type='Normal', doctor='Dr. Test', baby_gender='Male',
+                                          weight=3.0 + i, status='Completed'))
+        db.session.commit()
+
+        response = self.app.get('/api/delivery/export?format=ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['date'], '2024-01-01')
+        self.assertEqual(rows[2]['weight'], 5.0)
+
+        response = self.app.get('/api/delivery/export?format=csv')
+        self.assertEqual(response.status_code, 200)
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(lines[0], 'id,date,patient_id,delivery_type,doctor,baby_gender,weight,status')
+        self.assertEqual(len(lines), 4)
+
+        self.assertEqual(self.app.get('/api/unknown/export').status_code, 404)
+        self.assertEqual(self.app.get('/api/opd/export?format=xml').status_code, 400)
+
+    def test_bulk_insert_reports_row_errors(self):
+        patient = Patient(patient_id='PAT001', name='Test Patient', age=30, gender='Male', contact='1234567890')
+        db.session.add(patient)
+        db.session.commit()
+
+        rows = [{
+            'patient_id': 'PAT001',
+            'date': '2024-01-01',
+            'surgery_type': f'Surgery {i}',
+            'surgeon': 'Dr. Test',
+            'anesthetist': 'Dr. Anesthesia',
+            'start_time': '2024-01-01 10:00',
+            'end_time': '2024-01-01 12:00',
+            'status': 'Completed'
+        } for i in range(3)]
+        rows.append(dict(rows[0], start_time='not a time'))
+        rows.append({'patient_id': 'PAT001'})
+        rows.append(dict(rows[0], surgeon=42, status=['Completed']))
+
+        response = self.app.post('/api/ot/bulk', json=rows)
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['inserted'], 3)
+        self.assertEqual(data['failed'], 3)
+        self.assertEqual([e['index'] for e in data['errors']], [3, 4, 5])
+        self.assertEqual(data['errors'][2]['error'], 'surgeon must be text; status must be text')
+        self.assertEqual(OTRecord.query.count(), 3)
+        self.assertEqual(db.session.get(OTRecord, 1).start_time, datetime(2024, 1, 1, 10, 0))
+
+    def test_bulk_insert_accepts_ndjson(self):
+        lines = [json.dumps({
+            'patient_id': 'PAT001',
+            'date': '2024-01-01',
+            'department': 'General',
+            'doctor': 'Dr. Test',
+            'diagnosis': 'Fever',
+            'treatment': 'Rest',
+            'fee': 50
+        }) for _ in range(4)]
+        lines.insert(2, '{not json')
+
+        response = self.app.post('/api/opd/bulk', data='\n'.join(lines),
+                                 content_type='application/x-ndjson')
+        data = response.get_json()
+        self.assertEqual(data['inserted'], 4)
+        self.assertEqual(data['errors'][0]['index'], 2)
+        self.assertEqual(OPDRecord.query.first().date, datetime(2024, 1, 1))
+
+        response = self.app.post('/api/opd/bulk', json={'patient_id': 'PAT001'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_sqlite_connections_use_wal_and_pragmas(self):
+        self.assertEqual(db.session.execute(text('PRAGMA journal_mode')).scalar(), 'wal')
+        self.assertEqual(db.session.execute(text('PRAGMA synchronous')).scalar(), 1)  # NORMAL
+        self.assertEqual(db.session.execute(text('PRAGMA busy_timeout')).scalar(),
+                         app.config['SQLITE_BUSY_TIMEOUT'])
+
+        # Readers are not blocked by an open write transaction
+        with db.engine.connect() as writer, db.engine.connect() as reader:
+            writer.exec_driver_sql('BEGIN IMMEDIATE')
+            writer.exec_driver_sql("INSERT INTO patient (patient_id, name) VALUES ('PAT002', 'Writer')")
+            self.assertEqual(reader.exec_driver_sql('SELECT COUNT(*) FROM patient').scalar(), 0)
+            writer.exec_driver_sql('ROLLBACK')
+
+    def test_record_list_filters_sorts_and_projects(self):
+        patient = Patient(patient_id='PAT001', name='Test Patient', age=30, gender='Male', contact='1234567890')
+        db.session.add(patient)
+        for day in range(1, 6):
+            for doctor in ['Dr. A', 'Dr. B']:
+                db.session.add(OPDRecord(date=datetime(2024, 1, day), patient_id='PAT001', department='General',
+                                         doctor=doctor, diagnosis='Fever', treatment='Rest', fee=100.0))
+        db.session.commit()
+
+        response = self.app.get('/api/opd?doctor=Dr.%20A&date_from=2024-01-02&date_to=2024-01-04'
+                                '&sort=-date&fields=date,doctor')
+        self.assertEqual(response.status_code, 200)
+        records = response.get_json()['records']
+        self.assertEqual([r['date'] for r in records], ['2024-01-04', '2024-01-03', '2024-01-02'])
+        self.assertEqual(set(records[0]), {'id', 'date', 'doctor'})
+
+        # Keyset pagination follows the requested sort order
+        dates = []
+        url = '/api/opd?doctor=Dr.%20B&sort=-date&limit=2'
+        data = self.app.get(url).get_json()
+        dates.extend(r['date'] for r in data['records'])
+        while data['next_cursor'] is not None:
+            data = self.app.get(f"{url}&after_id={data['next_cursor']}").get_json()
+            dates.extend(r['date'] for r in data['records'])
+        self.assertEqual(dates, ['2024-01-05', '2024-01-04', '2024-01-03', '2024-01-02', '2024-01-01'])
+
+        self.assertEqual(self.app.get('/api/opd?surgeon=Dr.%20A').status_code, 400)
+        self.assertEqual(self.app.get('/api/opd?date_from=01/01/2024').status_code, 400)
+        self.assertEqual(self.app.get('/api/opd?sort=fee').status_code, 400)
+        self.assertEqual(self.app.get('/api/opd?fields=password').status_code, 400)
+
+    def test_record_list_conditional_get(self):
+        patient = Patient(patient_id='PAT001', name='Test Patient', age=30, gender='Male', contact='1234567890')
+        db.session.add(patient)
+        db.session.commit()
+
+        response = self.app.get('/api/ipd')
+        etag = response.headers['ETag']
+        self.assertEqual(response.status_code, 200)
+
+        # Unchanged table answers 304 without a body
+        response = self.app.get('/api/ipd', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b'')
+
+        # Writes to another table do not invalidate the IPD list
+        self.app.post('/api/opd/bulk', json=[{
+            'patient_id': 'PAT001', 'department': 'General', 'doctor': 'Dr. Test',
+            'diagnosis': 'Fever', 'treatment': 'Rest', 'fee': 50
+        }])
+        self.assertEqual(self.app.get('/api/ipd', headers={'If-None-Match': etag}).status_code, 304)
+
+        # A new IPD record bumps the version
+        self.app.post('/api/ipd', json={
+            'patient_id': 'PAT001',
+            'admission_date': '2024-01-01',
+            'room_no': '101',
+            'admission_reason': 'Test Admission',
+            'doctor': 'Dr. Test',
+            'status': 'Admitted'
+        })
+        response = self.app.get('/api/ipd', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(len(response.get_json()['records']), 1)
+
+    def test_memory_cache_lru_eviction_and_ttl(self):
+        backend = MemoryBackend(max_entries=2, ttl=60)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)  # evicts b, the least recently used
+        self.assertEqual(backend.get('a'), 1)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.stats()['evictions'], 1)
+
+        backend.ttl = -1
+        backend.set('d', 4)
+        self.assertIsNone(backend.get('d'))
+        self.assertEqual(backend.stats()['expirations'], 1)
+
+        # Tag generations are bounded like the entries; a forgotten tag never reuses its old generation
+        first = backend.generation('tag:0')
+        backend.bump_generation('tag:0')
+        for number in range(1, 10):
+            backend.bump_generation(f'tag:{number}')
+        self.assertEqual(len(backend._generations), 2)
+        self.assertNotIn(backend.generation('tag:0'), (first, first + 1))
+
+    def test_result_cache_invalidated_on_write(self):
+        patient = Patient(patient_id='PAT001', name='Test Patient', age=30, gender='Male', contact='1234567890')
+        db.session.add(patient)
+        db.session.commit()
+        hits = result_cache.hits
+
+        self.assertEqual(len(self.app.get('/api/opd?limit=10').get_json()['records']), 0)
+        self.assertEqual(len(self.app.get('/api/opd?limit=10').get_json()['records']), 0)
+        self.assertEqual(result_cache.hits, hits + 1)
+
+        self.assertEqual(get_patient_summary('PAT001')['opd_visits'], 0)
+        db.session.add(OPDRecord(patient_id='PAT001', department='General', doctor='Dr. Test',
+                                 diagnosis='Fever', treatment='Rest', fee=50.0))
+        db.session.commit()
+
+        self.assertEqual(len(self.app.get('/api/opd?limit=10').get_json()['records']), 1)
+        self.assertEqual(get_patient_summary('PAT001')['opd_visits'], 1)
+
+        stats = self.app.get('/api/cache/stats').get_json()
+        self.assertEqual(stats['backend'], 'memory')
+        self.assertGreaterEqual(stats['misses'], 3)
+
+    def test_result_cache_follows_writes_from_other_workers(self):
+        db.session.add(Patient(patient_id='PAT001', name='Test Patient', age=30, gender='Male', contact='1234567890'))
+        db.session.add(Patient(patient_id='PAT002', name='Other Patient', age=40, gender='Female', contact='1234567891'))
+        db.session.commit()
+        self.assertEqual(self.app.get('/api/opd').get_json()['records'], [])
+        self.assertEqual(get_patient_summary('PAT001')['opd_visits'], 0)
+
+        # Another worker commits through its own connection; this process's cache generations never move
+        connection = sqlite3.connect(db.engine.url.database)
+        connection.execute("INSERT INTO opd_record (date, patient_id, department, doctor, diagnosis, treatment, fee) "
+                           "VALUES ('2024-01-01 00:00:00', 'PAT001', 'General', 'Dr. Test', 'Fever', 'Rest', 50)")
+        connection.execute("INSERT INTO table_version (table_name, version) VALUES ('opd_record', 1), ('patient:PAT001', 1) "
+                           "ON CONFLICT (table_name) DO UPDATE SET version = version + 1")
+        connection.commit()
+        connection.close()
+
+        response = self.app.get('/api/opd')
+        self.assertEqual(len(response.get_json()['records']), 1)
+        self.assertEqual(get_patient_summary('PAT001')['opd_visits'], 1)
+
+        # Writes for one patient leave the other patients' cached summaries alone
+        self.assertEqual(get_patient_summary('PAT002')['opd_visits'], 0)
+        hits = result_cache.hits
+        db.session.add(OPDRecord(patient_id='PAT001', department='General', doctor='Dr. Test',
+                                 diagnosis='Cough', treatment='Rest', fee=20.0))
+        db.session.commit()
+        self.assertEqual(get_patient_summary('PAT002')['opd_visits'], 0)
+        self.assertEqual(result_cache.hits, hits + 1)
+        self.assertEqual(get_patient_summary('PAT001')['opd_visits'], 2)
+
+        # Moving a record to another patient invalidates both patients' caches
+        self.assertEqual(len(self.app.get('/api/patients/PAT001/timeline').get_json()['events']), 2)
+        record = db.session.get(OPDRecord, response.get_json()['records'][0]['id'])
+        record.patient_id = 'PAT002'
+        db.session.commit()
+        self.assertEqual(len(self.app.get('/api/patients/PAT001/timeline').get_json()['events']), 1)
+        self.assertEqual(get_patient_summary('PAT001')['opd_visits'], 1)
+        self.assertEqual(get_patient_summary('PAT002')['opd_visits'], 1)
+
+    def test_patient_timeline_merges_all_record_types(self):
+        patient = Patient(patient_id='PAT001', name='Test Patient', age=30, gender='Female', contact='1234567890')
+        db.session.add(patient)
+        db.session.add(OPDRecord(date=datetime(2024, 1, 1), patient_id='PAT001', department='General',
+                                 doctor='Dr. A', diagnosis='Fever', treatment='Rest', fee=50.0))
+        db.session.add(OPDRecord(date=datetime(2024, 2, 1), patient_id='PAT001', department='Obstetrics',
+                                 doctor='Dr. B', diagnosis='Antenatal check', treatment='Iron', fee=50.0))
+        db.session.add(IPDRecord(admission_date=datetime(2024, 3, 1), patient_id='PAT001', room_no='101',
+                                 admission_reason='Labour', doctor='Dr. B', status='Discharged'))
+        db.session.add(DeliveryRecord(date=datetime(2024, 3, 2), patient_id='PAT001', delivery_type='Normal',
+                                      doctor='Dr. B', baby_gender='Male', weight=3.1, status='Completed'))
+        db.session.add(OPDRecord(date=datetime(2024, 1, 5), patient_id='PAT002', department='General',
+                                 doctor='Dr. A', diagnosis='Cough', treatment='Rest', fee=50.0))
+        db.session.commit()
+
+        response = self.app.get('/api/patients/PAT001/timeline')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['counts'], {'opd': 2, 'ipd': 1, 'ot': 0, 'delivery': 1})
+        self.assertEqual([(e['record_type'], e['date']) for e in data['events']], [
+            ('delivery', '2024-03-02'), ('ipd', '2024-03-01'), ('opd', '2024-02-01'), ('opd', '2024-01-01')
+        ])
+        self.assertEqual(get_patient_summary('PAT001'),
+                         {'opd_visits': 2, 'ipd_admissions': 1, 'surgeries': 0, 'deliveries': 1})
+
+        self.assertEqual(self.app.get('/api/patients/PAT404/timeline').status_code, 404)
+
+    def test_daily_rollups_follow_writes_and_rebuild(self):
+        patient = Patient(patient_id='PAT001', name='Test Patient', age=30, gender='Male', contact='1234567890')
+        db.session.add(patient)
+        db.session.commit()
+
+        self.app.post('/api/opd/bulk', json=[{
+            'patient_id': 'PAT001', 'date': '2024-01-01', 'department': department, 'doctor': 'Dr. Test',
+            'diagnosis': 'Fever', 'treatment': 'Rest', 'fee': 100
+        } for department in ['General', 'General', 'ENT']])
+        self.app.post('/api/ipd', json={
+            'patient_id': 'PAT001', 'admission_date': '2024-01-01', 'room_no': '101',
+            'admission_reason': 'Observation', 'doctor': 'Dr. Test', 'status': 'Admitted'
+        })
+
+        # Discharging an admission updates the discharge rollup
+        admission = IPDRecord.query.first()
+        admission.discharge_date = datetime(2024, 1, 3)
+        admission.status = 'Discharged'
+        db.session.commit()
+
+        query = '?date_from=2024-01-01&date_to=2024-01-31'
+        opd = self.app.get('/api/stats/opd_visits' + query).get_json()
+        self.assertEqual(opd['totals'][0], {'dimension': 'General', 'count': 2, 'total': 200.0})
+        self.assertEqual(opd['series'][0], {'day': '2024-01-01', 'dimension': 'ENT', 'count': 1, 'total': 100.0})
+        discharges = self.app.get('/api/stats/ipd_discharges' + query).get_json()
+        self.assertEqual(discharges['series'], [{'day': '2024-01-03', 'dimension': '', 'count': 1, 'total': 0.0}])
+        self.assertEqual(self.app.get('/api/stats/unknown').status_code, 404)
+
+        # A rebuild from the raw tables gives the same rollups
+        before = [(r.metric, r.day, r.dimension, r.count, r.total)
+                  for r in DailyRollup.query.order_by(DailyRollup.metric, DailyRollup.day, DailyRollup.dimension)]
+        rebuild_rollups()
+        after = [(r.metric, r.day, r.dimension, r.count, r.total)
+                 for r in DailyRollup.query.order_by(DailyRollup.metric, DailyRollup.day, DailyRollup.dimension)]
+        self.assertEqual(after, before)
+
+    def enable_ingest_queue(self):
+        spill_dir = tempfile.mkdtemp()
+        ingest_queue.spill_dir = spill_dir
+        ingest_queue.enabled = True
+
+        def restore():
+            ingest_queue.stop()
+            ingest_queue.enabled = False
+        self.addCleanup(restore)
+        return spill_dir
+
+    def test_async_ingest_queues_and_commits_records(self):
+        self.enable_ingest_queue()
+        payload = {
+            'patient_id': 'PAT001',
+            'date': '2024-01-01',
+            'delivery_type': 'Normal',
+            'doctor': 'Dr. Test',
+            'baby_gender': 'Female',
+            'weight': 2.9,
+            'status': 'Completed'
+        }
+        tickets = []
+        for _ in range(3):
+            response = self.app.post('/api/delivery', json=payload)
+            self.assertEqual(response.status_code, 202)
+            tickets.append(response.get_json()['ticket'])
+
+        response = self.app.post('/api/delivery', json=dict(payload, date='yesterday'))
+        self.assertEqual(response.status_code, 400)
+
+        self.assertTrue(ingest_queue.join(timeout=10))
+        for ticket in tickets:
+            status = self.app.get(f'/api/ingest/{ticket}').get_json()
+            self.assertEqual(status['status'], 'committed')
+        self.assertEqual(DeliveryRecord.query.count(), 3)
+        self.assertEqual(self.app.get('/api/ingest/unknown').status_code, 404)
+        # A well-formed ticket may be queued in another worker
+        response = self.app.get(f'/api/ingest/{"b" * 32}')
+        self.assertEqual((response.status_code, response.get_json()['status']), (202, 'unknown'))
+
+        # An undated visit is dated on acceptance, not when a replay writes it
+        today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+        self.app.post('/api/opd', json={
+            'patient_id': 'PAT001', 'department': 'General', 'doctor': 'Dr. Test',
+            'diagnosis': 'Fever', 'treatment': 'Rest', 'fee': 50
+        })
+        self.assertTrue(ingest_queue.join(timeout=10))
+        self.assertEqual(OPDRecord.query.one().date, today)
+
+    def test_async_ingest_replays_spill_file_after_crash(self):
+        spill_dir = self.enable_ingest_queue()
+        entry = {'ticket': 'a' * 32, 'record_type': 'opd', 'payload': {
+            'patient_id': 'PAT001', 'department': 'General', 'doctor': 'Dr. Test',
+            'diagnosis': 'Fever', 'treatment': 'Rest', 'fee': 50
+        }}
+        # Spill file left behind by a worker that died before writing its queue
+        with open(os.path.join(spill_dir, 'ingest-999999.ndjson'), 'w') as spill:
+            spill.write(json.dumps(entry) + '\n')
+            spill.write(json.dumps(entry) + '\n')  # duplicates are committed once
+
+        # Worker start-up replays it in the background
+        init_worker(app)
+        self.assertTrue(ingest_queue.join(timeout=10))
+        self.assertEqual(OPDRecord.query.count(), 1)
+        self.assertFalse(os.path.exists(os.path.join(spill_dir, 'ingest-999999.ndjson')))
+
+    def count_queries(self, func):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            result = func()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        return result, len(statements)
+
+    def test_user_loader_caches_until_role_changes(self):
+        user = User.query.filter_by(username='testuser').first()
+        user_id = str(user.id)
+        db.session.remove()
+
+        _, queries = self.count_queries(lambda: load_user(user_id))
+        db.session.remove()
+        loaded, cached_queries = self.count_queries(lambda: load_user(user_id))
+        self.assertEqual(cached_queries, 0)
+        self.assertEqual(loaded.username, 'testuser')
+        self.assertEqual(loaded.role, 'admin')
+        # The cached identity is a plain object, never merged into the session
+        self.assertNotIsInstance(loaded, User)
+        self.assertEqual(len(db.session.identity_map), 0)
+
+        # Authenticated requests issue no SQL at all, not even the version check
+        _, request_queries = self.count_queries(lambda: self.app.get('/dashboard'))
+        self.assertEqual(request_queries, 0)
+
+        # A role change invalidates the cached identity: one version read and one user read
+        user = db.session.get(User, int(user_id))
+        user.role = 'nurse'
+        db.session.commit()
+        db.session.remove()
+        loaded, queries = self.count_queries(lambda: load_user(user_id))
+        self.assertEqual(queries, 2)
+        self.assertEqual(loaded.role, 'nurse')
+
+        # So does a change committed by another worker, once this one re-reads the version
+        connection = sqlite3.connect(db.engine.url.database)
+        connection.execute("UPDATE user SET role = 'doctor' WHERE id = ?", (int(user_id),))
+        connection.execute("UPDATE table_version SET version = version + 1 WHERE table_name = 'user'")
+        connection.commit()
+        connection.close()
+        db.session.remove()
+        self.assertEqual(load_user(user_id).role, 'nurse')  # within the check interval
+        user_version['checked_at'] -= app.config['USER_VERSION_CHECK_INTERVAL']
+        self.assertEqual(load_user(user_id).role, 'doctor')
+
+    def test_session_can_carry_user_role(self):
+        app.config['SESSION_CARRIES_ROLE'] = True
+        self.addCleanup(app.config.__setitem__, 'SESSION_CARRIES_ROLE', False)
+        self.app.post('/login', data={'username': 'testuser', 'password': 'testpass'})
+        user_cache.clear()
+
+        response, queries = self.count_queries(lambda: self.app.get('/dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, 0)
+
+    def test_login_rehashes_outdated_password_hash(self):
+        user = User.query.filter_by(username='testuser').first()
+        user.password = generate_password_hash('testpass', method='pbkdf2:sha256:1000')
+        db.session.commit()
+        self.assertTrue(password_hasher.needs_rehash(user.password))
+
+        response = self.app.post('/login', data={'username': 'testuser', 'password': 'testpass'})
+        self.assertEqual(response.status_code, 302)
+        user = User.query.filter_by(username='testuser').first()
+        self.assertFalse(password_hasher.needs_rehash(user.password))
+        self.assertTrue(user.check_password('testpass'))
+
+    def test_password_hashing_timeout_is_busy_and_keeps_the_slot(self):
+        hasher = PasswordHasher('pbkdf2:sha256:1000', max_workers=1, max_pending=1, timeout=0.1)
+        finished = threading.Event()
+        with self.assertRaises(HashingBusy):
+            hasher._run(finished.wait, 5)
+        # The timed-out hash still runs, so its slot is not handed out yet
+        with self.assertRaises(HashingBusy):
+            hasher.hash('secret')
+        finished.set()
+        hasher.timeout = 5
+        self.assertTrue(hasher.verify(hasher.hash('secret'), 'secret'))
+
+        # Reconfiguring, as every init_app does, shuts the previous pool down
+        executor = hasher._executor
+        hasher.configure('pbkdf2:sha256:1000', max_workers=1, max_pending=1, timeout=5)
+        self.assertTrue(executor._shutdown)
+
+    def test_serializer_formats_match_orm_strftime(self):
+        db.session.add(OTRecord(
+            patient_id='PAT001', date=datetime(2024, 1, 1), surgery_type='Test Surgery', surgeon='Dr. Test',
+            anesthetist='Dr. Anesthesia', start_time=datetime(2024, 1, 1, 10, 5, 30), end_time=None, status='Scheduled'
+        ))
+        db.session.commit()
+
+        rows = db.session.execute(db.select(*OT_SERIALIZER.select_columns(OT_SERIALIZER.fields, 'sqlite'))).all()
+        python_rows = db.session.execute(db.select(*OT_SERIALIZER.select_columns(OT_SERIALIZER.fields, 'python'))).all()
+        expected = {'id': 1, 'date': '2024-01-01', 'patient_id': 'PAT001', 'surgery_type': 'Test Surgery',
+                    'surgeon': 'Dr. Test', 'anesthetist': 'Dr. Anesthesia', 'start_time': '2024-01-01 10:05',
+                    'end_time': None, 'status': 'Scheduled'}
+        self.assertEqual(OT_SERIALIZER.to_dicts(rows, OT_SERIALIZER.fields, 'sqlite'), [expected])
+        self.assertEqual(OT_SERIALIZER.to_dicts(python_rows, OT_SERIALIZER.fields, 'python'), [expected])
+        self.assertEqual(self.app.get('/api/ot').get_json()['records'], [expected])
+
+    def test_full_text_search_ranks_filters_and_follows_writes(self):
+        opd = OPDRecord(date=datetime(2024, 1, 1), patient_id='PAT001', department='General', doctor='Dr. A',
+                        diagnosis='Acute appendicitis', treatment='Referred for <appendectomy>', fee=50.0)
+        db.session.add(opd)
+        db.session.add(OPDRecord(date=datetime(2024, 2, 1), patient_id='PAT002', department='General',
+                                 doctor='Dr. A', diagnosis='Fever', treatment='Rule out appendicitis', fee=50.0))
+        db.session.add(IPDRecord(admission_date=datetime(2024, 3, 1), patient_id='PAT003', room_no='101',
+                                 admission_reason='Appendicitis surgery', doctor='Dr. B', status='Admitted'))
+        db.session.commit()
+
+        results = self.app.get('/api/search?q=append').get_json()['results']
+        self.assertEqual(len(results), 3)
+        # Diagnosis matches outrank treatment-only matches
+        self.assertEqual(results[-1]['patient_id'], 'PAT002')
+        self.assertIn('<mark>', results[0]['snippet'])
+        self.assertNotIn('<appendectomy>', ''.join(r['snippet'] for r in results))
+
+        results = self.app.get('/api/search?q=appendicitis&type=ipd').get_json()['results']
+        self.assertEqual([(r['record_type'], r['date']) for r in results], [('ipd', '2024-03-01')])
+        results = self.app.get('/api/search?q=appendicitis&date_from=2024-01-15&date_to=2024-02-01').get_json()
+        self.assertEqual([r['patient_id'] for r in results['results']], ['PAT002'])
+
+        opd.diagnosis = 'Gastritis'
+        opd.treatment = 'Antacids'
+        db.session.commit()
+        results = self.app.get('/api/search?q=appendicitis').get_json()['results']
+        self.assertNotIn(opd.id, [r['record_id'] for r in results if r['record_type'] == 'opd'])
+        self.assertEqual(self.app.get('/api/search?q=gastritis').get_json()['results'][0]['record_id'], opd.id)
+        self.assertEqual(self.app.get('/api/search?q=').status_code, 400)
+
+    def test_search_triggers_follow_a_partial_create_all(self):
+        engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'partial.db')}")
+        self.addCleanup(engine.dispose)
+        db.metadata.create_all(engine, tables=[OPDRecord.__table__])
+        with engine.connect() as connection:
+            triggers = connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger'").scalars()
+            self.assertEqual(sorted(triggers), ['opd_record_search_delete', 'opd_record_search_insert',
+                                                'opd_record_search_update'])
+
+        # Tables created later get their triggers then
+        db.metadata.create_all(engine, tables=[IPDRecord.__table__])
+        with engine.connect() as connection:
+            self.assertEqual(connection.exec_driver_sql(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'ipd_record'").scalar(), 3)
+
+    def test_patient_lookup_matches_id_name_and_phone_prefixes(self):
+        db.session.add(Patient(patient_id='PAT100', name='Anita Rao', age=30, gender='Female', contact='+91 98450 12345'))
+        db.session.add(Patient(patient_id='PAT101', name='Ánil  Kumar', age=41, gender='Male', contact='080-2222-3333'))
+        db.session.commit()
+        # Core bulk inserts get their lookup keys from the column defaults
+        db.session.execute(db.insert(Patient), [
+            {'patient_id': 'AN001', 'name': 'Anand', 'age': 25, 'gender': 'Male', 'contact': '9000012345'}
+        ])
+        db.session.commit()
+
+        def lookup(query):
+            response = self.app.get('/api/patients/lookup', query_string={'q': query})
+            self.assertEqual(response.status_code, 200)
+            return [p['patient_id'] for p in response.get_json()['patients']]
+
+        self.assertEqual(lookup('an'), ['AN001', 'PAT101', 'PAT100'])
+        self.assertEqual(lookup('anil k'), ['PAT101'])
+        self.assertEqual(lookup('pat10'), ['PAT100', 'PAT101'])
+        self.assertEqual(lookup('PAT101'), ['PAT101'])
+        # Digits match the end of the phone number, whatever its formatting
+        self.assertEqual(lookup('12345'), ['AN001', 'PAT100'])
+        self.assertEqual(lookup('3333'), ['PAT101'])
+        self.assertEqual(lookup(''), [])
+
+        patient = Patient.query.filter_by(patient_id='PAT100').first()
+        patient.name = 'Bina Rao'
+        db.session.commit()
+        self.assertEqual(lookup('bina'), ['PAT100'])
+
+    def test_app_factory_and_worker_init(self):
+        other = create_app('testing')
+        self.assertTrue(other.config['TESTING'])
+        self.assertIn('main.dashboard', other.view_functions)
+        self.assertEqual(other.test_client().get('/test').status_code, 200)
+
+        # A forked worker replaces the connection pool inherited from the master
+        pool = db.engine.pool
+        init_worker(app)
+        self.assertIsNot(db.engine.pool, pool)
+        self.assertEqual(db.session.execute(text('SELECT COUNT(*) FROM user')).scalar(), 1)
+
+    def test_metrics_report_latency_status_and_queries_per_route(self):
+        request_metrics.reset()
+        request_metrics.response_headers = True
+        self.addCleanup(setattr, request_metrics, 'response_headers', False)
+
+        response = self.app.get('/api/opd')
+        self.assertEqual(response.status_code, 200)
+        query_count = int(response.headers['X-Query-Count'])
+        self.assertGreater(query_count, 0)
+        self.assertIn(f'desc="{query_count} queries"', response.headers['Server-Timing'])
+        self.app.get('/api/opd/unknown-route')
+
+        body = self.app.get('/metrics').get_data(as_text=True)
+        pid = os.getpid()
+        self.assertIn(f'http_requests_total{{pid="{pid}",method="GET",route="/api/opd",status="200"}} 1', body)
+        self.assertIn(f'http_requests_total{{pid="{pid}",method="GET",route="unmatched",status="404"}} 1', body)
+        self.assertIn(f'http_request_duration_seconds_count{{pid="{pid}",method="GET",route="/api/opd"}} 1', body)
+        self.assertIn(f'db_queries_per_request_sum{{pid="{pid}",route="/api/opd"}} {query_count}', body)
+        self.assertIn(f'http_requests_in_flight{{pid="{pid}"}} 1', body)  # the /metrics request itself
+
+        # Scrapes need the token when one is set, and come from the local host otherwise
+        self.assertEqual(self.app.get('/metrics', environ_base={'REMOTE_ADDR': '10.0.0.9'}).status_code, 403)
+        self.addCleanup(setattr, request_metrics, 'token', None)
+        request_metrics.token = 'secret'
+        self.assertEqual(self.app.get('/metrics').status_code, 401)
+        self.assertEqual(self.app.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code, 200)
+
+    def test_metrics_cover_every_live_worker(self):
+        request_metrics.reset()
+        self.addCleanup(setattr, request_metrics, 'directory', None)
+        request_metrics.directory = tempfile.mkdtemp()
+        # Snapshots left by a live sibling worker and by one that has exited
+        sibling, exited = os.getppid(), 2 ** 22 + 1
+        for pid in (sibling, exited):
+            with open(os.path.join(request_metrics.directory, f'metrics-{pid}.json'), 'w') as snapshot:
+                json.dump({'http_requests_total': [
+                    f'http_requests_total{{pid="{pid}",method="GET",route="/api/opd",status="200"}} 7'
+                ]}, snapshot)
+
+        self.app.get('/api/opd')
+        body = self.app.get('/metrics').get_data(as_text=True)
+        self.assertEqual(body.count('# TYPE http_requests_total counter'), 1)
+        self.assertIn(f'http_requests_total{{pid="{os.getpid()}",method="GET",route="/api/opd",status="200"}} 1', body)
+        self.assertIn(f'http_requests_total{{pid="{sibling}",method="GET",route="/api/opd",status="200"}} 7', body)
+        self.assertNotIn(f'pid="{exited}"', body)
+        self.assertFalse(os.path.exists(os.path.join(request_metrics.directory, f'metrics-{exited}.json')))
+
+    def test_slow_queries_logged_with_plan_and_aggregated(self):
+        self.addCleanup(setattr, slow_query_log, 'threshold', slow_query_log.threshold)
+        self.addCleanup(setattr, slow_query_log, 'logger', slow_query_log.logger)
+        slow_query_log.threshold = 0
+        slow_query_log.logger = logging.getLogger('test_slow_queries')
+        slow_query_log._explained.clear()
+
+        with self.assertLogs('test_slow_queries', 'WARNING') as logs:
+            self.app.get('/api/opd?department=General')
+            self.app.get('/api/opd?department=Surgery')
+        entries = [json.loads(record.getMessage()) for record in logs.records]
+        selects = [entry for entry in entries if 'FROM opd_record' in entry['statement']
+                   and entry['route'] == 'GET /api/opd' and 'department' in entry['statement']]
+        self.assertEqual(len(selects), 2)
+        # Values are never logged, only their types
+        self.assertNotIn('General', json.dumps(selects))
+        self.assertIn('str', selects[0]['parameters'])
+        self.assertTrue(any('ix_opd_record_department_date' in step for step in selects[0]['plan']))
+        self.assertNotIn('plan', selects[1])  # explained once per statement
+
+        groups = {group['statement']: group for group in slow_query_report.aggregate(selects)}
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(list(groups.values())[0]['count'], 2)
+
+        # The log directory is created by the first slow query, not at start-up
+        log_file = os.path.join(tempfile.mkdtemp(), 'logs', 'slow.log')
+        handler = LazyRotatingFileHandler(log_file, delay=True)
+        self.addCleanup(handler.close)
+        self.assertFalse(os.path.exists(os.path.dirname(log_file)))
+        handler.emit(logging.makeLogRecord({'msg': '{}'}))
+        self.assertTrue(os.path.exists(log_file))
+
+    def test_generated_data_is_deterministic_correlated_and_loads(self):
+        tables = generate_data.generate(300, seed=7)
+        again = generate_data.generate(300, seed=7)
+        for name, frame in tables.items():
+            self.assertTrue(frame.equals(again[name]), name)
+
+        opd, ipd, ot = tables['opd_record'], tables['ipd_record'], tables['ot_record']
+        self.assertGreater(opd['patient_id'].duplicated().sum(), 0)  # repeat visits
+        discharged = ipd[ipd['status'] == 'Discharged']
+        self.assertTrue((discharged['discharge_date'] > discharged['admission_date']).all())
+        self.assertTrue((ot['end_time'] > ot['start_time']).all())
+        men = set(tables['patient'].loc[tables['patient']['gender'] == 'Male', 'patient_id'])
+        self.assertFalse(men & set(opd.loc[opd['department'] == 'Obstetrics', 'patient_id']))
+
+        etag = self.app.get('/api/opd').headers['ETag']
+        counts = generate_data.load_tables(tables)
+        self.assertEqual(Patient.query.count(), counts['patient'])
+        # The load moves the table versions on, so clients holding an old ETag refetch
+        self.assertEqual(self.app.get('/api/opd', headers={'If-None-Match': etag}).status_code, 200)
+        self.assertEqual(DailyRollup.query.filter_by(metric='opd_visits').with_entities(
+            db.func.sum(DailyRollup.count)).scalar(), len(opd))
+        self.assertEqual(OPDRecord.query.count(), len(opd))
+        record = db.session.get(IPDRecord, 1)
+        self.assertEqual(record.admission_date, ipd['admission_date'][0].to_pydatetime())
+        # The search index was rebuilt for the loaded rows and its triggers restored
+        diagnosis = opd['diagnosis'][0]
+        results = self.app.get(f'/api/search?q={diagnosis}&type=opd&limit=100').get_json()['results']
+        self.assertTrue(results)
+        self.app.post('/api/opd', json={'patient_id': 'PAT00000001', 'department': 'General', 'doctor': 'Dr. Test',
+                                        'diagnosis': 'Leptospirosis', 'treatment': 'Doxycycline', 'fee': 100})
+        self.assertEqual(len(self.app.get('/api/search?q=leptospirosis').get_json()['results']), 1)
+
+    def test_online_backup_incremental_restore_and_retention(self):
+        directory = tempfile.mkdtemp()
+        source = os.path.join(directory, 'live.db')
+        connection = sqlite3.connect(source)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('CREATE TABLE note (id INTEGER PRIMARY KEY, body TEXT)')
+        connection.executemany('INSERT INTO note (body) VALUES (?)', [(f'note {i}' * 20,) for i in range(2000)])
+        connection.commit()
+
+        backups_dir = os.path.join(directory, 'backups')
+        full = backup.run_backup(source, backups_dir, compression='gzip')
+        self.assertEqual(full['kind'], 'full')
+        self.assertEqual(full['integrity'], 'ok')
+        self.assertTrue(full['file'].endswith('.db.gz'))
+
+        # Change one row and append a few: the incremental carries only the touched pages
+        connection.execute("UPDATE note SET body = 'changed' WHERE id = 1")
+        connection.executemany('INSERT INTO note (body) VALUES (?)', [('new',)] * 10)
+        connection.commit()
+        incremental = backup.run_backup(source, backups_dir, incremental=True, compression='gzip')
+        self.assertEqual(incremental['kind'], 'incremental')
+        self.assertEqual(incremental['parent'], full['name'])
+        self.assertLess(incremental['pages_written'], incremental['page_count'] // 4)
+
+        restored = os.path.join(directory, 'restored.db')
+        backup.restore(backup.BackupSet(backups_dir, 'live'), incremental['name'], restored)
+        rows = sqlite3.connect(restored).execute('SELECT id, body FROM note ORDER BY id').fetchall()
+        self.assertEqual(rows, connection.execute('SELECT id, body FROM note ORDER BY id').fetchall())
+        connection.close()
+
+        # A new full snapshot with keep=1 removes the whole previous chain
+        latest = backup.run_backup(source, backups_dir, compression='gzip', keep=1)
+        self.assertEqual(sorted(latest['pruned']), sorted([full['name'], incremental['name']]))
+        self.assertEqual([manifest['name'] for manifest in backup.BackupSet(backups_dir, 'live').manifests()],
+                         [latest['name']])
+
+    def test_patient_import_streams_upserts_and_rejects_rows(self):
+        directory = tempfile.mkdtemp()
+        db.session.add(Patient(patient_id='PAT001', name='Old Name', age=30, gender='Male', contact='111'))
+        db.session.commit()
+        path = os.path.join(directory, 'patients.csv')
+        with open(path, 'w') as f:
+            f.write('Patient_ID,name,age,gender,contact\n'
+                    'pat001, Asha  Rao ,41,f,(98765) 43210\n'
+                    'PAT002,Ravi Kumar,abc,X,9876500000\n'
+                    ',,,,\n'
+                    'PAT003,Meena Devi,,,\n'
+                    'PAT003,Meena Devi,62,Female,+919876512345\n'
+                    ',No Id,5,M,\n')
+        reports = []
+        success, totals = import_patient_data(path, chunk_size=2, progress=reports.append)
+        self.assertTrue(success, totals)
+        # PAT003 is inserted by the second chunk and updated by the third
+        self.assertEqual((totals['rows'], totals['inserted'], totals['updated'], totals['rejected']), (6, 1, 2, 2))
+        self.assertEqual(len(reports), 3)
+
+        patient = Patient.query.filter_by(patient_id='PAT001').one()
+        self.assertEqual((patient.name, patient.age, patient.gender, patient.contact),
+                         ('Asha Rao', 41, 'Female', '9876543210'))
+        self.assertEqual((patient.name_key, patient.contact_key), ('asha rao', '0123456789'))
+        self.assertEqual(Patient.query.filter_by(patient_id='PAT003').one().age, 62)
+        self.assertEqual(Patient.query.count(), 2)
+        rejected = pd.read_csv(totals['rejected_path'])
+        self.assertEqual(rejected['row'].tolist(), [3, 7])
+        self.assertIn('gender must be', rejected['error'][0])
+        self.assertEqual(rejected['error'][1], 'patient_id is required')
+
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(['patient_id', 'name', 'age', 'gender', 'contact'])
+        for number in range(5):
+            sheet.append([f'XL{number}', f'Sheet Patient {number}', 20 + number, 'Male', 9800000000 + number])
+        workbook.save(os.path.join(directory, 'patients.xlsx'))
+        success, totals = import_patient_data(os.path.join(directory, 'patients.xlsx'), chunk_size=2)
+        self.assertEqual((totals['inserted'], totals['rejected'], totals['rejected_path']), (5, 0, None))
+        self.assertEqual(Patient.query.filter_by(patient_id='XL4').one().contact, '9800000004')
+
+        self.assertEqual(import_patient_data(path.replace('.csv', '_rejected.csv'))[0], False)
+        # Unreadable files are reported, not raised
+        corrupt = os.path.join(directory, 'corrupt.xlsx')
+        with open(corrupt, 'wb') as workbook_file:
+            workbook_file.write(b'not a zip archive')
+        success, message = import_patient_data(corrupt)
+        self.assertFalse(success)
+        self.assertIn('Cannot read corrupt.xlsx', message)
+
+    def test_validation_schema_checks_columns_and_single_records(self):
+        schema = Schema({
+            'patient_id': Field(MaxLength(6), required=True),
+            'age': Field(Range(0, 130, integer=True)),
+            'gender': Field(Enum(['Male', 'Female'], {'m': 'Male'})),
+            'date': Field(DateFormat('%Y-%m-%d'), default=datetime(2024, 1, 1)),
+            'contact': Field(Regex(r'\d{7,15}', 'must be 7 to 15 digits'))
+        })
+        frame = pd.DataFrame({
+            'patient_id': ['PAT001', ' ', 'PAT0000003', 'PAT004'],
+            'age': ['41', 7, '1.5', ''],
+            'gender': ['m', 'FEMALE', 'x', None],
+            'date': ['2024-02-03', '', '2024-13-01', None],
+            'contact': ['9876543210', '12', None, '']
+        }, index=[10, 11, 12, 13])
+        report = schema.validate(frame)
+        self.assertEqual(report.failed.tolist(), [False, True, True, False])
+        self.assertEqual(report.row_errors().to_dict(), {
+            11: 'patient_id is required; contact must be 7 to 15 digits',
+            12: 'patient_id is longer than 6 characters; age must be a whole number from 0 to 130; '
+                'gender must be one of Male, Female; date must be a date like 2024-01-31'
+        })
+        self.assertIn({'column': 'patient_id', 'error': 'is required', 'count': 1, 'rows': [11]}, report.summary())
+        self.assertEqual(to_records(report.valid), [
+            {'patient_id': 'PAT001', 'age': 41, 'gender': 'Male', 'date': datetime(2024, 2, 3), 'contact': '9876543210'},
+            {'patient_id': 'PAT004', 'age': None, 'gender': None, 'date': datetime(2024, 1, 1), 'contact': None}
+        ])
+        # The single-record path applies the same rules
+        self.assertEqual(schema.parse({'patient_id': 'PAT001', 'age': 41.0, 'gender': 'M'})['gender'], 'Male')
+        with self.assertRaises(ValidationError) as raised:
+            schema.parse({'age': '1.5'})
+        self.assertEqual(set(raised.exception.errors), {'patient_id', 'age'})
+        with self.assertRaises(TypeError):
+            Rule()
+
+        response = self.app.post('/api/opd', json={'patient_id': 'PAT001', 'department': 'General', 'doctor': 'Dr. Test',
+                                                   'diagnosis': 'Fever', 'treatment': '', 'fee': 'ten'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['fields'], {'treatment': 'is required', 'fee': 'must be a number of at least 0'})
+        self.assertTrue(validate_phone_number('+919876543210'))
+        self.assertFalse(validate_email('not-an-email'))
+
+    def test_patient_ids_come_from_disjoint_blocks_with_check_digits(self):
+        first, second = IdAllocator(reserve_id_block, block_size=3), IdAllocator(reserve_id_block, block_size=3)
+        ids = first.take(2) + second.take(2) + first.take(2) + second.take(5)
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(ids[:3], ['PAT000000018', 'PAT000000026', 'PAT000000042'])  # second reserved 4-6
+        self.assertTrue(all(first.is_valid(patient_id) for patient_id in ids))
+        self.assertFalse(first.is_valid('PAT000000019'))
+
+        # Threads share the in-memory block; a forked worker drops its parent's block
+        threaded = IdAllocator(reserve_id_block, block_size=7)
+        allocated = []
+        def allocate():
+            with app.app_context():
+                allocated.extend(threaded.next_id() for _ in range(500))
+        workers = [threading.Thread(target=allocate) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(len(set(allocated + ids)), 2000 + len(ids))
+        threaded._pid = -1
+        self.assertNotIn(threaded.next_id(), allocated)
+
+        response = self.app.post('/register_patient', data={'patient_id': '', 'name': 'New Patient', 'age': 30,
+                                                            'gender': 'Female', 'contact': '9876543210'})
+        self.assertEqual(response.status_code, 302)
+        patient = Patient.query.filter_by(name='New Patient').one()
+        self.assertTrue(patient_ids.is_valid(patient.patient_id))
+        self.assertNotEqual(generate_patient_id(), patient.patient_id)
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -1,8 +1,13 @@
 import os
+import time
 from datetime import datetime
 from werkzeug.utils import secure_filename
 import pandas as pd
 from flask import current_app
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from lookup import normalize_names, reverse_digits_series
+from validation import Enum, Field, MaxLength, Range, Regex, Schema, to_records
 
 def allowed_file(filename):
     """Check if the file extension is allowed"""
@@ -20,27 +25,156 @@ def save_file(file):
         return file_path
     return None
 
-def import_patient_data(file_path):
-    """Import patient data from Excel/CSV file"""
+# Columns every patient import file must have
+PATIENT_COLUMNS = ['patient_id', 'name', 'age', 'gender', 'contact']
+
+PATIENT_SCHEMA = Schema({
+    'patient_id': Field(MaxLength(20), required=True),
+    'name': Field(MaxLength(100), required=True),
+    'age': Field(Range(0, 130, integer=True)),
+    'gender': Field(Enum(['Male', 'Female', 'Other'], {'m': 'Male', 'f': 'Female', 'o': 'Other'})),
+    'contact': Field(Regex(r'\+?\d{7,15}', 'must be 7 to 15 digits')),
+})
+
+PHONE_NUMBER = Regex(r'\+?1?\d{9,15}')
+EMAIL = Regex(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+
+def read_patient_chunks(file_path, chunk_size):
+    """Yield the file as DataFrames of at most chunk_size rows, every cell as a string
+
+    Files the readers cannot open or parse raise ValueError with a readable message.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
     try:
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
+        if extension == '.csv':
+            with pd.read_csv(file_path, dtype=str, keep_default_na=False, chunksize=chunk_size) as reader:
+                yield from reader
+        elif extension == '.xlsx':
+            yield from read_xlsx_chunks(file_path, chunk_size)
         else:
-            df = pd.read_excel(file_path)
-        
-        # Validate required columns
-        required_columns = ['patient_id', 'name', 'age', 'gender', 'contact']
-        if not all(col in df.columns for col in required_columns):
-            return False, "Missing required columns"
-        
-        return True, df
+            # Legacy .xls sheets hold at most 65,536 rows, so reading one whole stays bounded
+            yield pd.read_excel(file_path, dtype=str, keep_default_na=False)
+    except (ValueError, OSError):
+        raise
+    except ImportError as e:
+        raise ValueError(f'Reading {extension} files needs an extra package: {e}') from e
     except Exception as e:
-        return False, str(e)
+        # Corrupt workbooks: zipfile.BadZipFile, openpyxl's InvalidFileException, xlrd's XLRDError
+        raise ValueError(f'Cannot read {os.path.basename(file_path)}: {e}') from e
+
+def read_xlsx_chunks(file_path, chunk_size):
+    """Stream the first sheet with openpyxl's read-only mode instead of loading the workbook"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = ['' if value is None else str(value) for value in next(rows, ())]
+        width = len(header)
+        batch = []
+        for row in rows:
+            # Read-only rows can be shorter or longer than the header
+            batch.append(row[:width] + (None,) * (width - len(row)))
+            if len(batch) == chunk_size:
+                yield sheet_frame(header, batch)
+                batch = []
+        if batch:
+            yield sheet_frame(header, batch)
+    finally:
+        workbook.close()
+
+def sheet_frame(header, rows):
+    frame = pd.DataFrame.from_records(rows, columns=header).astype(object)
+    return frame.where(frame.notna(), '').astype(str)
+
+def normalize_patient_chunk(chunk):
+    """Clean one chunk with column operations and validate it; returns (rows to upsert, rejected rows with an error)"""
+    frame = chunk[PATIENT_COLUMNS].apply(lambda column: column.str.strip())
+    frame['patient_id'] = frame['patient_id'].str.upper()
+    frame['name'] = frame['name'].str.replace(r'\s+', ' ', regex=True)
+    frame['contact'] = frame['contact'].str.replace(r'[\s().-]', '', regex=True)
+
+    report = PATIENT_SCHEMA.validate(frame)
+    rows = report.valid
+    rows = rows.assign(name_key=normalize_names(rows['name']), contact_key=reverse_digits_series(rows['contact']))
+    # Later rows win, as they would if the file were imported one row at a time
+    rows = rows.drop_duplicates('patient_id', keep='last')
+    return rows, chunk[report.failed].assign(error=report.row_errors())
+
+def upsert_patients(rows):
+    """Insert or update a batch of patients in one transaction; returns (inserted, updated)"""
+    from app import db, Patient
+
+    ids = rows['patient_id'].tolist()
+    existing = 0
+    # Stay well under SQLite's bound-parameter limit
+    for start in range(0, len(ids), 5000):
+        existing += db.session.execute(
+            db.select(db.func.count()).where(Patient.patient_id.in_(ids[start:start + 5000]))
+        ).scalar()
+
+    # One Core statement run with executemany: compiling an ORM statement per row costs more than the insert
+    patients = Patient.__table__
+    statement = sqlite_insert(patients)
+    statement = statement.on_conflict_do_update(
+        index_elements=[patients.c.patient_id],
+        set_={column: statement.excluded[column] for column in rows.columns if column != 'patient_id'}
+    )
+    try:
+        db.session.connection().execute(statement, to_records(rows))
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        raise
+    return len(ids) - existing, existing
+
+def import_patient_data(file_path, rejected_path=None, chunk_size=None, progress=None):
+    """Stream patients from an Excel/CSV file into the database, one transaction per chunk
+
+    Invalid rows go to rejected_path (default: <file>_rejected.csv) with their sheet row
+    number and the reason. progress, if given, is called with the running totals after
+    every chunk. Returns (True, totals) or (False, message); chunks already imported stay.
+    totals replaces the DataFrame of imported rows that earlier versions returned.
+    """
+    chunk_size = chunk_size or current_app.config['IMPORT_CHUNK_SIZE']
+    rejected_path = rejected_path or os.path.splitext(file_path)[0] + '_rejected.csv'
+    if os.path.exists(rejected_path):
+        os.remove(rejected_path)
+    totals = {'rows': 0, 'inserted': 0, 'updated': 0, 'rejected': 0, 'rejected_path': None, 'seconds': 0.0}
+    start = time.perf_counter()
+    try:
+        for chunk in read_patient_chunks(file_path, chunk_size):
+            chunk.columns = chunk.columns.str.strip().str.lower()
+            missing = [column for column in PATIENT_COLUMNS if column not in chunk.columns]
+            if missing:
+                return False, f"Missing required columns: {', '.join(missing)}"
+            # Index rows by their line in the sheet, the header being line 1
+            chunk.index = pd.RangeIndex(totals['rows'] + 2, totals['rows'] + 2 + len(chunk), name='row')
+            totals['rows'] += len(chunk)
+            chunk = chunk[(chunk[PATIENT_COLUMNS] != '').any(axis=1)]
+
+            rows, rejected = normalize_patient_chunk(chunk)
+            if len(rows):
+                inserted, updated = upsert_patients(rows)
+                totals['inserted'] += inserted
+                totals['updated'] += updated
+            if len(rejected):
+                rejected.to_csv(rejected_path, mode='a', header=totals['rejected_path'] is None)
+                totals['rejected_path'] = rejected_path
+                totals['rejected'] += len(rejected)
+            totals['seconds'] = time.perf_counter() - start
+            if progress:
+                progress(dict(totals))
+        if not totals['rows']:
+            return False, "No rows found"
+        return True, totals
+    except (SQLAlchemyError, ValueError, OSError) as e:
+        return False, f"{e} (after {totals['inserted'] + totals['updated']} imported rows)"
 
 def generate_patient_id():
     """Generate a unique patient ID"""
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    return f"PAT{timestamp}"
+    from app import patient_ids
+    return patient_ids.next_id()
 
 def format_currency(amount):
     """Format amount as currency"""
@@ -52,29 +186,34 @@ def calculate_age(birth_date):
     return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
 
 def validate_phone_number(phone):
-    """Validate phone number format"""
-    import re
-    pattern = r'^\+?1?\d{9,15}$'
-    return bool(re.match(pattern, phone))
+    """Validate phone number format; PHONE_NUMBER.check does a whole Series at once"""
+    return PHONE_NUMBER.pattern.fullmatch(phone) is not None
 
 def validate_email(email):
-    """Validate email format"""
-    import re
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(pattern, email))
+    """Validate email format; EMAIL.check does a whole Series at once"""
+    return EMAIL.pattern.fullmatch(email) is not None
 
 def get_patient_summary(patient_id):
     """Get summary of patient's medical history"""
-    from app import db, OPDRecord, IPDRecord, OTRecord, DeliveryRecord
-    
-    summary = {
-        'opd_visits': OPDRecord.query.filter_by(patient_id=patient_id).count(),
-        'ipd_admissions': IPDRecord.query.filter_by(patient_id=patient_id).count(),
-        'surgeries': OTRecord.query.filter_by(patient_id=patient_id).count(),
-        'deliveries': DeliveryRecord.query.filter_by(patient_id=patient_id).count()
-    }
-    
-    return summary
+    from app import db, OPDRecord, IPDRecord, OTRecord, DeliveryRecord, get_table_versions, patient_version_names, \
+        result_cache
+
+    def compute_summary():
+        # One round-trip: a COUNT per table combined with UNION ALL
+        counts = db.union_all(*[
+            db.select(db.literal(key).label('key'), db.func.count().label('total'))
+            .select_from(model)
+            .where(model.patient_id == patient_id)
+            for key, model in [('opd_visits', OPDRecord), ('ipd_admissions', IPDRecord),
+                               ('surgeries', OTRecord), ('deliveries', DeliveryRecord)]
+        ])
+        return {key: total for key, total in db.session.execute(counts)}
+
+    # Keyed on the patient's record version, bumped whenever one of their records is written by any worker
+    return result_cache.get_or_compute(
+        'patient_summary', {'patient_id': patient_id}, [], compute_summary,
+        versions=get_table_versions(patient_version_names([patient_id]))
+    )
 
 def export_to_excel(data, filename):
     """Export data to Excel file"""